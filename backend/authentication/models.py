@@ -76,6 +76,12 @@ class PasswordResetToken(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            # Token validation looks a code up within one user's tokens
+            models.Index(fields=['user', 'code'], name='reset_token_user_code_idx'),
+        ]
+
     def __str__(self):
         return f'Password reset token for {self.user.email}'
 
@@ -1,3 +1,25 @@
 from django.test import TestCase
 
-# Create your tests here.
+from backend.utils.query_plan import QueryPlanAssertions
+from .models import User
+from .repositories.resetCodeRepository import ResetCodeRepository
+
+
+class ResetCodeQueryPlanTests(QueryPlanAssertions, TestCase):
+    """Reset code lookups must be answered from an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(email=f'user{n}@example.com') for n in range(50)])
+        for user in users:
+            ResetCodeRepository.create_reset_token(user)
+        cls.user = users[0]
+        cls.code = cls.user.password_reset_tokens.get().code
+
+    def test_validate_reset_token_uses_an_index(self):
+        token = self.assertIndexed(ResetCodeRepository.validate_reset_token, self.user, self.code)
+        self.assertIsNotNone(token)
+
+    def test_can_resend_token_uses_an_index(self):
+        can_resend, _ = self.assertIndexed(ResetCodeRepository.can_resend_token, self.user)
+        self.assertFalse(can_resend)
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'authentication.apps.AuthConfig',
     'order',
     'product',
+    'jobs',
     'rest_framework',
     'rest_framework_simplejwt.token_blacklist',
     'drf_spectacular',
@@ -87,6 +88,77 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Two-tier catalog cache used by product.service.cache.CatalogCache
+CATALOG_CACHE = {
+    'ALIAS': 'default',
+    'TTL': int(os.getenv('CATALOG_CACHE_TTL', 300)),
+    'LOCAL_TTL': int(os.getenv('CATALOG_CACHE_LOCAL_TTL', 5)),
+    'LOCAL_SIZE': 1024,
+    'LOCK_TIMEOUT': 10,
+}
+
+# Semantic product search, see product.search.embedding and product.search.vector
+PRODUCT_EMBEDDER = os.getenv('PRODUCT_EMBEDDER', 'product.search.embedding.HashingEmbedder')
+PRODUCT_EMBEDDER_OPTIONS = {'dim': 256}
+VECTOR_INDEX_IVF_THRESHOLD = 50_000
+VECTOR_INDEX_NPROBE = 8
+
+# Stock holds placed by carts and new orders, see product.service.reservation
+STOCK_HOLD_TTL_SECONDS = int(os.getenv('STOCK_HOLD_TTL_SECONDS', 900))
+STOCK_ORDER_HOLD_TTL_SECONDS = int(os.getenv('STOCK_ORDER_HOLD_TTL_SECONDS', 3600))
+
+# Cart storage, see order.service.cart_store. The cache and local stores are
+# write-behind: FLUSH_INTERVAL seconds between background flushes (0 leaves
+# flushing to the flush_carts command). The local store is single-process
+# only; with run_jobs workers use the cache store.
+CART_STORE = {
+    'BACKEND': os.getenv('CART_STORE_BACKEND', 'order.service.cart_store.DatabaseCartStore'),
+    'OPTIONS': {},
+    'FLUSH_INTERVAL': int(os.getenv('CART_STORE_FLUSH_INTERVAL', 2)),
+    'FLUSH_BATCH_SIZE': 500,
+}
+
+# Database-backed job queue, see jobs.service.queue and the run_jobs command
+JOBS = {
+    'BATCH_SIZE': 10,
+    'POLL_INTERVAL': 1.0,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 5,
+    'BACKOFF_MAX': 3600,
+    # A running job whose worker has not finished it after this long is retried,
+    # even if that worker is still running it; keep it above the slowest handler
+    'LEASE_SECONDS': 300,
+}
+
+# Sales and order status rollups, see order.service.rollupService. History
+# rows younger than SETTLE_SECONDS are left for the next run, so rows from
+# transactions that commit late are not skipped by the watermark.
+ORDER_ROLLUPS = {
+    'BATCH_SIZE': 1000,
+    'SETTLE_SECONDS': int(os.getenv('ORDER_ROLLUPS_SETTLE_SECONDS', 60)),
+}
+
+# Lower bounds of the price histogram buckets on the product list facets
+PRODUCT_PRICE_BUCKETS = [0, 10, 25, 50, 100, 250, 500, 1000]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
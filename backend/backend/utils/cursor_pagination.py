@@ -0,0 +1,138 @@
+import base64
+import json
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q, QuerySet
+from django.db.models.constants import LOOKUP_SEP
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client supplied cursor cannot be decoded."""
+
+
+def encode_cursor(key: str, values: Sequence[Any]) -> str:
+    """
+    Encode the sort key values of the last row of a page into an opaque cursor.
+
+    Values are stored as strings; ``cursor_values`` converts them back to the
+    field types when the cursor is used.
+    """
+    payload = json.dumps({"k": key, "v": [str(value) for value in values]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key: str, size: int) -> List[str]:
+    """
+    Decode a cursor produced by ``encode_cursor``.
+
+    Raises InvalidCursor when the cursor is malformed or was issued for a
+    different ordering.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        values = payload["v"]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor("Invalid cursor.")
+    if payload.get("k") != key or not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Cursor does not match the requested ordering.")
+    return values
+
+
+def parse_limit(params, default: int = 20, maximum: int = 100) -> int:
+    """
+    Read the ``limit`` query param, clamped to ``1..maximum``.
+
+    Raises ValueError when it is not an integer.
+    """
+    try:
+        limit = int(params.get("limit", default))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, maximum))
+
+
+def keyset_filter(ordering: Sequence[str], values: Sequence[Any]) -> Q:
+    """
+    Build the "rows after this position" filter for a keyset ordering.
+
+    For ``("-created_at", "-id")`` this yields
+    ``created_at < v0 OR (created_at = v0 AND id < v1)``, which the database
+    can answer with a range scan on a matching composite index.
+    """
+    condition = Q()
+    for position, field in enumerate(ordering):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        term = Q(**{f"{name}__{lookup}": values[position]})
+        for previous, value in zip(ordering[:position], values[:position]):
+            term &= Q(**{previous.lstrip("-"): value})
+        condition |= term
+    return condition
+
+
+def _model_field(model, path: str):
+    parts = path.split(LOOKUP_SEP)
+    for name in parts[:-1]:
+        model = model._meta.get_field(name).related_model
+    return model._meta.get_field(parts[-1])
+
+
+def cursor_values(model, ordering: Sequence[str], values: Sequence[Any]) -> List[Any]:
+    """
+    Convert decoded cursor values to the Python type of each ordering field.
+
+    A cursor is client input: one that decodes but carries values its fields
+    cannot hold raises InvalidCursor here instead of failing in the query.
+    """
+    converted = []
+    for field, value in zip(ordering, values):
+        if not isinstance(value, str):
+            raise InvalidCursor("Invalid cursor.")
+        try:
+            value = _model_field(model, field.lstrip("-")).to_python(value)
+        except (ValidationError, ValueError, TypeError):
+            raise InvalidCursor("Invalid cursor.")
+        # NaN and Infinity convert but cannot be compared with stored values
+        if value is None or (isinstance(value, Decimal) and not value.is_finite()):
+            raise InvalidCursor("Invalid cursor.")
+        converted.append(value)
+    return converted
+
+
+def _resolve(instance, path: str) -> Any:
+    value = instance
+    for attr in path.split("__"):
+        value = getattr(value, attr)
+    return value
+
+
+def paginate_keyset(
+    queryset: QuerySet,
+    ordering: Sequence[str],
+    key: str,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+) -> Tuple[list, Optional[str]]:
+    """
+    Return one page of ``queryset`` and the cursor for the next page.
+
+    ``ordering`` must end with a unique field (usually ``id``) so positions
+    are total. Because the cursor stores sort key values rather than an
+    offset, rows inserted, deleted or filtered out before the cursor do not
+    shift later pages. ``next_cursor`` is None on the last page.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = cursor_values(queryset.model, ordering, decode_cursor(cursor, key, len(ordering)))
+        queryset = queryset.filter(keyset_filter(ordering, values))
+
+    rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(key, [_resolve(last, field.lstrip("-")) for field in ordering])
+    return rows, next_cursor
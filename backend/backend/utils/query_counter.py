@@ -0,0 +1,37 @@
+from contextlib import contextmanager
+
+from django.db import connection
+
+# Request header asking an endpoint to report how many queries it ran
+QUERY_COUNT_HEADER = 'X-Query-Count'
+
+
+class QueryCounter:
+    """Counts the statements executed on the default connection."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries(enabled: bool = True):
+    """
+    Count database queries run inside the block, in any DEBUG mode.
+
+        with count_queries() as counter:
+            ...
+        counter.count
+
+    With ``enabled`` false nothing is wrapped and the count stays 0.
+    """
+    counter = QueryCounter(enabled)
+    if not enabled:
+        yield counter
+        return
+    with connection.execute_wrapper(counter):
+        yield counter
@@ -0,0 +1,101 @@
+import re
+import unittest
+from contextlib import contextmanager
+from typing import Iterable, List, Tuple
+
+from django.db import connection
+
+
+# SQLite reports a full table walk as "SCAN <table>" with no "USING ..." part;
+# subqueries and CTEs are scanned as "(subquery-N)" / "<name> AS ..." and are
+# not tables.
+_SQLITE_SCAN = re.compile(r'\bSCAN (?!\()(\w+)(?!.*\bUSING\b)')
+_POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+# Statements that read rows and so have a plan worth checking
+PLANNED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+
+class QueryCapture:
+    """Records the statements of the given kinds executed on the default connection."""
+
+    def __init__(self, kinds: Iterable[str] = PLANNED_STATEMENTS):
+        self.kinds = tuple(kind.upper() for kind in kinds)
+        self.queries: List[Tuple[str, tuple]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith(self.kinds):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def capture_queries(kinds: Iterable[str] = PLANNED_STATEMENTS):
+    """
+    Collect the SELECT, UPDATE and DELETE statements run inside the block, with their parameters.
+
+        with capture_queries() as capture:
+            ...
+        capture.queries
+    """
+    capture = QueryCapture(kinds)
+    with connection.execute_wrapper(capture):
+        yield capture
+
+
+def capture_selects():
+    """``capture_queries`` restricted to SELECTs."""
+    return capture_queries(('SELECT',))
+
+
+def explain(sql: str, params=None) -> List[str]:
+    """
+    Return the plan of one statement, one line per plan node.
+
+    On PostgreSQL sequential scans are disabled for the statement, so one
+    only shows up when no index can answer the query at all; on a freshly
+    seeded test table the planner would otherwise prefer a seq scan. The
+    statement is planned, never run. Other backends skip the calling test.
+    """
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        raise unittest.SkipTest(f'Query plans are not checked on {connection.vendor}')
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.execute('RESET enable_seqscan')
+
+
+def sequential_scans(plan: List[str]) -> List[str]:
+    """Names of the tables a plan reads in full."""
+    pattern = _SQLITE_SCAN if connection.vendor == 'sqlite' else _POSTGRES_SCAN
+    return [match.group(1) for line in plan for match in pattern.finditer(line)]
+
+
+class QueryPlanAssertions:
+    """
+    TestCase mixin that fails when a code path reads a table sequentially.
+
+        rows = self.assertIndexed(OrderRepositories.get_orders_page, user_id)
+
+    Every SELECT, UPDATE and DELETE the call runs is checked.
+    """
+
+    def assertIndexed(self, func, *args, **kwargs):
+        with capture_queries() as capture:
+            result = func(*args, **kwargs)
+        self.assertTrue(capture.queries, f'{func.__qualname__} ran no query')
+        for sql, params in capture.queries:
+            plan = explain(sql, params)
+            scans = sequential_scans(plan)
+            if scans:
+                self.fail(
+                    f'{func.__qualname__} scans {", ".join(scans)} sequentially:\n'
+                    f'{sql}\n' + '\n'.join(plan)
+                )
+        return result
@@ -0,0 +1,20 @@
+from django.contrib import admin
+
+from .models import Job
+from .service.queue import JobService
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'updated_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'locked_by', 'last_error')
+    readonly_fields = ('attempts', 'locked_by', 'locked_at', 'last_error', 'created_at', 'updated_at')
+    ordering = ('-updated_at',)
+    list_per_page = 50
+    actions = ('replay_dead_jobs',)
+
+    @admin.action(description='Replay selected dead jobs')
+    def replay_dead_jobs(self, request, queryset):
+        replayed = JobService.replay(job_ids=list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, f"Queued {replayed} dead job(s) again.")
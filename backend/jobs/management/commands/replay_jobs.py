@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from jobs.service.queue import JobService
+
+
+class Command(BaseCommand):
+    help = "Queue dead-lettered jobs again, all of them or by id / name."
+
+    def add_arguments(self, parser):
+        parser.add_argument('job_ids', nargs='*', type=int)
+        parser.add_argument('--name', help="Only replay jobs with this handler name.")
+
+    def handle(self, *args, **options):
+        replayed = JobService.replay(options['job_ids'] or None, options['name'])
+        self.stdout.write(self.style.SUCCESS(f"Requeued {replayed} dead jobs."))
@@ -0,0 +1,45 @@
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.worker import process_main, run_worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs, optionally in several worker processes."
+
+    def add_arguments(self, parser):
+        options = getattr(settings, 'JOBS', {})
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=options.get('BATCH_SIZE', 10))
+        parser.add_argument('--poll-interval', type=float, default=options.get('POLL_INTERVAL', 1.0))
+        parser.add_argument('--once', action='store_true', help="Exit once no due jobs are left.")
+
+    def handle(self, *args, **options):
+        batch_size, poll_interval, once = options['batch_size'], options['poll_interval'], options['once']
+        if options['processes'] <= 1:
+            try:
+                claimed = run_worker(batch_size, poll_interval, once)
+            except KeyboardInterrupt:
+                return
+            self.stdout.write(self.style.SUCCESS(f"Ran {claimed} jobs."))
+            return
+
+        # Workers must not share this process's database connections
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        workers = [
+            context.Process(target=process_main, args=(batch_size, poll_interval, once), daemon=False)
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.join()
+        self.stdout.write(self.style.SUCCESS(f"{len(workers)} workers stopped."))
@@ -0,0 +1,47 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    One unit of background work, stored in the database.
+
+    Enqueued in the same transaction as the change that needs it, so a job
+    exists exactly when that change committed. Workers claim pending jobs
+    whose ``run_at`` has passed, delete them when their handler succeeds,
+    and reschedule them with backoff when it fails. A job that fails
+    ``max_attempts`` times is left in the ``dead`` status for inspection
+    and ``replay_jobs``.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DEAD = 'dead'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DEAD, 'Dead'),
+    )
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Claim scan: due pending jobs in run_at order
+            models.Index(fields=['run_at', 'id'], name='job_pending_due_idx', condition=Q(status='pending')),
+            # Lease expiry scan
+            models.Index(fields=['locked_at'], name='job_running_lease_idx', condition=Q(status='running')),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
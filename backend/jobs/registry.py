@@ -0,0 +1,28 @@
+from typing import Callable, Dict
+
+_handlers: Dict[str, Callable] = {}
+
+
+class UnknownJob(KeyError):
+    """Raised when a job names a handler that is not registered."""
+
+
+def register(name: str):
+    """
+    Register the decorated function as the handler of jobs called ``name``.
+
+    The handler is called with the job payload as keyword arguments.
+    """
+    def decorator(func: Callable) -> Callable:
+        if name in _handlers and _handlers[name] is not func:
+            raise ValueError(f"Job handler {name!r} is already registered.")
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def get_handler(name: str) -> Callable:
+    try:
+        return _handlers[name]
+    except KeyError:
+        raise UnknownJob(name)
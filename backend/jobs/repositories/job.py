@@ -0,0 +1,82 @@
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import F
+
+from ..models import Job
+
+
+class JobRepositories:
+    """Handle database operations for the job queue."""
+
+    @staticmethod
+    def enqueue_many(jobs: List[Job]) -> List[Job]:
+        return Job.objects.bulk_create(jobs)
+
+    @staticmethod
+    def has_pending(name: str) -> bool:
+        return Job.objects.filter(status=Job.PENDING, name=name).exists()
+
+    @staticmethod
+    def reclaim_expired(lease_expired_before: datetime) -> int:
+        """
+        Put back running jobs claimed before ``lease_expired_before``.
+
+        Leases are not renewed while a handler runs, so this also takes back
+        jobs whose worker is alive but slower than the lease. See JobService
+        for why handlers stay correct when that happens.
+        """
+        return Job.objects.filter(status=Job.RUNNING, locked_at__lt=lease_expired_before).update(
+            status=Job.PENDING, locked_by=''
+        )
+
+    @staticmethod
+    def claim(worker: str, limit: int, now: datetime) -> List[Job]:
+        """
+        Claim up to ``limit`` due jobs for ``worker``.
+
+        ``SELECT ... FOR UPDATE SKIP LOCKED`` lets concurrent workers pick
+        disjoint rows without waiting on each other. The conditional UPDATE
+        that marks them running only takes rows still pending, so a job is
+        never handed to two workers, even on backends that ignore row locks.
+        """
+        with transaction.atomic():
+            ids = list(
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(status=Job.PENDING, run_at__lte=now)
+                .order_by('run_at', 'id')
+                .values_list('id', flat=True)[:limit]
+            )
+            if not ids:
+                return []
+            Job.objects.filter(id__in=ids, status=Job.PENDING).update(
+                status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1
+            )
+        return list(Job.objects.filter(id__in=ids, status=Job.RUNNING, locked_by=worker).order_by('run_at', 'id'))
+
+    @staticmethod
+    def complete(job: Job, worker: str) -> bool:
+        """Delete a finished job; False when the worker's lease was lost meanwhile."""
+        deleted, _ = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=worker).delete()
+        return bool(deleted)
+
+    @staticmethod
+    def fail(job: Job, worker: str, error: str, retry_at: Optional[datetime]) -> None:
+        """Reschedule a failed job for ``retry_at``, or mark it dead when None."""
+        changes = {'locked_by': '', 'locked_at': None, 'last_error': error}
+        if retry_at is None:
+            changes['status'] = Job.DEAD
+        else:
+            changes.update(status=Job.PENDING, run_at=retry_at)
+        Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=worker).update(**changes)
+
+    @staticmethod
+    def replay(job_ids: Optional[Iterable[int]] = None, name: Optional[str] = None, now: Optional[datetime] = None) -> int:
+        """Queue dead jobs again with a fresh attempt budget."""
+        jobs = Job.objects.filter(status=Job.DEAD)
+        if job_ids is not None:
+            jobs = jobs.filter(pk__in=list(job_ids))
+        if name:
+            jobs = jobs.filter(name=name)
+        return jobs.update(status=Job.PENDING, attempts=0, run_at=now, last_error='')
@@ -0,0 +1,110 @@
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Job
+from ..registry import UnknownJob, get_handler
+from ..repositories.job import JobRepositories
+
+
+class LeaseLost(Exception):
+    """The job was reclaimed from this worker while its handler ran."""
+
+
+def _options() -> Dict:
+    return getattr(settings, 'JOBS', {})
+
+
+class JobService:
+    """
+    Handle business logic for the job queue
+
+    Call ``enqueue`` inside the transaction that makes the work necessary.
+    The job commits or rolls back with it. ``run_jobs`` workers run each
+    handler in a transaction together with the job's deletion, so a
+    handler that only touches the database takes effect exactly once.
+
+    A job still running ``LEASE_SECONDS`` after it was claimed is handed to
+    another worker, so a handler can run twice, even concurrently. Only one
+    run commits: the other fails to delete the job it no longer holds,
+    raises LeaseLost and rolls back. Handlers must therefore be idempotent,
+    and anything they do outside the database must be safe to repeat.
+    """
+
+    @staticmethod
+    def enqueue(name: str, payload: Optional[Dict] = None, delay: float = 0,
+                max_attempts: Optional[int] = None) -> Job:
+        return JobService.enqueue_many([(name, payload or {})], delay, max_attempts)[0]
+
+    @staticmethod
+    def enqueue_many(jobs: Iterable[Tuple[str, Dict]], delay: float = 0,
+                     max_attempts: Optional[int] = None) -> List[Job]:
+        """Enqueue ``(name, payload)`` pairs with one INSERT."""
+        run_at = timezone.now() + timedelta(seconds=delay)
+        if max_attempts is None:
+            max_attempts = _options().get('MAX_ATTEMPTS', 5)
+        return JobRepositories.enqueue_many([
+            Job(name=name, payload=payload, run_at=run_at, max_attempts=max_attempts)
+            for name, payload in jobs
+        ])
+
+    @staticmethod
+    def enqueue_once(name: str, payload: Optional[Dict] = None, delay: float = 0) -> Optional[Job]:
+        """
+        Enqueue ``name`` unless a job of that name is already waiting to run.
+
+        For idempotent jobs that catch up on everything when they run, so
+        one pending job covers any number of triggers.
+        """
+        if JobRepositories.has_pending(name):
+            return None
+        return JobService.enqueue(name, payload, delay)
+
+    @staticmethod
+    def worker_id() -> str:
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    @staticmethod
+    def backoff(attempts: int) -> float:
+        """Seconds before retry number ``attempts``: exponential, capped, with jitter."""
+        options = _options()
+        delay = min(options.get('BACKOFF_BASE', 5) * 2 ** (attempts - 1), options.get('BACKOFF_MAX', 3600))
+        return delay * random.uniform(0.9, 1.1)
+
+    @staticmethod
+    def run_batch(worker: str, batch_size: int = 10) -> int:
+        """Claim and run one batch of due jobs; returns how many were claimed."""
+        now = timezone.now()
+        JobRepositories.reclaim_expired(now - timedelta(seconds=_options().get('LEASE_SECONDS', 300)))
+        jobs = JobRepositories.claim(worker, batch_size, now)
+        for job in jobs:
+            JobService.run(job, worker)
+        return len(jobs)
+
+    @staticmethod
+    def run(job: Job, worker: str) -> bool:
+        """Run one claimed job; returns True when it succeeded."""
+        try:
+            with transaction.atomic():
+                get_handler(job.name)(**job.payload)
+                if not JobRepositories.complete(job, worker):
+                    raise LeaseLost(f"Job {job.pk} was reclaimed while running.")
+            return True
+        except Exception as e:
+            retry_at = None
+            # No deploy makes an unregistered handler appear between retries
+            if job.attempts < job.max_attempts and not isinstance(e, UnknownJob):
+                retry_at = timezone.now() + timedelta(seconds=JobService.backoff(job.attempts))
+            JobRepositories.fail(job, worker, traceback.format_exc(limit=20), retry_at)
+            return False
+
+    @staticmethod
+    def replay(job_ids: Optional[Iterable[int]] = None, name: Optional[str] = None) -> int:
+        return JobRepositories.replay(job_ids, name, timezone.now())
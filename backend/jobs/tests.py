@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import Job
+from .registry import register
+from .repositories.job import JobRepositories
+from .service.queue import JobService
+
+calls = []
+
+
+@register('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@register('tests.fail')
+def fail():
+    raise RuntimeError("boom")
+
+
+@register('tests.write_then_fail')
+def write_then_fail():
+    JobService.enqueue('tests.record', {'value': 'leaked'})
+    raise RuntimeError("boom")
+
+
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_due_jobs_run_once_and_are_deleted(self):
+        JobService.enqueue_many([('tests.record', {'value': 1}), ('tests.record', {'value': 2})])
+        later = JobService.enqueue('tests.record', {'value': 3}, delay=60)
+        self.assertEqual(JobService.run_batch('w1'), 2)
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(list(Job.objects.values_list('pk', flat=True)), [later.pk])
+        self.assertEqual(JobService.run_batch('w1'), 0)
+
+    def test_claimed_jobs_are_not_handed_to_another_worker(self):
+        JobService.enqueue_many([('tests.record', {'value': n}) for n in range(3)])
+        now = timezone.now()
+        first = JobRepositories.claim('w1', 2, now)
+        second = JobRepositories.claim('w2', 2, now)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({job.pk for job in first} & {job.pk for job in second})
+        self.assertEqual([job.attempts for job in first + second], [1, 1, 1])
+
+    def test_expired_leases_are_reclaimed(self):
+        job = JobService.enqueue('tests.record', {'value': 1})
+        [claimed] = JobRepositories.claim('w1', 10, timezone.now())
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(JobService.run_batch('w2'), 1)
+        self.assertEqual(calls, [1])
+        # The first worker's lease is gone, so its run neither completes nor requeues the job
+        self.assertFalse(JobService.run(claimed, 'w1'))
+        self.assertFalse(Job.objects.exists())
+
+    def test_failures_back_off_then_go_dead(self):
+        job = JobService.enqueue('tests.fail', max_attempts=2)
+        self.assertEqual(JobService.run_batch('w1'), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('boom', job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        JobService.run_batch('w1')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DEAD, 2))
+        self.assertEqual(JobService.run_batch('w1'), 0)
+
+        self.assertEqual(JobService.replay(name='tests.fail'), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (Job.PENDING, 0, ''))
+
+    def test_unknown_jobs_are_dead_lettered_at_once(self):
+        job = JobService.enqueue('tests.missing')
+        JobService.run_batch('w1')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DEAD, 1))
+        self.assertIn('UnknownJob', job.last_error)
+
+    def test_a_failed_handler_rolls_back_its_writes(self):
+        JobService.enqueue('tests.write_then_fail', max_attempts=1)
+        JobService.run_batch('w1')
+        self.assertEqual(list(Job.objects.values_list('name', 'status')), [('tests.write_then_fail', Job.DEAD)])
@@ -0,0 +1,41 @@
+import time
+
+from django.db import DatabaseError, close_old_connections
+
+
+def run_worker(batch_size: int = 10, poll_interval: float = 1.0, once: bool = False) -> int:
+    """
+    Run jobs until interrupted, or until the queue is drained when ``once``.
+
+    Sleeps ``poll_interval`` seconds whenever a batch comes back short.
+    Returns the number of jobs claimed.
+    """
+    # Imported here: spawned processes import this module before django.setup()
+    from .service.queue import JobService
+
+    worker = JobService.worker_id()
+    total = 0
+    while True:
+        try:
+            claimed = JobService.run_batch(worker, batch_size)
+        except DatabaseError:
+            # Lost connection or lock timeout while claiming; try again shortly
+            time.sleep(poll_interval)
+            continue
+        finally:
+            close_old_connections()
+        total += claimed
+        if claimed < batch_size:
+            if once:
+                return total
+            time.sleep(poll_interval)
+
+
+def process_main(batch_size: int, poll_interval: float, once: bool) -> None:
+    """Entry point of a spawned worker process."""
+    import django
+    django.setup()
+    try:
+        run_worker(batch_size, poll_interval, once)
+    except KeyboardInterrupt:
+        pass
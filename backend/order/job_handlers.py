@@ -0,0 +1,77 @@
+"""
+Background work triggered by order status changes.
+
+Enqueued by ``order.signals.signal`` in the transaction that changes the
+status, and run by ``run_jobs`` workers.
+"""
+from typing import Dict, List, Tuple
+
+from jobs.registry import register
+from product.models import InsufficientStock
+from product.service.reservation import ReservationService
+
+from .models import SOLD_STATUSES, OrderModel, can_transition
+from .repositories.order import OrderRepositories
+from .service.cartService import CartService
+
+
+# Status values that should clear a user's cart when set on an order
+_CLEAR_CART_STATUSES = {"processing", "shipped"}
+
+
+def jobs_for_status(order_id, status: str) -> List[Tuple[str, Dict]]:
+    """The ``(name, payload)`` jobs to enqueue when an order moves to ``status``."""
+    jobs = []
+    payload = {'order_id': str(order_id)}
+    if status == 'processing':
+        # Clears the cart itself once the stock is committed
+        jobs.append(('order.confirm_stock', payload))
+    elif status in _CLEAR_CART_STATUSES:
+        jobs.append(('order.clear_cart', payload))
+    if status == 'cancelled':
+        jobs.append(('order.release_stock', payload))
+    return jobs
+
+
+@register('order.confirm_stock')
+def confirm_stock(order_id: str) -> None:
+    """
+    Turn the order's stock holds into deductions; cancel it if stock ran out.
+
+    The order may have moved on (shipped, delivered) before a worker got
+    here, and still needs its stock deducted; only a cancelled or already
+    confirmed order is skipped. An order that can no longer be cancelled
+    and lacks stock fails the job, which leaves it for an operator once its
+    retries run out.
+    """
+    order = OrderRepositories.get_order_by_id(order_id)
+    if order is None or order.status not in SOLD_STATUSES or ReservationService.is_order_confirmed(order.pk):
+        return
+    lines = {}
+    for item in order.items.all():
+        lines[item.product_id] = lines.get(item.product_id, 0) + item.quantity
+    try:
+        ReservationService.confirm_order(order.pk, lines)
+    except InsufficientStock:
+        if not can_transition(order.status, 'cancelled'):
+            raise
+        order.update_status('cancelled')
+        return
+    _clear_cart(order)
+
+
+@register('order.release_stock')
+def release_stock(order_id: str) -> None:
+    ReservationService.release(ReservationService.order_reference(order_id))
+
+
+@register('order.clear_cart')
+def clear_cart(order_id: str) -> None:
+    order = OrderRepositories.get_order_by_id(order_id)
+    if order is not None:
+        _clear_cart(order)
+
+
+def _clear_cart(order: OrderModel) -> None:
+    CartService.clear_cart(order.user_id)
+    ReservationService.release(ReservationService.cart_reference(order.user_id))
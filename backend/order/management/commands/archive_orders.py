@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from order.service.archiveService import ArchiveService
+
+
+class Command(BaseCommand):
+    help = "Move orders delivered or cancelled more than --days days ago into ArchivedOrder rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=180)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-batches', type=int, default=None, help="Stop after this many batches.")
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--days must be >= 0 and --batch-size >= 1.")
+        archived = ArchiveService.archive(options['days'], options['batch_size'], options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} orders."))
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from order.service.cartService import CartService
+
+
+class Command(BaseCommand):
+    help = (
+        "Write carts changed in the shared cart store to the database. "
+        "Carts in a LocalCartStore live in their web process and are flushed by its own thread."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'CART_STORE', {}).get('FLUSH_BATCH_SIZE', 500))
+        parser.add_argument('--loop', action='store_true', help="Keep flushing until interrupted.")
+        parser.add_argument('--interval', type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = CartService.flush_all(options['batch_size'])
+            if not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} carts."))
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
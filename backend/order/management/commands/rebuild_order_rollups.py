@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from order.service.rollupService import RollupService
+
+
+class Command(BaseCommand):
+    help = "Recompute the sales and status rollups from the whole order history, in parallel chunks of orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Threads aggregating chunks; 1 runs inline.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Orders per chunk.")
+
+    def handle(self, *args, **options):
+        folded = RollupService.rebuild(options['workers'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the rollups from {folded} history rows."))
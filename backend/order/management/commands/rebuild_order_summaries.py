@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from order.repositories.order import OrderRepositories
+
+
+class Command(BaseCommand):
+    help = "Rebuild the OrderSummary read model from the order tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = OrderRepositories.rebuild_summaries(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt summaries for {rebuilt} orders."))
@@ -0,0 +1,43 @@
+import sys
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from order.service.orderService import OrderService
+
+
+class Command(BaseCommand):
+    help = "Move many orders to one status, checking each move against the order state machine."
+
+    def add_arguments(self, parser):
+        parser.add_argument('status')
+        parser.add_argument('order_ids', nargs='*', help="Order ids; read from --file when omitted.")
+        parser.add_argument('--file', help="File with one order id per line ('-' for stdin).")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        order_ids = list(options['order_ids'])
+        if options['file']:
+            source = sys.stdin if options['file'] == '-' else open(options['file'])
+            with source:
+                order_ids += [line.strip() for line in source if line.strip()]
+        if not order_ids:
+            raise CommandError("No order ids given.")
+        invalid = []
+        for order_id in order_ids:
+            try:
+                uuid.UUID(order_id)
+            except ValueError:
+                invalid.append(order_id)
+        if invalid:
+            raise CommandError(f"Invalid order ids: {', '.join(invalid)}")
+
+        try:
+            result = OrderService.bulk_transition(order_ids, options['status'], options['batch_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for order_id, reason in result['skipped'].items():
+            self.stderr.write(f"{order_id}: {reason}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {len(result['updated'])} orders to {options['status']}; skipped {len(result['skipped'])}."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from order.service.rollupService import RollupService
+
+
+class Command(BaseCommand):
+    help = "Fold order status history written since the last run into the sales and status rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        folded = RollupService.update(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Folded {folded} history rows into the rollups."))
@@ -0,0 +1,40 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+
+def move_items_to_carts(apps, schema_editor):
+    """
+    Rebuild cart lines from the old cart <-> item M2M.
+
+    Items used to be shared between carts by product_id, so each cart gets
+    its own copy of every line it referenced, merged per product.
+    """
+    CartModel = apps.get_model('order', 'CartModel')
+    CartItem = apps.get_model('order', 'CartItem')
+    Through = CartModel.items.through
+
+    lines = defaultdict(int)
+    for cart_id, product_id, quantity in Through.objects.values_list(
+        'cartmodel_id', 'cartitem__product_id', 'cartitem__quantity'
+    ).iterator():
+        lines[(cart_id, product_id)] += quantity
+
+    Through.objects.all().delete()
+    CartItem.objects.all().delete()
+    CartItem.objects.bulk_create(
+        [CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+         for (cart_id, product_id), quantity in lines.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0004_cartitem_cart'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_items_to_carts, migrations.RunPython.noop),
+    ]
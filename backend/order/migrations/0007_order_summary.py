@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0006_cartitem_unique_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSummary',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='order.ordermodel')),
+                ('user_id', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], default='pending', max_length=50)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('item_count', models.IntegerField(default=0)),
+                ('first_product_id', models.CharField(blank=True, default='', max_length=100)),
+                ('first_product_name', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ordermodel',
+            index=models.Index(fields=['user_id', '-created_at', '-id'], name='order_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordersummary',
+            index=models.Index(fields=['user_id', '-created_at', '-order'], name='order_summary_user_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:32
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_user_ids(apps, schema_editor):
+    """Fill OrderStatusHistory.user_id from the orders with one UPDATE."""
+    OrderModel = apps.get_model('order', 'OrderModel')
+    OrderStatusHistory = apps.get_model('order', 'OrderStatusHistory')
+    OrderStatusHistory.objects.update(
+        user_id=Subquery(OrderModel.objects.filter(pk=OuterRef('order_id')).values('user_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0007_order_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderstatushistory',
+            name='user_id',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.RunPython(copy_user_ids, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='orderstatushistory',
+            index=models.Index(fields=['user_id', '-changed_at', '-id'], name='history_user_recent_idx'),
+        ),
+    ]
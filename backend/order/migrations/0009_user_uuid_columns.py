@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0008_history_user_id'),
+    ]
+
+    operations = [
+        migrations.AddField(model_name='cartmodel', name='user_uuid', field=models.UUIDField(null=True)),
+        migrations.AddField(model_name='ordermodel', name='user_uuid', field=models.UUIDField(null=True)),
+        migrations.AddField(model_name='orderstatushistory', name='user_uuid', field=models.UUIDField(null=True)),
+        migrations.AddField(model_name='ordersummary', name='user_uuid', field=models.UUIDField(null=True)),
+    ]
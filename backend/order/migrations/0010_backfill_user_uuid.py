@@ -0,0 +1,83 @@
+import uuid
+
+from django.db import migrations, transaction
+from django.db.models import Count
+
+BATCH_SIZE = 2000
+
+# Ids that are not UUIDs (test or legacy rows) map to a stable uuid5 so the
+# rows survive; no account has such an id.
+LEGACY_NAMESPACE = uuid.UUID('6f1c7a52-1b0e-4f4e-9b59-2f3d8f0e6c11')
+
+
+def to_uuid(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return uuid.uuid5(LEGACY_NAMESPACE, str(value))
+
+
+def backfill(model):
+    """Copy user_id into user_uuid in pk order, one short transaction per batch."""
+    last_pk = None
+    while True:
+        rows = model.objects.order_by('pk')
+        if last_pk is not None:
+            rows = rows.filter(pk__gt=last_pk)
+        batch = list(rows.only('pk', 'user_id')[:BATCH_SIZE])
+        if not batch:
+            return
+        for row in batch:
+            row.user_uuid = to_uuid(row.user_id)
+        with transaction.atomic():
+            model.objects.bulk_update(batch, ['user_uuid'])
+        last_pk = batch[-1].pk
+
+
+def merge_duplicate_carts(cart_model, item_model):
+    """
+    Fold carts whose user ids map to the same UUID into one of them.
+
+    ``uuid.UUID`` ignores case, so legacy ids such as 'ABC…' and 'abc…'
+    collide, while 0011 makes the column unique. Lines for the same product
+    are added up.
+    """
+    duplicated = list(
+        cart_model.objects.values_list('user_uuid', flat=True)
+        .annotate(carts=Count('pk'))
+        .filter(carts__gt=1)
+    )
+    for user_uuid in duplicated:
+        with transaction.atomic():
+            kept, *others = cart_model.objects.filter(user_uuid=user_uuid).order_by('pk')
+            lines = {item.product_id: item for item in item_model.objects.filter(cart=kept)}
+            for item in item_model.objects.filter(cart__in=others).order_by('pk'):
+                line = lines.get(item.product_id)
+                if line is None:
+                    item.cart = kept
+                    item.save(update_fields=['cart'])
+                    lines[item.product_id] = item
+                else:
+                    line.quantity += item.quantity
+                    line.save(update_fields=['quantity'])
+                    item.delete()
+            cart_model.objects.filter(pk__in=[cart.pk for cart in others]).delete()
+
+
+def forwards(apps, schema_editor):
+    for name in ('CartModel', 'OrderModel', 'OrderStatusHistory', 'OrderSummary'):
+        backfill(apps.get_model('order', name))
+    merge_duplicate_carts(apps.get_model('order', 'CartModel'), apps.get_model('order', 'CartItem'))
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so large tables are not locked for the whole run
+    atomic = False
+
+    dependencies = [
+        ('order', '0009_user_uuid_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0010_backfill_user_uuid'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(model_name='ordermodel', name='order_user_recent_idx'),
+        migrations.RemoveIndex(model_name='ordersummary', name='order_summary_user_recent_idx'),
+        migrations.RemoveIndex(model_name='orderstatushistory', name='history_user_recent_idx'),
+        migrations.RemoveField(model_name='cartmodel', name='user_id'),
+        migrations.RemoveField(model_name='ordermodel', name='user_id'),
+        migrations.RemoveField(model_name='orderstatushistory', name='user_id'),
+        migrations.RemoveField(model_name='ordersummary', name='user_id'),
+        migrations.RenameField(model_name='cartmodel', old_name='user_uuid', new_name='user_id'),
+        migrations.RenameField(model_name='ordermodel', old_name='user_uuid', new_name='user_id'),
+        migrations.RenameField(model_name='orderstatushistory', old_name='user_uuid', new_name='user_id'),
+        migrations.RenameField(model_name='ordersummary', old_name='user_uuid', new_name='user_id'),
+        migrations.AlterField(model_name='cartmodel', name='user_id', field=models.UUIDField(unique=True)),
+        migrations.AlterField(model_name='ordermodel', name='user_id', field=models.UUIDField()),
+        migrations.AlterField(model_name='orderstatushistory', name='user_id', field=models.UUIDField()),
+        migrations.AlterField(model_name='ordersummary', name='user_id', field=models.UUIDField()),
+        migrations.AddIndex(
+            model_name='ordermodel',
+            index=models.Index(fields=['user_id', '-created_at', '-id'], name='order_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordersummary',
+            index=models.Index(fields=['user_id', '-created_at', '-order'], name='order_summary_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderstatushistory',
+            index=models.Index(fields=['user_id', '-changed_at', '-id'], name='history_user_recent_idx'),
+        ),
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import connections, models
+from django.utils.dateparse import parse_datetime
 from decimal import Decimal
+from typing import Dict
 import uuid
 # Canonical order status choices used across OrderModel and OrderStatusHistory
 STATUS_CHOICES = (
@@ -10,74 +12,115 @@ STATUS_CHOICES = (
     ("cancelled", "Cancelled"),
 )
 
+# Statuses an order may move to from each status. Delivered and cancelled
+# orders are final.
+STATUS_TRANSITIONS = {
+    "pending": {"processing", "cancelled"},
+    "processing": {"shipped", "cancelled"},
+    "shipped": {"delivered"},
+    "delivered": set(),
+    "cancelled": set(),
+}
+
+
+# Statuses no order leaves; orders in them can be archived
+TERMINAL_STATUSES = tuple(status for status, moves in STATUS_TRANSITIONS.items() if not moves)
+
+# An order counts as sold, with its stock deducted, once it reaches any of these
+SOLD_STATUSES = {"processing", "shipped", "delivered"}
+
+
+def can_transition(current: str, new: str) -> bool:
+    return new in STATUS_TRANSITIONS.get(current, ())
+
+
+class CartItemManager(models.Manager):
+    def add_quantity(self, cart_id, product_id: str, quantity: int) -> "CartItem":
+        """
+        Add ``quantity`` units of a product to a cart in one statement.
+
+        ``INSERT ... ON CONFLICT (cart_id, product_id) DO UPDATE`` creates the
+        line or increments it atomically, so concurrent adds of the same
+        product never lose an increment. Returns the resulting line.
+        """
+        connection = connections[self.db]
+        fields = {field.name: field for field in self.model._meta.concrete_fields}
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        item_id = uuid.uuid4()
+        params = [
+            fields['id'].get_db_prep_value(item_id, connection),
+            fields['cart'].get_db_prep_value(cart_id, connection),
+            product_id,
+            quantity,
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (id, cart_id, product_id, quantity) VALUES (%s, %s, %s, %s) "
+                f"ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = {table}.quantity + EXCLUDED.quantity "
+                f"RETURNING id, quantity",
+                params,
+            )
+            row_id, total = cursor.fetchone()
+        item = self.model(
+            id=fields['id'].to_python(row_id), cart_id=cart_id, product_id=product_id, quantity=total
+        )
+        item._state.adding = False
+        item._state.db = self.db
+        return item
+
+    def set_quantities(self, cart_id, quantities: Dict[str, int]) -> None:
+        """Upsert several lines of a cart to absolute quantities in one statement."""
+        if not quantities:
+            return
+        connection = connections[self.db]
+        fields = {field.name: field for field in self.model._meta.concrete_fields}
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        cart = fields['cart'].get_db_prep_value(cart_id, connection)
+        params = []
+        for product_id, quantity in quantities.items():
+            params += [fields['id'].get_db_prep_value(uuid.uuid4(), connection), cart, product_id, quantity]
+        values = ', '.join(['(%s, %s, %s, %s)'] * len(quantities))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (id, cart_id, product_id, quantity) VALUES {values} "
+                f"ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = EXCLUDED.quantity",
+                params,
+            )
 
 class CartItem(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    cart = models.ForeignKey('CartModel', on_delete=models.CASCADE, related_name='items')
     product_id = models.CharField(max_length=100)
     quantity = models.IntegerField(default=1)
 
+    objects = CartItemManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product_id'], name='cart_item_unique_product'),
+        ]
+
     def __str__(self):
         return f"CartItem {self.product_id} (Quantity: {self.quantity})"
     
 class CartModel(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user_id = models.CharField(max_length=100, unique=True)
-    items = models.ManyToManyField(CartItem)
+    # authentication.User pk; a plain column so the order module stays decoupled
+    user_id = models.UUIDField(unique=True)
 
     def __str__(self):
         return f"Cart for User {self.user_id}"
     
-    def add_item(self, product_id: str, quantity: int) -> None:
-        # When creating a new CartItem, provide the quantity in defaults so the
-        # DB NOT NULL constraint on quantity is satisfied. Using defaults
-        # ensures get_or_create will insert a complete row instead of creating
-        # an object with a NULL quantity which raises IntegrityError on some
-        # backends.
-        item, created = CartItem.objects.get_or_create(
-            product_id=product_id,
-            defaults={"quantity": quantity}
-        )
-
-        if not created:
-            # existing item: increment quantity
-            item.quantity += quantity
-            item.save()
-        self.items.add(item)
-        self.save()
+    def add_item(self, product_id: str, quantity: int) -> CartItem:
+        """Add ``quantity`` of a product to this cart and return the updated line."""
+        return CartItem.objects.add_quantity(self.pk, product_id, quantity)
     
     def remove_item(self, product_id: str) -> None:
-        try:
-            item = self.items.get(product_id=product_id)
-            self.items.remove(item)
-            item.delete()
-            self.save()
-        except CartItem.DoesNotExist:
-            pass
+        CartItem.objects.filter(cart=self, product_id=product_id).delete()
 
     def clear_and_delete_items(self) -> None:
-        """
-        Remove all items from this cart and delete the corresponding CartItem
-        instances. Use this when CartItem instances are not reused across carts.
-
-        This method collects items first, deletes each CartItem (which also
-        removes the through rows), and then saves the cart.
-        """
-        items = list(self.items.all())
-        for item in items:
-            try:
-                # remove m2m link (not strictly required since deleting the
-                # CartItem will remove the through row), but keep explicit
-                # to be clear
-                self.items.remove(item)
-            except Exception:
-                pass
-            try:
-                item.delete()
-            except Exception:
-                # ignore deletion errors here; callers can log if needed
-                pass
-        # ensure cart is saved and now empty
-        self.save()
+        """Delete every line of this cart with a single DELETE; the cart row is kept."""
+        CartItem.objects.filter(cart=self).delete()
 
 class OrderItem(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -95,15 +138,41 @@ class OrderItem(models.Model):
 
 class OrderModel(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user_id = models.CharField(max_length=100)
+    user_id = models.UUIDField()
     items = models.ManyToManyField(OrderItem)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of a user's orders, newest first
+            models.Index(fields=['user_id', '-created_at', '-id'], name='order_user_recent_idx'),
+            # Archival looks for orders that have sat in a final status for a while
+            models.Index(fields=['status', 'updated_at'], name='order_status_updated_idx'),
+        ]
+
     def __str__(self):
-        return f"Order {self.order_id} by User {self.user_id}"
+        return f"Order {self.id} by User {self.user_id}"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Status as last read from / written to the database; None until saved
+        self._loaded_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded_status()
+        return instance
+
+    def remember_loaded_status(self) -> None:
+        self._loaded_status = self.__dict__.get('status')
+
+    @property
+    def status_changed(self) -> bool:
+        return self._state.adding or self._loaded_status != self.status
     
     def calculate_total_price(self) -> None:
         """Recalculate the order total from its items using Decimal arithmetic.
@@ -116,21 +185,149 @@ class OrderModel(models.Model):
         # Quantize to 2 decimal places (like DecimalField with 2 decimal_places)
         total = total.quantize(Decimal('0.01'))
         self.total_price = total
-        self.save()
+        self.save(update_fields=None if self._state.adding else ['total_price', 'updated_at'])
 
-    def update_status(self, new_status: str) -> None:
+    def update_status(self, new_status: str) -> bool:
+        """
+        Move the order to ``new_status``, writing only the status columns.
+
+        Returns False, without touching the database, when the order is
+        already in that status.
+        """
+        if new_status == self.status and not self.status_changed:
+            return False
         self.status = new_status
-        self.save()
+        self.save(update_fields=None if self._state.adding else ['status', 'updated_at'])
+        return True
         
+class OrderSummary(models.Model):
+    """
+    One row per order with what the order list shows.
+
+    Written together with the order (see ``OrderRepositories``), so a page
+    of a user's orders is a single range scan of this table, with no joins
+    to the items.
+    """
+    order = models.OneToOneField(OrderModel, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    user_id = models.UUIDField()
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='pending')
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    item_count = models.IntegerField(default=0)
+    first_product_id = models.CharField(max_length=100, blank=True, default='')
+    first_product_name = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', '-created_at', '-order'], name='order_summary_user_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Summary of order {self.order_id}"
+
+
 class OrderStatusHistory(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     order = models.ForeignKey(OrderModel, on_delete=models.CASCADE, related_name='status_history')
+    # Copied from the order so a user's timeline is read without a join
+    user_id = models.UUIDField()
     status = models.CharField(max_length=50, choices=STATUS_CHOICES)
     changed_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', '-changed_at', '-id'], name='history_user_recent_idx'),
+            # Rollups read new rows in (changed_at, id) order after a watermark
+            models.Index(fields=['changed_at', 'id'], name='history_changed_idx'),
+        ]
+
     def __str__(self):
-        return f"Order {self.order.order_id} changed to {self.status} at {self.changed_at}"
+        return f"Order {self.order_id} changed to {self.status} at {self.changed_at}"
     
-    # Note: status changes are tracked via signals (pre_save/post_save on OrderModel).
+    # Note: status changes are tracked via signals (post_save on OrderModel).
     # Do NOT override save() here to avoid implicit side-effects. The signal handlers
-    # will create history rows when an OrderModel's status changes.
\ No newline at end of file
+    # will create history rows when an OrderModel's status changes.
+
+
+class DailyProductSales(models.Model):
+    """
+    Units and revenue of one product on one day.
+
+    An order counts as sold on the day it first reaches processing, shipped
+    or delivered, at its item prices. Cancelling a sold order adds its lines
+    to the ``cancelled_*`` columns on the day of the cancellation. Kept up
+    to date by ``RollupService`` from OrderStatusHistory.
+    """
+    day = models.DateField()
+    product_id = models.CharField(max_length=100)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+    cancelled_units = models.IntegerField(default=0)
+    cancelled_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product_id'], name='daily_sales_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product_id', 'day'], name='daily_sales_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"Sales of {self.product_id} on {self.day}"
+
+
+class DailyStatusTransition(models.Model):
+    """
+    Status changes made on one day, per (from, to) pair.
+
+    ``total_seconds`` is the time the orders had spent in ``from_status``,
+    so ``total_seconds / count`` is the average stay. ``from_status`` is
+    blank for the first status of an order.
+    """
+    day = models.DateField()
+    from_status = models.CharField(max_length=50, blank=True, default='')
+    to_status = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'from_status', 'to_status'], name='daily_transition_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.from_status or 'new'} -> {self.to_status} on {self.day}: {self.count}"
+
+
+class ArchivedOrder(models.Model):
+    """
+    A delivered or cancelled order moved out of the live tables.
+
+    ``document`` holds the order row, its items and its status history as
+    one JSON object (ids, decimals and datetimes as strings), written by
+    ``ArchiveService``. The live rows are deleted in the same transaction.
+    """
+    order_id = models.UUIDField(primary_key=True)
+    user_id = models.UUIDField(db_index=True)
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    document = models.JSONField()
+
+    def __str__(self):
+        return f"Archived order {self.order_id}"
+
+    def order_data(self) -> dict:
+        """The archived order with its items, typed as the live models would be."""
+        order = self.document['order']
+        return {
+            **order,
+            'total_price': Decimal(order['total_price']),
+            'created_at': parse_datetime(order['created_at']),
+            'updated_at': parse_datetime(order['updated_at']),
+            'items': [
+                {**item, 'price_per_item': Decimal(item['price_per_item'])} for item in self.document['items']
+            ],
+        }
@@ -0,0 +1,93 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from django.db.models import Exists, OuterRef
+
+from backend.utils.cursor_pagination import keyset_filter
+from order.models import TERMINAL_STATUSES, ArchivedOrder, OrderItem, OrderModel, OrderStatusHistory
+
+
+def _document(order: OrderModel, items: List[OrderItem], history: List[Tuple]) -> dict:
+    return {
+        'order': {
+            'id': str(order.pk),
+            'user_id': str(order.user_id),
+            'status': order.status,
+            'total_price': str(order.total_price),
+            'created_at': order.created_at.isoformat(),
+            'updated_at': order.updated_at.isoformat(),
+        },
+        'items': [
+            {
+                'id': str(item.pk),
+                'product_id': item.product_id,
+                'quantity': item.quantity,
+                'price_per_item': str(item.price_per_item),
+            }
+            for item in items
+        ],
+        'history': [
+            {'id': str(history_id), 'status': status, 'changed_at': changed_at.isoformat()}
+            for history_id, status, changed_at in history
+        ],
+    }
+
+
+class ArchiveRepositories:
+    """Handle database operations for archived orders."""
+
+    @staticmethod
+    def archive_batch(updated_before: datetime, history_until: Optional[Tuple[datetime, str]], limit: int) -> int:
+        """
+        Move up to ``limit`` orders that reached a final status before ``updated_before``.
+
+        Only orders whose history rows all sort at or before
+        ``history_until`` (a ``(changed_at, id)`` position) are taken, so
+        nothing newer than that is removed. Each order becomes one
+        ArchivedOrder row; the order, its items, links, history and summary
+        are deleted. Rows locked by another archiver are skipped. Call
+        inside a transaction. Returns the number of orders archived.
+        """
+        newer_history = OrderStatusHistory.objects.filter(order=OuterRef('pk'))
+        if history_until:
+            newer_history = newer_history.filter(keyset_filter(('changed_at', 'id'), history_until))
+        order_ids = list(
+            OrderModel.objects.select_for_update(skip_locked=True)
+            .filter(status__in=TERMINAL_STATUSES, updated_at__lt=updated_before)
+            .exclude(Exists(newer_history))
+            .order_by('updated_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not order_ids:
+            return 0
+
+        orders = list(OrderModel.objects.filter(pk__in=order_ids).prefetch_related('items'))
+        history: Dict[str, List[Tuple]] = {str(order_id): [] for order_id in order_ids}
+        for order_id, history_id, status, changed_at in (
+            OrderStatusHistory.objects.filter(order_id__in=order_ids)
+            .order_by('changed_at', 'id').values_list('order_id', 'id', 'status', 'changed_at')
+        ):
+            history[str(order_id)].append((history_id, status, changed_at))
+
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                order_id=order.pk,
+                user_id=order.user_id,
+                status=order.status,
+                created_at=order.created_at,
+                document=_document(order, list(order.items.all()), history[str(order.pk)]),
+            )
+            for order in orders
+        ])
+        item_ids = [item.pk for order in orders for item in order.items.all()]
+        # Cascades to the item links, the history and the summary
+        OrderModel.objects.filter(pk__in=order_ids).delete()
+        OrderItem.objects.filter(pk__in=item_ids).delete()
+        return len(orders)
+
+    @staticmethod
+    def get_archived_order(order_id: str) -> Optional[ArchivedOrder]:
+        try:
+            return ArchivedOrder.objects.get(order_id=order_id)
+        except ArchivedOrder.DoesNotExist:
+            return None
@@ -1,6 +1,6 @@
 from order.models import CartItem, CartModel
-from typing import Optional
-from django.db import IntegrityError
+from typing import Dict, Iterable, Optional
+from django.db import IntegrityError, transaction
 
 
 class CartRepositories:
@@ -32,18 +32,70 @@ class CartRepositories:
     @staticmethod
     def add_item_to_cart(cart: CartModel, product_id: str, quantity: int = 1) -> CartItem:
         """
-        Add an item to the given cart. This will reuse the CartModel.add_item
-        logic (which creates or updates a CartItem and links it to the cart).
+        Add an item to the given cart with a single upsert.
 
-        Returns the CartItem instance that was added/updated.
+        Returns the CartItem with its new total quantity.
         """
-        # Delegate to the model method which handles get_or_create and quantity update
-        cart.add_item(product_id=product_id, quantity=quantity)
-
-        # After adding, return the CartItem instance from the cart relationship
-        return cart.items.get(product_id=product_id)
+        return cart.add_item(product_id=product_id, quantity=quantity)
 
     @staticmethod
     def remove_item_from_cart(cart: CartModel, product_id: str) -> None:
         """Remove the item with `product_id` from cart (if present)."""
-        cart.remove_item(product_id)
\ No newline at end of file
+        cart.remove_item(product_id)
+
+    @staticmethod
+    def clear_cart_for_user(user_id: str) -> int:
+        """Delete every line of the user's cart; returns the number of lines removed."""
+        deleted, _ = CartItem.objects.filter(cart__user_id=user_id).delete()
+        return deleted
+
+    @staticmethod
+    def lock_cart(cart: CartModel) -> None:
+        """
+        Lock the cart row until the end of the transaction.
+
+        Serialises writers of one cart. Locking its lines is not enough: a
+        line that does not exist yet has no row to lock.
+        """
+        CartModel.objects.select_for_update().filter(pk=cart.pk).values_list('pk').first()
+
+    @staticmethod
+    def get_quantities(cart: CartModel, product_ids: Iterable[str]) -> Dict[str, int]:
+        """Current quantity of each of ``product_ids`` in the cart (absent lines omitted)."""
+        lines = CartItem.objects.filter(cart=cart, product_id__in=list(product_ids))
+        return dict(lines.values_list('product_id', 'quantity'))
+
+    @staticmethod
+    def set_item_quantities(cart: CartModel, quantities: Dict[str, int]) -> None:
+        """Set the absolute quantity of several lines with one upsert."""
+        CartItem.objects.set_quantities(cart.pk, quantities)
+
+    @staticmethod
+    def remove_items_from_cart(cart: CartModel, product_ids: Iterable[str]) -> None:
+        """Remove several lines with one DELETE."""
+        CartItem.objects.filter(cart=cart, product_id__in=list(product_ids)).delete()
+
+    @staticmethod
+    def get_lines(cart: CartModel, lock: bool = False) -> Dict[str, int]:
+        lines = CartItem.objects.filter(cart=cart)
+        if lock:
+            lines = lines.select_for_update()
+        return dict(lines.values_list('product_id', 'quantity'))
+
+    @staticmethod
+    def replace_lines(carts: Dict[str, Dict[str, int]]) -> None:
+        """
+        Overwrite the lines of several carts (cart id -> product_id -> quantity).
+
+        One DELETE and one bulk INSERT for the whole batch.
+        """
+        if not carts:
+            return
+        with transaction.atomic():
+            CartItem.objects.filter(cart_id__in=list(carts)).delete()
+            CartItem.objects.bulk_create([
+                CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+                for cart_id, lines in carts.items()
+                for product_id, quantity in lines.items()
+                if quantity > 0
+            ], batch_size=1000)
@@ -1,21 +1,122 @@
 from decimal import Decimal
 from django.db import transaction
-from order.models import OrderModel, OrderStatusHistory, OrderItem
-from typing import List
+from django.db.models import F
+from django.utils import timezone
+from order.models import OrderModel, OrderStatusHistory, OrderItem, OrderSummary, can_transition
+from product.service.product import ProductService
+from backend.utils.cursor_pagination import paginate_keyset
+from typing import Dict, List, Optional, Tuple
 
 class OrderRepositories:
     """Handle database operations for orders."""
 
     @staticmethod
-    def create_order(user_id: str, items: List[OrderItem], total_price: float) -> OrderModel:
-        order = OrderModel.objects.create(user_id=user_id, total_price=Decimal(str(total_price)))
-        order.items.set(items)
-        order.calculate_total_price()
+    def create_order(user_id: str, items: List[dict]) -> OrderModel:
+        """
+        Create the order and its items (dicts with product_id, quantity and price_per_item).
+
+        The total is computed in memory, so the order row is written once.
+        Items and their links to the order are each one bulk INSERT, however
+        many lines there are.
+        """
+        order_items = [
+            OrderItem(
+                product_id=str(item['product_id']),
+                quantity=item['quantity'],
+                price_per_item=Decimal(str(item['price_per_item'])),
+            )
+            for item in items
+        ]
+        total = sum((item.price() for item in order_items), Decimal('0')).quantize(Decimal('0.01'))
+        with transaction.atomic():
+            order = OrderModel.objects.create(user_id=user_id, total_price=total)
+            OrderItem.objects.bulk_create(order_items)
+            OrderModel.items.through.objects.bulk_create([
+                OrderModel.items.through(ordermodel_id=order.pk, orderitem_id=item.pk) for item in order_items
+            ])
+            OrderRepositories._summary(order, order_items, OrderRepositories._product_names(order_items[:1])).save(
+                force_insert=True
+            )
         return order
 
+    @staticmethod
+    def _product_names(items: List[OrderItem]) -> Dict[str, str]:
+        snapshots = ProductService.get_product_snapshots({item.product_id for item in items})
+        return {product_id: product['name'] for product_id, product in snapshots.items()}
+
+    @staticmethod
+    def _summary(order: OrderModel, items: List[OrderItem], names: Dict[str, str]) -> OrderSummary:
+        first = items[0] if items else None
+        return OrderSummary(
+            order=order,
+            user_id=order.user_id,
+            status=order.status,
+            total_price=order.total_price,
+            item_count=sum(item.quantity for item in items),
+            first_product_id=first.product_id if first else '',
+            first_product_name=names.get(first.product_id, '') if first else '',
+            created_at=order.created_at,
+        )
+
+    @staticmethod
+    def update_summary_status(order: OrderModel) -> None:
+        OrderSummary.objects.filter(order_id=order.pk).update(status=order.status)
+
+    # Every OrderSummary column but the key; a rebuild overwrites them all
+    SUMMARY_FIELDS = ('user_id', 'status', 'total_price', 'item_count', 'first_product_id', 'first_product_name',
+                      'created_at')
+
+    @staticmethod
+    def rebuild_summaries(batch_size: int = 1000) -> int:
+        """
+        Recompute every OrderSummary from the orders, one batch of orders at a time.
+
+        Each batch is its own transaction: it locks its orders, so status
+        changes to them wait, and upserts their summaries. Summaries stay
+        readable throughout, and orders created meanwhile, which write their
+        own summary, are simply overwritten with the same values.
+        """
+        total = 0
+        last_id = None
+        while True:
+            with transaction.atomic():
+                orders = OrderModel.objects.select_for_update().order_by('id').prefetch_related('items')
+                if last_id is not None:
+                    orders = orders.filter(id__gt=last_id)
+                orders = list(orders[:batch_size])
+                if not orders:
+                    return total
+                items = {order.pk: sorted(order.items.all(), key=lambda item: item.pk) for order in orders}
+                names = OrderRepositories._product_names([lines[0] for lines in items.values() if lines])
+                OrderSummary.objects.bulk_create(
+                    [OrderRepositories._summary(order, items[order.pk], names) for order in orders],
+                    update_conflicts=True,
+                    unique_fields=['order'],
+                    update_fields=OrderRepositories.SUMMARY_FIELDS,
+                )
+            total += len(orders)
+            last_id = orders[-1].pk
+
     @staticmethod
     def list_orders_for_user(user_id: str) -> List[OrderModel]:
         return OrderModel.objects.filter(user_id=user_id).order_by('-created_at')
+
+    # Newest first; both tables have a matching (user_id, created_at, id) index
+    ORDER_PAGE_ORDERING = ('-created_at', '-id')
+    SUMMARY_PAGE_ORDERING = ('-created_at', '-order_id')
+
+    @staticmethod
+    def get_orders_page(user_id: str, cursor: Optional[str] = None, limit: int = 20) -> Tuple[list, Optional[str]]:
+        """One keyset page of the user's orders with their items (one prefetch query)."""
+        orders = OrderModel.objects.filter(user_id=user_id).prefetch_related('items')
+        return paginate_keyset(orders, OrderRepositories.ORDER_PAGE_ORDERING, 'orders', cursor, limit)
+
+    @staticmethod
+    def get_order_summaries_page(user_id: str, cursor: Optional[str] = None,
+                                 limit: int = 20) -> Tuple[list, Optional[str]]:
+        """One keyset page of the user's order summaries: a single index range scan."""
+        summaries = OrderSummary.objects.filter(user_id=user_id)
+        return paginate_keyset(summaries, OrderRepositories.SUMMARY_PAGE_ORDERING, 'order-summaries', cursor, limit)
     
     @staticmethod
     def get_order_by_id(order_id: str) -> OrderModel:
@@ -24,6 +125,11 @@ class OrderRepositories:
         except OrderModel.DoesNotExist:
             return None
     
+    @staticmethod
+    def get_order_for_update(order_id) -> Optional[OrderModel]:
+        """The order with its row locked until the end of the transaction, or None."""
+        return OrderModel.objects.select_for_update().filter(id=order_id).first()
+
     @staticmethod
     def get_order_history_for_user(user_id: str) -> List[OrderStatusHistory]:
         """
@@ -32,7 +138,67 @@ class OrderRepositories:
         Useful for building a user's full order timeline without fetching each
         order individually. Results are ordered by changed_at ascending.
         """
-        return OrderStatusHistory.objects.filter(order__user_id=user_id).order_by('changed_at')
+        return OrderStatusHistory.objects.filter(user_id=user_id).order_by('changed_at')
+
+    TIMELINE_ORDERING = ('-changed_at', '-id')
+
+    @staticmethod
+    def get_timeline_page(user_id: str, cursor: Optional[str] = None, limit: int = 50,
+                          since=None) -> Tuple[list, Optional[str]]:
+        """
+        One keyset page of the user's status changes, newest first.
+
+        ``since`` keeps only changes made after that moment, for clients
+        that already hold the older ones. Served by the (user_id,
+        changed_at, id) index, so the cost does not grow with the user's
+        order count.
+        """
+        history = OrderStatusHistory.objects.filter(user_id=user_id).only('id', 'order_id', 'status', 'changed_at')
+        if since is not None:
+            history = history.filter(changed_at__gt=since)
+        return paginate_keyset(history, OrderRepositories.TIMELINE_ORDERING, 'timeline', cursor, limit)
+
+    @staticmethod
+    def transition_statuses(order_ids: List[str], new_status: str) -> Tuple[List[Tuple], Dict[str, str]]:
+        """
+        Move every order in ``order_ids`` that may go to ``new_status`` there.
+
+        The orders are read with one locking SELECT and checked against
+        ``STATUS_TRANSITIONS``. The allowed ones move with one UPDATE, and
+        their history rows are written with one bulk INSERT. The summaries
+        follow with one more UPDATE. ``post_save`` does not fire; callers
+        enqueue the follow-up jobs themselves.
+
+        Returns the ``(id, user_id, old_status)`` of the moved orders and
+        the reason each other id was skipped. Call inside a transaction.
+        """
+        current = {
+            str(order_id): (order_id, user_id, status)
+            for order_id, user_id, status in OrderModel.objects.select_for_update()
+            .filter(pk__in=order_ids).order_by('pk').values_list('id', 'user_id', 'status')
+        }
+        moved, skipped = [], {}
+        for order_id in dict.fromkeys(str(order_id) for order_id in order_ids):
+            row = current.get(order_id)
+            if row is None:
+                skipped[order_id] = "Order not found."
+            elif row[2] == new_status:
+                skipped[order_id] = f"Order is already {new_status}."
+            elif not can_transition(row[2], new_status):
+                skipped[order_id] = f"Cannot move an order from {row[2]} to {new_status}."
+            else:
+                moved.append(row)
+        if not moved:
+            return moved, skipped
+
+        ids = [row[0] for row in moved]
+        OrderModel.objects.filter(pk__in=ids).update(status=new_status, updated_at=timezone.now())
+        OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(order_id=order_id, user_id=user_id, status=new_status)
+            for order_id, user_id, _ in moved
+        ])
+        OrderSummary.objects.filter(order_id__in=ids).update(status=new_status)
+        return moved, skipped
 
     @staticmethod
     def add_order_item(order: OrderModel, product_id: str, quantity: int, price_per_item: float) -> OrderItem:
@@ -40,8 +206,13 @@ class OrderRepositories:
         Create an OrderItem and attach it to the provided OrderModel.
 
         This operation is done inside a transaction to ensure the item is
-        created and the order total is updated atomically.
+        created and the order total is updated atomically. Only pending
+        orders take items: the rollups read the lines of sold orders when
+        they fold them, so those lines must not change. Raises ValueError
+        otherwise.
         """
+        if order.status != 'pending':
+            raise ValueError("Only pending orders can be changed.")
         with transaction.atomic():
             item = OrderItem.objects.create(
                 product_id=product_id,
@@ -51,4 +222,7 @@ class OrderRepositories:
             order.items.add(item)
             # Recalculate and persist the order total
             order.calculate_total_price()
+            OrderSummary.objects.filter(order_id=order.pk).update(
+                total_price=order.total_price, item_count=F('item_count') + quantity
+            )
         return item
\ No newline at end of file
@@ -0,0 +1,194 @@
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from django.db.models import Sum
+from django.utils.dateparse import parse_datetime
+
+from backend.utils.cursor_pagination import keyset_filter
+from order.models import ArchivedOrder, DailyProductSales, DailyStatusTransition, OrderModel, OrderStatusHistory
+from product.models import PipelineCheckpoint
+
+
+# PipelineCheckpoint name of the last history row folded into the rollups
+WATERMARK = 'order-rollups'
+
+SALES_FIELDS = ('units', 'revenue', 'orders', 'cancelled_units', 'cancelled_revenue')
+TRANSITION_FIELDS = ('count', 'total_seconds')
+
+
+class RollupRepositories:
+    """Handle database operations for the sales and order status rollups."""
+
+    @staticmethod
+    def lock_watermark() -> Optional[Tuple[datetime, str]]:
+        """
+        Lock and return the ``(changed_at, id)`` of the last history row rolled up.
+
+        Holding the lock until the end of the transaction keeps two updaters
+        from folding the same rows in twice. Call inside a transaction.
+        """
+        PipelineCheckpoint.objects.get_or_create(name=WATERMARK)
+        position = PipelineCheckpoint.objects.select_for_update().get(name=WATERMARK).position
+        if not position:
+            return None
+        changed_at, history_id = position.split('|')
+        return parse_datetime(changed_at), history_id
+
+    @staticmethod
+    def save_watermark(position: Optional[Tuple[datetime, str]]) -> None:
+        value = f'{position[0].isoformat()}|{position[1]}' if position else ''
+        PipelineCheckpoint.objects.filter(name=WATERMARK).update(position=value)
+
+    @staticmethod
+    def get_watermark() -> Optional[datetime]:
+        position = PipelineCheckpoint.objects.filter(name=WATERMARK).values_list('position', flat=True).first()
+        return parse_datetime(position.split('|')[0]) if position else None
+
+    @staticmethod
+    def get_history_after(position: Optional[Tuple[datetime, str]], until: datetime, limit: int) -> List[Tuple]:
+        """The next ``limit`` history rows after ``position``, up to ``until``, oldest first."""
+        history = OrderStatusHistory.objects.filter(changed_at__lte=until).order_by('changed_at', 'id')
+        if position:
+            history = history.filter(keyset_filter(('changed_at', 'id'), position))
+        return list(history.values_list('id', 'order_id', 'status', 'changed_at')[:limit])
+
+    @staticmethod
+    def get_last_history_position(until: datetime) -> Optional[Tuple[datetime, str]]:
+        row = (
+            OrderStatusHistory.objects.filter(changed_at__lte=until)
+            .order_by('-changed_at', '-id').values_list('changed_at', 'id').first()
+        )
+        return (row[0], str(row[1])) if row else None
+
+    @staticmethod
+    def get_order_history(order_ids: List, until: Optional[Tuple[datetime, str]] = None) -> Dict[str, List[Tuple]]:
+        """Each order's history rows as ``(id, status, changed_at)``, oldest first."""
+        history = OrderStatusHistory.objects.filter(order_id__in=order_ids)
+        if until:
+            history = history.exclude(keyset_filter(('changed_at', 'id'), until))
+        rows: Dict[str, List[Tuple]] = defaultdict(list)
+        for history_id, order_id, status, changed_at in (
+            history.order_by('order_id', 'changed_at', 'id').values_list('id', 'order_id', 'status', 'changed_at')
+        ):
+            rows[str(order_id)].append((str(history_id), status, changed_at))
+        return rows
+
+    @staticmethod
+    def get_order_lines(order_ids: List) -> Dict[str, List[Tuple]]:
+        """Each order's items as ``(product_id, quantity, price_per_item)``, in one query."""
+        lines: Dict[str, List[Tuple]] = defaultdict(list)
+        for order_id, product_id, quantity, price in OrderModel.items.through.objects.filter(
+            ordermodel_id__in=order_ids
+        ).values_list('ordermodel_id', 'orderitem__product_id', 'orderitem__quantity', 'orderitem__price_per_item'):
+            lines[str(order_id)].append((product_id, quantity, price))
+        return lines
+
+    @staticmethod
+    def get_order_id_chunks(chunk_size: int):
+        """Yield the ids of all orders that have history, ``chunk_size`` at a time."""
+        last_id = None
+        while True:
+            order_ids = OrderStatusHistory.objects.order_by('order_id').values_list('order_id', flat=True).distinct()
+            if last_id is not None:
+                order_ids = order_ids.filter(order_id__gt=last_id)
+            chunk = list(order_ids[:chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1]
+
+    @staticmethod
+    def get_archived_id_chunks(chunk_size: int):
+        """Yield the ids of all archived orders, ``chunk_size`` at a time."""
+        last_id = None
+        while True:
+            order_ids = ArchivedOrder.objects.order_by('order_id').values_list('order_id', flat=True)
+            if last_id is not None:
+                order_ids = order_ids.filter(order_id__gt=last_id)
+            chunk = list(order_ids[:chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1]
+
+    @staticmethod
+    def get_archived_history(order_ids: List) -> Tuple[Dict[str, List[Tuple]], Dict[str, List[Tuple]]]:
+        """The history and lines of archived orders, shaped as ``get_order_history`` and ``get_order_lines``."""
+        history: Dict[str, List[Tuple]] = {}
+        lines: Dict[str, List[Tuple]] = {}
+        for order_id, document in ArchivedOrder.objects.filter(order_id__in=order_ids).values_list('order_id', 'document'):
+            history[str(order_id)] = [
+                (row['id'], row['status'], parse_datetime(row['changed_at'])) for row in document['history']
+            ]
+            lines[str(order_id)] = [
+                (item['product_id'], item['quantity'], Decimal(item['price_per_item'])) for item in document['items']
+            ]
+        return history, lines
+
+    @staticmethod
+    def add(sales: Dict[Tuple, list], transitions: Dict[Tuple, list]) -> None:
+        """
+        Add in-memory deltas to the rollup rows.
+
+        ``sales`` maps ``(day, product_id)`` and ``transitions`` maps
+        ``(day, from_status, to_status)`` to values in ``SALES_FIELDS`` /
+        ``TRANSITION_FIELDS`` order. Existing rows are locked and updated
+        with one bulk UPDATE, and missing rows are inserted with one bulk
+        INSERT. Call inside a transaction.
+        """
+        RollupRepositories._add(DailyProductSales, ('day', 'product_id'), SALES_FIELDS, sales)
+        RollupRepositories._add(DailyStatusTransition, ('day', 'from_status', 'to_status'), TRANSITION_FIELDS, transitions)
+
+    @staticmethod
+    def _add(model, key_fields: Tuple[str, ...], value_fields: Tuple[str, ...], deltas: Dict[Tuple, list]) -> None:
+        if not deltas:
+            return
+        candidates = model.objects.select_for_update().filter(
+            day__in={key[0] for key in deltas}, **{f'{key_fields[1]}__in': {key[1] for key in deltas}}
+        )
+        existing = {}
+        for row in candidates:
+            key = tuple(getattr(row, field) for field in key_fields)
+            if key in deltas:
+                existing[key] = row
+        created = []
+        for key, values in deltas.items():
+            row = existing.get(key)
+            if row is None:
+                created.append(model(**dict(zip(key_fields, key)), **dict(zip(value_fields, values))))
+                continue
+            for field, value in zip(value_fields, values):
+                setattr(row, field, getattr(row, field) + value)
+        model.objects.bulk_update(existing.values(), value_fields, batch_size=500)
+        model.objects.bulk_create(created, batch_size=500)
+
+    @staticmethod
+    def replace(sales: Dict[Tuple, list], transitions: Dict[Tuple, list]) -> None:
+        """Swap the rollup tables' contents for these totals. Call inside a transaction."""
+        DailyProductSales.objects.all().delete()
+        DailyStatusTransition.objects.all().delete()
+        RollupRepositories.add(sales, transitions)
+
+    @staticmethod
+    def get_sales(start: date, end: date, product_id: Optional[str] = None) -> List[DailyProductSales]:
+        rows = DailyProductSales.objects.filter(day__gte=start, day__lte=end)
+        if product_id:
+            rows = rows.filter(product_id=product_id)
+        return list(rows.order_by('day', 'product_id'))
+
+    @staticmethod
+    def get_transitions(start: date, end: date) -> List[DailyStatusTransition]:
+        return list(
+            DailyStatusTransition.objects.filter(day__gte=start, day__lte=end).order_by('day', 'from_status', 'to_status')
+        )
+
+    @staticmethod
+    def get_status_durations(start: date, end: date) -> List[dict]:
+        """Changes and total seconds spent per status over ``start..end``."""
+        return list(
+            DailyStatusTransition.objects.filter(day__gte=start, day__lte=end).exclude(from_status='')
+            .values('from_status').annotate(count=Sum('count'), total_seconds=Sum('total_seconds'))
+            .order_by('from_status')
+        )
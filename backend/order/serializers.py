@@ -1,62 +1,124 @@
 from rest_framework import serializers
-from .models import CartModel, CartItem, OrderModel, OrderItem, OrderStatusHistory
+from .models import OrderModel, OrderItem, OrderStatusHistory, OrderSummary, STATUS_CHOICES
 
-class CartItemSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = CartItem
-        fields = '__all__'
-        
-class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True)
-    
-    class Meta:
-        model = CartModel
-        fields = '__all__'
+class CartItemSerializer(serializers.Serializer):
+    product_id = serializers.CharField()
+    quantity = serializers.IntegerField()
+    name = serializers.CharField(allow_null=True)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    image_url = serializers.URLField(allow_null=True)
+    available_stock = serializers.IntegerField()
+    in_stock = serializers.BooleanField()
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+
+
+class CartSerializer(serializers.Serializer):
+    """Priced cart as built by ``CartService``."""
+    id = serializers.UUIDField()
+    user_id = serializers.CharField()
+    items = CartItemSerializer(many=True)
+    item_count = serializers.IntegerField()
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
         
+class ProductIdField(serializers.UUIDField):
+    """
+    A product primary key, returned in the canonical string form.
+
+    Cart lines, holds and order items store product ids as strings and are
+    matched against ``str(product.pk)``, so every spelling of a UUID must
+    reach them as the same lowercase, hyphenated string.
+    """
+
+    def to_internal_value(self, data):
+        return str(super().to_internal_value(data))
+
+
 class CartAddItemSerializer(serializers.Serializer):
-    product_id = serializers.CharField(max_length=100)
+    product_id = ProductIdField()
     quantity = serializers.IntegerField(min_value=1)
     
-    def validate_product_id(self, value):
-        if not value:
-            raise serializers.ValidationError("Product ID cannot be empty.")
-        return value
-    
 class CartRemoveItemSerializer(serializers.Serializer):
-    product_id = serializers.CharField(max_length=100)
-    
-    def validate_product_id(self, value):
-        if not value:
-            raise serializers.ValidationError("Product ID cannot be empty.")
-        return value
+    product_id = ProductIdField()
     
+class CartOperationSerializer(serializers.Serializer):
+    OPERATIONS = ('add', 'set', 'remove')
+
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    product_id = ProductIdField()
+    quantity = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, attrs):
+        if attrs['op'] == 'add' and not attrs.get('quantity'):
+            raise serializers.ValidationError("add requires a quantity of at least 1.")
+        if attrs['op'] == 'set' and attrs.get('quantity') is None:
+            raise serializers.ValidationError("set requires a quantity.")
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderItem
+        fields = '__all__'
+
+
+class CreateOrderItemSerializer(serializers.Serializer):
+    # No price: orders are priced from the catalog
+    product_id = ProductIdField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
 class OrderSerializer(serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+
     class Meta:
         model = OrderModel
         fields = '__all__'
-        
-class OrderItemSerializer(serializers.ModelSerializer):
+
+
+class ArchivedOrderItemSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    product_id = serializers.CharField()
+    quantity = serializers.IntegerField()
+    price_per_item = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class ArchivedOrderSerializer(serializers.Serializer):
+    """Renders ``ArchivedOrder.order_data()`` exactly as OrderSerializer renders a live order."""
+    id = serializers.UUIDField()
+    items = ArchivedOrderItemSerializer(many=True)
+    user_id = serializers.UUIDField()
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    status = serializers.ChoiceField(choices=STATUS_CHOICES)
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField()
+
+
+class OrderSummarySerializer(serializers.ModelSerializer):
     class Meta:
-        model = OrderItem
+        model = OrderSummary
         fields = '__all__'
         
 class CreateOrderSerializer(serializers.Serializer):
-    user_id = serializers.CharField(max_length=100)
-    items = OrderItemSerializer(many=True)
-    
-    def validate_user_id(self, value):
-        if not value:
-            raise serializers.ValidationError("User ID cannot be empty.")
-        return value
+    # The order belongs to the authenticated user; no user id is accepted
+    items = CreateOrderItemSerializer(many=True)
 
 class UpdateOrderStatusSerializer(serializers.Serializer):
-    status = serializers.ChoiceField(choices=OrderModel.STATUS_CHOICES)
+    status = serializers.ChoiceField(choices=STATUS_CHOICES)
     
     def validate_status(self, value):
-        if value not in dict(OrderModel.STATUS_CHOICES):
+        if value not in dict(STATUS_CHOICES):
             raise serializers.ValidationError("Invalid order status.")
         return value
 
+class BulkOrderStatusSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=1000)
+    status = serializers.ChoiceField(choices=STATUS_CHOICES)
+
+
 class OrderStatusHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderStatusHistory
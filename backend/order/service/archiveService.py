@@ -0,0 +1,51 @@
+from datetime import timedelta
+from typing import Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from ..repositories.archive import ArchiveRepositories
+from ..repositories.rollup import RollupRepositories
+from .rollupService import RollupService
+
+
+class ArchiveService:
+    """
+    Handle business logic for archiving old orders
+
+    Delivered and cancelled orders that have not changed for a while are
+    rarely read, but their rows keep growing the indexes that serve the
+    per-user order queries. Archiving folds each one into a single
+    ArchivedOrder row. Order detail still finds it there.
+    """
+
+    @staticmethod
+    def archive(days: int, batch_size: int = 500, max_batches: Optional[int] = None) -> int:
+        """
+        Archive orders that have been delivered or cancelled for more than ``days`` days.
+
+        The rollups are brought up to date first, and only orders whose
+        whole history is already folded into them are archived; a rollup
+        rebuild reads the archived history back. Each batch is its own
+        transaction. Returns the number of orders archived.
+        """
+        RollupService.update()
+        updated_before = timezone.now() - timedelta(days=days)
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            with transaction.atomic():
+                archived = ArchiveRepositories.archive_batch(
+                    updated_before, RollupRepositories.lock_watermark(), batch_size
+                )
+            total += archived
+            batches += 1
+            if archived < batch_size:
+                break
+        return total
+
+    @staticmethod
+    def get_archived_order(order_id: str) -> Optional[dict]:
+        """The archived order with its items, or None when it was never archived."""
+        archived = ArchiveRepositories.get_archived_order(order_id)
+        return archived.order_data() if archived else None
@@ -1,8 +1,34 @@
-from repositories.cart import CartRepositories
+import atexit
+import logging
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from product.service.product import ProductService
+from product.service.reservation import ReservationService
+from ..models import CartItem
+from ..repositories.cart import CartRepositories
+from .cart_store import CartBusy, get_cart_store
+
+logger = logging.getLogger(__name__)
+
 
 class CartService:
     """
     Handle business logic for cart operations
+
+    With the default database store, adding an item places a stock hold for
+    the user's cart, and removing it releases the hold, so a cart line is
+    backed by reserved stock until the hold expires.
+
+    With a write-behind store (``settings.CART_STORE``) carts are read and
+    changed in memory and flushed to the tables in batches by a background
+    thread or the ``flush_carts`` command. No holds are placed for them:
+    stock is held when the order is created. ``checkout_snapshot`` writes
+    the cart through before an order is built from it.
     """
 
     @staticmethod
@@ -12,12 +38,285 @@ class CartService:
             cart = CartRepositories.create_cart_for_user(user_id)
         return cart
 
+    @staticmethod
+    def _store():
+        store = get_cart_store()
+        if store.write_behind:
+            _start_flusher()
+        return store
+
+    @staticmethod
+    def _load(store, user_id: str) -> dict:
+        """Read a cart from the store, filling it from the database on a miss."""
+        cart = store.load(user_id)
+        if cart is None:
+            db_cart = CartService.get_or_create_cart(user_id)
+            cart = {'id': str(db_cart.pk), 'version': 0, 'lines': CartRepositories.get_lines(db_cart)}
+            store.save(user_id, cart, dirty=False)
+        return cart
+
+    @staticmethod
+    def _fold(lines: Dict[str, int], operations: List[Dict]) -> Dict[str, int]:
+        """Apply ``add``/``set``/``remove`` operations in order to a copy of ``lines``."""
+        target = dict(lines)
+        for op in operations:
+            product_id = op['product_id']
+            if op['op'] == 'add':
+                target[product_id] = target.get(product_id, 0) + op['quantity']
+            elif op['op'] == 'set':
+                target[product_id] = op['quantity']
+            else:
+                target[product_id] = 0
+        return target
+
+    @staticmethod
+    def _cart_data(cart_id, user_id: str, lines: Dict[str, int], held: Optional[Dict[str, int]] = None) -> dict:
+        """
+        Build the cart payload with priced lines.
+
+        Products are resolved with one query, and the line and cart totals
+        are summed as Decimals in the same pass. A line whose product no
+        longer exists keeps its quantity but has no price and is not
+        counted in the total. ``held`` are the units this cart already holds,
+        which count as available to it.
+        """
+        held = held or {}
+        lines = {product_id: quantity for product_id, quantity in lines.items() if quantity > 0}
+        products = ProductService.get_product_snapshots(lines)
+        items = []
+        total = Decimal('0.00')
+        for product_id, quantity in sorted(lines.items()):
+            product = products.get(product_id)
+            if product is None:
+                items.append({
+                    'product_id': product_id, 'quantity': quantity, 'name': None, 'price': None,
+                    'image_url': None, 'available_stock': 0, 'in_stock': False, 'line_total': None,
+                })
+                continue
+            line_total = product['price'] * quantity
+            total += line_total
+            available = product['available_stock'] + held.get(product_id, 0)
+            items.append({
+                'product_id': product_id,
+                'quantity': quantity,
+                **product,
+                'available_stock': available,
+                'in_stock': available >= quantity,
+                'line_total': line_total,
+            })
+        return {
+            'id': str(cart_id),
+            'user_id': user_id,
+            'items': items,
+            'item_count': sum(lines.values()),
+            'total': total,
+        }
+
+    @staticmethod
+    def get_cart_data(user_id: str) -> dict:
+        store = CartService._store()
+        if store.write_behind:
+            cart = CartService._load(store, user_id)
+            return CartService._cart_data(cart['id'], user_id, cart['lines'])
+        cart = CartService.get_or_create_cart(user_id)
+        held = ReservationService.get_held(ReservationService.cart_reference(user_id))
+        return CartService._cart_data(cart.pk, user_id, CartRepositories.get_lines(cart), held)
+
     @staticmethod
     def add_item(user_id: str, product_id: str, quantity: int = 1):
+        """Raises InsufficientStock when the quantity cannot be held."""
+        store = CartService._store()
+        if store.write_behind:
+            with store.lock(user_id):
+                cart = CartService._load(store, user_id)
+                cart['lines'][product_id] = cart['lines'].get(product_id, 0) + quantity
+                cart['version'] += 1
+                store.save(user_id, cart)
+            return CartItem(id=None, cart_id=cart['id'], product_id=product_id, quantity=cart['lines'][product_id])
         cart = CartService.get_or_create_cart(user_id)
-        return CartRepositories.add_item_to_cart(cart, product_id, quantity)
+        with transaction.atomic():
+            ReservationService.hold(product_id, quantity, ReservationService.cart_reference(user_id))
+            return CartRepositories.add_item_to_cart(cart, product_id, quantity)
 
     @staticmethod
     def remove_item(user_id: str, product_id: str):
+        store = CartService._store()
+        if store.write_behind:
+            with store.lock(user_id):
+                cart = CartService._load(store, user_id)
+                if cart['lines'].pop(product_id, None) is not None:
+                    cart['version'] += 1
+                    store.save(user_id, cart)
+            return
         cart = CartService.get_or_create_cart(user_id)
-        CartRepositories.remove_item_from_cart(cart, product_id)
\ No newline at end of file
+        with transaction.atomic():
+            CartRepositories.remove_item_from_cart(cart, product_id)
+            ReservationService.release(ReservationService.cart_reference(user_id), [product_id])
+
+    @staticmethod
+    def apply_batch(user_id: str, operations: List[Dict]):
+        """
+        Apply a list of ``add``/``set``/``remove`` operations to the user's cart.
+
+        Operations are folded in order into one target quantity per product,
+        then written with one upsert and one delete. Stock is held or
+        released in bulk for the net change. All of it is one transaction,
+        so the query count does not depend on the number of operations, and
+        it starts by locking the cart row so concurrent batches for the same
+        cart compute their changes one after the other.
+        Raises InsufficientStock, leaving the cart untouched, when an
+        increase cannot be held. Returns the resulting cart data.
+        """
+        store = CartService._store()
+        if store.write_behind:
+            with store.lock(user_id):
+                cart = CartService._load(store, user_id)
+                cart['lines'] = {
+                    product_id: quantity
+                    for product_id, quantity in CartService._fold(cart['lines'], operations).items()
+                    if quantity > 0
+                }
+                cart['version'] += 1
+                store.save(user_id, cart)
+            return CartService._cart_data(cart['id'], user_id, cart['lines'])
+
+        cart = CartService.get_or_create_cart(user_id)
+        reference = ReservationService.cart_reference(user_id)
+        with transaction.atomic():
+            CartRepositories.lock_cart(cart)
+            current = CartRepositories.get_quantities(cart, {op['product_id'] for op in operations})
+            target = CartService._fold(current, operations)
+
+            increases, decreases, upserts, removals = {}, {}, {}, []
+            for product_id, quantity in target.items():
+                delta = quantity - current.get(product_id, 0)
+                if delta > 0:
+                    increases[product_id] = delta
+                elif delta < 0:
+                    decreases[product_id] = -delta
+                if quantity > 0 and delta:
+                    upserts[product_id] = quantity
+                elif quantity <= 0 and product_id in current:
+                    removals.append(product_id)
+
+            ReservationService.hold_many(increases, reference)
+            ReservationService.release_quantities(reference, decreases)
+            CartRepositories.set_item_quantities(cart, upserts)
+            if removals:
+                CartRepositories.remove_items_from_cart(cart, removals)
+            lines = CartRepositories.get_lines(cart)
+            held = ReservationService.get_held(reference)
+        return CartService._cart_data(cart.pk, user_id, lines, held)
+
+    @staticmethod
+    def clear_cart(user_id: str) -> None:
+        """Empty the user's cart in the store and in the database."""
+        store = CartService._store()
+        if store.write_behind:
+            with store.lock(user_id):
+                cart = CartService._load(store, user_id)
+                cart['lines'] = {}
+                cart['version'] += 1
+                CartRepositories.clear_cart_for_user(user_id)
+                store.save(user_id, cart, dirty=False)
+            return
+        CartRepositories.clear_cart_for_user(user_id)
+
+    @staticmethod
+    def checkout_snapshot(user_id: str) -> Dict[str, int]:
+        """
+        Return the cart lines an order should be built from.
+
+        A write-behind cart is written through to the database under the
+        user's cart lock first, so the tables and the returned lines agree.
+        """
+        store = CartService._store()
+        if store.write_behind:
+            with store.lock(user_id):
+                cart = CartService._load(store, user_id)
+                CartRepositories.replace_lines({cart['id']: cart['lines']})
+                store.save(user_id, cart, dirty=False)
+                return dict(cart['lines'])
+        cart = CartService.get_or_create_cart(user_id)
+        # Lock the lines when called inside the checkout transaction
+        return CartRepositories.get_lines(cart, lock=transaction.get_connection().in_atomic_block)
+
+    @staticmethod
+    def flush(batch_size: int = 500) -> int:
+        """
+        Write one batch of changed carts from the store to the database.
+
+        Each cart is read and written under the user's cart lock, so a
+        clear or checkout cannot slip in between and be overwritten with
+        the lines it replaced. A cart whose version moved on since it was
+        journalled is skipped: the change that moved it was either written
+        through or journalled again.
+
+        Returns the number of carts taken from the journal.
+        """
+        store = get_cart_store()
+        if not store.write_behind:
+            return 0
+        users, marker = store.pending(batch_size)
+        if not users:
+            # The batch may still have skipped journal slots to acknowledge
+            store.ack(marker)
+            return 0
+        try:
+            for user_id, version in users.items():
+                try:
+                    with store.lock(user_id):
+                        cart = store.load(user_id)
+                        if cart is None or cart['version'] != version:
+                            continue
+                        CartRepositories.replace_lines({cart['id']: cart['lines']})
+                except CartBusy:
+                    # The holder saves the cart again, journalling or writing it through
+                    continue
+        except Exception:
+            store.abort(marker)
+            raise
+        store.ack(marker)
+        return len(users)
+
+    @staticmethod
+    def flush_all(batch_size: int = 500) -> int:
+        total = 0
+        while True:
+            flushed = CartService.flush(batch_size)
+            total += flushed
+            if flushed < batch_size:
+                return total
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _start_flusher() -> None:
+    """Start this process's write-behind flush thread once, if an interval is configured."""
+    global _flusher
+    if _flusher is not None:
+        return
+    options = getattr(settings, 'CART_STORE', {})
+    interval = options.get('FLUSH_INTERVAL', 0)
+    if not interval:
+        return
+    batch_size = options.get('FLUSH_BATCH_SIZE', 500)
+    with _flusher_lock:
+        if _flusher is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    CartService.flush_all(batch_size)
+                except Exception:
+                    logger.exception("Cart flush failed; the carts stay pending.")
+                finally:
+                    close_old_connections()
+
+        _flusher = threading.Thread(target=run, name='cart-flusher', daemon=True)
+        _flusher.start()
+        atexit.register(CartService.flush_all, batch_size)
@@ -0,0 +1,268 @@
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+# A stored cart is a compact dict:
+#   {'id': '<CartModel pk>', 'version': 3, 'lines': {'<product id>': quantity}}
+Cart = Dict[str, Any]
+
+
+class CartBusy(RuntimeError):
+    """Another request held the user's cart lock for longer than the lock timeout."""
+
+
+class CartStore(ABC):
+    """
+    Where ``CartService`` keeps carts between requests.
+
+    Write-behind stores serve reads and writes from memory, remember which
+    carts changed and hand them to ``CartService.flush`` in batches. The
+    relational tables are then updated asynchronously.
+    """
+
+    write_behind = True
+
+    @abstractmethod
+    def load(self, user_id: str) -> Optional[Cart]:
+        ...
+
+    @abstractmethod
+    def save(self, user_id: str, cart: Cart, dirty: bool = True) -> None:
+        ...
+
+    @abstractmethod
+    def lock(self, user_id: str):
+        """
+        Context manager serialising read-modify-write cycles on one user's cart.
+
+        Raises CartBusy when the lock cannot be taken in time.
+        """
+
+    @abstractmethod
+    def pending(self, limit: int) -> Tuple[Dict[str, int], Any]:
+        """
+        Up to ``limit`` users whose carts changed, plus a marker for ``ack``.
+
+        Each user maps to the cart version last journalled for them.
+        """
+
+    @abstractmethod
+    def ack(self, marker: Any) -> None:
+        """Record that the carts returned with ``marker`` reached the database."""
+
+    def abort(self, marker: Any) -> None:
+        """The flush of the carts returned with ``marker`` failed; they stay pending."""
+
+
+class DatabaseCartStore(CartStore):
+    """No store: every cart operation goes straight to the relational tables."""
+
+    write_behind = False
+
+    def load(self, user_id: str) -> Optional[Cart]:
+        return None
+
+    def save(self, user_id: str, cart: Cart, dirty: bool = True) -> None:
+        pass
+
+    @contextmanager
+    def lock(self, user_id: str):
+        # The relational tables are locked by the database itself
+        yield
+
+    def pending(self, limit: int) -> Tuple[Dict[str, int], Any]:
+        return {}, None
+
+    def ack(self, marker: Any) -> None:
+        pass
+
+
+class LocalCartStore(CartStore):
+    """
+    Carts kept in this process's memory.
+
+    Single-process only, for tests and development. No other process sees
+    or changes these carts, and that includes ``run_jobs`` workers: a cart
+    that the ``order.clear_cart`` job clears in a worker stays full here.
+    Deployments with job workers or several web processes need
+    ``CacheCartStore``. At most ``max_size`` carts are kept. Only carts
+    already flushed are evicted.
+    """
+
+    def __init__(self, max_size: int = 10_000):
+        self.max_size = max_size
+        self._carts: "OrderedDict[str, Cart]" = OrderedDict()
+        self._dirty: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._user_locks = [threading.Lock() for _ in range(64)]
+
+    def load(self, user_id: str) -> Optional[Cart]:
+        user_id = str(user_id)
+        with self._lock:
+            cart = self._carts.get(user_id)
+            if cart is not None:
+                self._carts.move_to_end(user_id)
+                return _copy(cart)
+            return None
+
+    def save(self, user_id: str, cart: Cart, dirty: bool = True) -> None:
+        user_id = str(user_id)
+        with self._lock:
+            self._carts[user_id] = _copy(cart)
+            self._carts.move_to_end(user_id)
+            if dirty:
+                self._dirty[user_id] = cart['version']
+            for key in list(self._carts):
+                if len(self._carts) <= self.max_size:
+                    break
+                if key not in self._dirty:
+                    del self._carts[key]
+
+    @contextmanager
+    def lock(self, user_id: str):
+        with self._user_locks[hash(str(user_id)) % len(self._user_locks)]:
+            yield
+
+    def pending(self, limit: int) -> Tuple[Dict[str, int], Any]:
+        with self._lock:
+            batch = list(self._dirty.items())[:limit]
+        return dict(batch), batch
+
+    def ack(self, marker: Any) -> None:
+        with self._lock:
+            for user_id, version in marker:
+                # A write after the snapshot keeps the cart dirty
+                if self._dirty.get(user_id) == version:
+                    del self._dirty[user_id]
+
+
+class CacheCartStore(CartStore):
+    """
+    Carts kept in a shared Django cache backend (Redis in production).
+
+    Changed carts are appended to a journal: ``incr`` on a sequence key
+    gives each write a slot holding the user id and cart version. Flushers read the slots
+    past the last acknowledged position. Only one flusher drains at a time.
+
+    A writer fills its slot just after claiming it, so a flusher can find
+    an empty slot below the head. Draining stops there, and the slot is
+    only skipped once it has stayed empty for ``gap_timeout`` seconds: the
+    writer died or the cache lost the slot. Such a write reaches the
+    database with the user's next change or at checkout.
+    """
+
+    def __init__(self, alias: str = 'default', prefix: str = 'cart', ttl: int = 7 * 24 * 3600,
+                 lock_timeout: float = 5, lock_wait: float = 2, gap_timeout: float = 30):
+        self.alias = alias
+        self.prefix = prefix
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.lock_wait = min(lock_wait, lock_timeout)
+        self.gap_timeout = gap_timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, *parts) -> str:
+        return ':'.join((self.prefix,) + tuple(str(part) for part in parts))
+
+    def load(self, user_id: str) -> Optional[Cart]:
+        return self.cache.get(self._key('cart', user_id))
+
+    def save(self, user_id: str, cart: Cart, dirty: bool = True) -> None:
+        self.cache.set(self._key('cart', user_id), cart, self.ttl)
+        if dirty:
+            self.cache.add(self._key('seq'), 0, None)
+            slot = self.cache.incr(self._key('seq'))
+            self.cache.set(self._key('dirty', slot), (str(user_id), cart['version']), self.ttl)
+
+    @contextmanager
+    def lock(self, user_id: str):
+        """
+        Hold the user's lock for at most ``lock_timeout`` seconds.
+
+        The key expires after that time, so a dead holder cannot block the
+        cart for longer. Waiting more than ``lock_wait`` seconds raises
+        CartBusy. Each holder writes its own token, and only a key still
+        holding that token is deleted on the way out.
+        """
+        key = self._key('lock', user_id)
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_wait
+        delay = 0.005
+        while not self.cache.add(key, token, self.lock_timeout):
+            if time.monotonic() >= deadline:
+                raise CartBusy("The cart is being changed by another request; try again.")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        try:
+            yield
+        finally:
+            if self.cache.get(key) == token:
+                self.cache.delete(key)
+
+    def pending(self, limit: int) -> Tuple[Dict[str, int], Any]:
+        if not self.cache.add(self._key('flush-lock'), 1, 60):
+            return {}, None
+        head = self.cache.get(self._key('seq'), 0)
+        done = self.cache.get(self._key('flushed'), 0)
+        end = min(head, done + limit)
+        slots = self.cache.get_many([self._key('dirty', slot) for slot in range(done + 1, end + 1)])
+        users, drained = {}, []
+        for slot in range(done + 1, end + 1):
+            key, gap_key = self._key('dirty', slot), self._key('gap', slot)
+            if key in slots:
+                user_id, version = slots[key]
+                users[user_id] = version
+            else:
+                # Claimed but not written yet, unless it has been empty too long
+                first_seen = self.cache.get_or_set(gap_key, time.time(), self.ttl)
+                if time.time() - first_seen < self.gap_timeout:
+                    break
+            drained += [key, gap_key]
+            done = slot
+        if not drained:
+            self.cache.delete(self._key('flush-lock'))
+            return {}, None
+        return users, (done, drained)
+
+    def ack(self, marker: Any) -> None:
+        if marker is None:
+            return
+        end, slot_keys = marker
+        self.cache.set(self._key('flushed'), end, None)
+        self.cache.delete_many(slot_keys)
+        self.cache.delete(self._key('flush-lock'))
+
+    def abort(self, marker: Any) -> None:
+        if marker is not None:
+            self.cache.delete(self._key('flush-lock'))
+
+
+def _copy(cart: Cart) -> Cart:
+    return {**cart, 'lines': dict(cart['lines'])}
+
+
+_store: Optional[CartStore] = None
+_store_lock = threading.Lock()
+
+
+def get_cart_store() -> CartStore:
+    """The store named by ``settings.CART_STORE['BACKEND']`` (one per process)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                options = getattr(settings, 'CART_STORE', {})
+                path = options.get('BACKEND', 'order.service.cart_store.DatabaseCartStore')
+                _store = import_string(path)(**options.get('OPTIONS', {}))
+    return _store
@@ -1,4 +1,21 @@
-from repositories.order import OrderRepositories
+from typing import Dict, List
+
+from django.db import transaction
+from jobs.service.queue import JobService
+from product.service.product import ProductService
+from product.service.reservation import ReservationService
+from ..job_handlers import jobs_for_status
+from ..models import STATUS_TRANSITIONS
+from ..repositories.order import OrderRepositories
+from .cartService import CartService
+
+
+class EmptyCart(ValueError):
+    """Raised when checking out a cart with no lines."""
+
+
+class OrderNotEditable(ValueError):
+    """Raised when changing the items of an order that is no longer pending."""
 
 
 class OrderService:
@@ -7,13 +24,80 @@ class OrderService:
     """
 
     @staticmethod
-    def create_order(user_id: str, items: list, total_price: float):
-        return OrderRepositories.create_order(user_id, items, total_price)
+    def create_order(user_id: str, items: list):
+        """
+        Create an order from ``items`` (dicts with product_id, quantity and
+        price_per_item) and hold stock for it.
+
+        The user's cart holds on the same products are handed over to the
+        order. Raises InsufficientStock, leaving nothing behind, when a line
+        cannot be held.
+        """
+        with transaction.atomic():
+            order = OrderRepositories.create_order(user_id, items)
+            lines = {}
+            for item in items:
+                lines[str(item['product_id'])] = lines.get(str(item['product_id']), 0) + item['quantity']
+            ReservationService.hold_order(order.id, lines, release_from=ReservationService.cart_reference(user_id))
+        return order
+
+    @staticmethod
+    def place_order(user_id: str, lines: Dict[str, int]):
+        """
+        Create an order for ``lines`` (product_id -> quantity) in one transaction.
+
+        Priced from the catalog exactly like ``checkout``; raises ValueError
+        for products that do not exist, or InsufficientStock.
+        """
+        with transaction.atomic():
+            return OrderService._create_priced_order(user_id, lines)
+
+    @staticmethod
+    def checkout(user_id: str):
+        """
+        Turn the user's cart into an order in one transaction.
+
+        Prices come from the catalog, never from the client: every line is
+        priced with one query. The order, its items and the stock holds are
+        written in bulk, and the cart is emptied. The number of queries
+        therefore does not grow with the number of lines. Raises EmptyCart,
+        ValueError for products that no longer exist, or InsufficientStock;
+        in each case nothing is written.
+        """
+        with transaction.atomic():
+            lines = CartService.checkout_snapshot(user_id)
+            lines = {product_id: quantity for product_id, quantity in lines.items() if quantity > 0}
+            if not lines:
+                raise EmptyCart("Cart is empty.")
+            order = OrderService._create_priced_order(user_id, lines)
+            CartService.clear_cart(user_id)
+        return order
+
+    @staticmethod
+    def _create_priced_order(user_id: str, lines: Dict[str, int]):
+        products = ProductService.get_product_snapshots(lines)
+        missing = sorted(set(lines) - set(products))
+        if missing:
+            raise ValueError(f"Products no longer available: {', '.join(missing)}")
+        items = [
+            {'product_id': product_id, 'quantity': quantity, 'price_per_item': products[product_id]['price']}
+            for product_id, quantity in lines.items()
+        ]
+        order = OrderRepositories.create_order(user_id, items)
+        ReservationService.hold_order(order.id, lines, release_from=ReservationService.cart_reference(user_id))
+        return order
 
     @staticmethod
     def list_orders_for_user(user_id: str):
         return OrderRepositories.list_orders_for_user(user_id)
 
+    @staticmethod
+    def list_orders_page(user_id: str, cursor=None, limit: int = 20, summary: bool = False):
+        """Raises InvalidCursor for a cursor that does not belong to this listing."""
+        if summary:
+            return OrderRepositories.get_order_summaries_page(user_id, cursor, limit)
+        return OrderRepositories.get_orders_page(user_id, cursor, limit)
+
     @staticmethod
     def get_order_details(order_id: str):
         return OrderRepositories.get_order_by_id(order_id)
@@ -23,5 +107,72 @@ class OrderService:
         return OrderRepositories.get_order_history_for_user(user_id)
 
     @staticmethod
-    def add_order_item(order, product_id: str, quantity: int, price_per_item: float):
-        return OrderRepositories.add_order_item(order, product_id, quantity, price_per_item)
\ No newline at end of file
+    def get_timeline(user_id: str, cursor=None, limit: int = 50, since=None) -> dict:
+        """
+        A page of the user's order timeline, grouped by order.
+
+        Orders appear in the order of their newest change on the page; an
+        order whose changes span two pages appears on both. ``latest`` is
+        the newest change time on the page, to pass back as ``since``.
+        """
+        rows, next_cursor = OrderRepositories.get_timeline_page(user_id, cursor, limit, since)
+        groups = {}
+        for row in rows:
+            group = groups.setdefault(row.order_id, {'order_id': str(row.order_id), 'events': []})
+            group['events'].append({'status': row.status, 'changed_at': row.changed_at})
+        return {
+            'results': list(groups.values()),
+            'next_cursor': next_cursor,
+            'latest': rows[0].changed_at if rows else since,
+        }
+
+    @staticmethod
+    def bulk_transition(order_ids: List[str], new_status: str, batch_size: int = 500) -> dict:
+        """
+        Move many orders to ``new_status`` at once.
+
+        Each batch of ``batch_size`` orders is one transaction with a fixed
+        number of statements: the locking read, the status UPDATE, the
+        history INSERT, the summary UPDATE and the INSERT of all the jobs
+        the signal would have queued one order at a time. Orders whose
+        current status does not allow the move are skipped, with a reason.
+        Raises ValueError for an unknown status.
+        """
+        if new_status not in STATUS_TRANSITIONS:
+            raise ValueError(f"Unknown order status '{new_status}'.")
+        order_ids = list(dict.fromkeys(str(order_id) for order_id in order_ids))
+        updated, skipped = [], {}
+        for start in range(0, len(order_ids), batch_size):
+            with transaction.atomic():
+                moved, batch_skipped = OrderRepositories.transition_statuses(
+                    order_ids[start:start + batch_size], new_status
+                )
+                jobs = [job for order_id, _, _ in moved for job in jobs_for_status(order_id, new_status)]
+                if jobs:
+                    JobService.enqueue_many(jobs)
+            updated.extend(str(order_id) for order_id, _, _ in moved)
+            skipped.update(batch_skipped)
+        return {'status': new_status, 'updated': updated, 'skipped': skipped}
+
+    @staticmethod
+    def add_order_item(user_id: str, order_id, product_id: str, quantity: int):
+        """
+        Add ``quantity`` units of a product to the user's pending order.
+
+        The line is priced from the catalog and its stock is held for the
+        order before the item is written. Returns None when the order does
+        not exist or belongs to another user. Raises OrderNotEditable once
+        the order has left ``pending``, ValueError for an unknown product,
+        or InsufficientStock.
+        """
+        with transaction.atomic():
+            order = OrderRepositories.get_order_for_update(order_id)
+            if order is None or str(order.user_id) != str(user_id):
+                return None
+            if order.status != 'pending':
+                raise OrderNotEditable("Only pending orders can be changed.")
+            product = ProductService.get_product_snapshots([product_id]).get(str(product_id))
+            if product is None:
+                raise ValueError(f"Product {product_id} does not exist.")
+            ReservationService.hold_order(order.pk, {str(product_id): quantity})
+            return OrderRepositories.add_order_item(order, product_id, quantity, product['price'])
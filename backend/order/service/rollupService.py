@@ -0,0 +1,222 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import SOLD_STATUSES
+from ..repositories.rollup import SALES_FIELDS, TRANSITION_FIELDS, RollupRepositories
+
+
+def _options() -> Dict:
+    return getattr(settings, 'ORDER_ROLLUPS', {})
+
+
+def _new_totals() -> Tuple[Dict, Dict]:
+    return (
+        defaultdict(lambda: [0, Decimal('0'), 0, 0, Decimal('0')]),
+        defaultdict(lambda: [0, 0.0]),
+    )
+
+
+def _merge(into: Tuple[Dict, Dict], totals: Tuple[Dict, Dict]) -> None:
+    for target, source in zip(into, totals):
+        for key, values in source.items():
+            target[key] = [a + b for a, b in zip(target[key], values)]
+
+
+class RollupService:
+    """
+    Handle business logic for the sales and order status rollups
+
+    Every OrderStatusHistory row is folded into DailyStatusTransition
+    exactly once, and into DailyProductSales when it sells or cancels a
+    sold order. ``update`` folds the rows written since the watermark;
+    ``rebuild`` recomputes everything from the history. Reports read only
+    the rollup tables.
+    """
+
+    @staticmethod
+    def _settled_until():
+        return timezone.now() - timedelta(seconds=_options().get('SETTLE_SECONDS', 60))
+
+    @staticmethod
+    def _fold(events: List[Tuple], history: Dict[str, List[Tuple]], lines: Dict[str, List[Tuple]],
+              totals: Tuple[Dict, Dict]) -> None:
+        """
+        Add ``(id, order_id, status, changed_at)`` history rows to ``totals``.
+
+        ``history`` must hold every earlier row of each event's order, which
+        gives the status the order left and how long it stayed there.
+        ``lines`` are the orders' items as read now, not a snapshot taken at
+        the transition; that holds because items can only be added while an
+        order is pending (see ``OrderRepositories.add_order_item``).
+        """
+        sales, transitions = totals
+        for history_id, order_id, status, changed_at in events:
+            rows = history[str(order_id)]
+            position = next(n for n, row in enumerate(rows) if row[0] == str(history_id))
+            previous = rows[position - 1] if position else None
+            from_status = previous[1] if previous else ''
+            day = timezone.localdate(changed_at)
+
+            transition = transitions[(day, from_status, status)]
+            transition[0] += 1
+            transition[1] += (changed_at - previous[2]).total_seconds() if previous else 0.0
+
+            if status in SOLD_STATUSES and from_status not in SOLD_STATUSES:
+                for product_id, quantity, price in lines[str(order_id)]:
+                    line = sales[(day, product_id)]
+                    line[0] += quantity
+                    line[1] += quantity * price
+                    line[2] += 1
+            elif status == 'cancelled' and from_status in SOLD_STATUSES:
+                for product_id, quantity, price in lines[str(order_id)]:
+                    line = sales[(day, product_id)]
+                    line[3] += quantity
+                    line[4] += quantity * price
+
+    @staticmethod
+    def update(batch_size: Optional[int] = None) -> int:
+        """
+        Fold the history rows written since the watermark into the rollups.
+
+        Each batch is one transaction that adds its deltas and moves the
+        watermark, so an interrupted run loses nothing and folds nothing
+        twice. Returns the number of history rows folded.
+        """
+        batch_size = batch_size or _options().get('BATCH_SIZE', 1000)
+        until = RollupService._settled_until()
+        total = 0
+        while True:
+            with transaction.atomic():
+                position = RollupRepositories.lock_watermark()
+                events = RollupRepositories.get_history_after(position, until, batch_size)
+                if not events:
+                    return total
+                order_ids = list({order_id for _, order_id, _, _ in events})
+                last = (events[-1][3], str(events[-1][0]))
+                totals = _new_totals()
+                RollupService._fold(
+                    events,
+                    RollupRepositories.get_order_history(order_ids, last),
+                    RollupRepositories.get_order_lines(order_ids),
+                    totals,
+                )
+                RollupRepositories.add(*totals)
+                RollupRepositories.save_watermark(last)
+            total += len(events)
+            if len(events) < batch_size:
+                return total
+
+    @staticmethod
+    def _rebuild_chunk(archived: bool, order_ids: List, until: Tuple) -> Tuple[Tuple[Dict, Dict], int]:
+        if archived:
+            history, lines = RollupRepositories.get_archived_history(order_ids)
+        else:
+            history = RollupRepositories.get_order_history(order_ids, until)
+            lines = RollupRepositories.get_order_lines(order_ids)
+        events = [
+            (history_id, order_id, status, changed_at)
+            for order_id, rows in history.items()
+            for history_id, status, changed_at in rows
+        ]
+        totals = _new_totals()
+        RollupService._fold(events, history, lines, totals)
+        return totals, len(events)
+
+    @staticmethod
+    def _rebuild_chunk_in_thread(archived: bool, order_ids: List, until: Tuple) -> Tuple[Tuple[Dict, Dict], int]:
+        try:
+            return RollupService._rebuild_chunk(archived, order_ids, until)
+        finally:
+            # Each worker thread opened its own connection
+            connection.close()
+
+    @staticmethod
+    def rebuild(workers: int = 4, chunk_size: int = 1000) -> int:
+        """
+        Recompute the rollups from the whole history.
+
+        Orders are split into chunks of ``chunk_size`` and aggregated by
+        ``workers`` threads, each on its own connection (``workers=1``
+        aggregates in the calling thread). Every chunk holds all the
+        history of its orders, so chunks never need each other. Archived
+        orders are read from their documents, since ``update`` folded their
+        history before they were archived. The merged totals replace the
+        tables and the watermark in one transaction; ``update`` then
+        carries on from there. Returns the number of history rows folded.
+        """
+        totals = _new_totals()
+        folded = 0
+        # The watermark stays locked to the end, so archiving (which takes
+        # the same lock) cannot move orders between the chunk lists.
+        with transaction.atomic():
+            positions = [
+                RollupRepositories.lock_watermark(),
+                RollupRepositories.get_last_history_position(RollupService._settled_until()),
+            ]
+            until = max((position for position in positions if position), default=None)
+            chunks = [(True, chunk) for chunk in RollupRepositories.get_archived_id_chunks(chunk_size)]
+            if until:
+                chunks += [(False, chunk) for chunk in RollupRepositories.get_order_id_chunks(chunk_size)]
+            if workers <= 1:
+                results = [RollupService._rebuild_chunk(archived, chunk, until) for archived, chunk in chunks]
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(lambda job: RollupService._rebuild_chunk_in_thread(*job, until), chunks))
+            for chunk_totals, count in results:
+                _merge(totals, chunk_totals)
+                folded += count
+            RollupRepositories.replace(*totals)
+            RollupRepositories.save_watermark(until)
+        return folded
+
+    @staticmethod
+    def sales_report(start: date, end: date, product_id: Optional[str] = None) -> dict:
+        rows = RollupRepositories.get_sales(start, end, product_id)
+        days: Dict[date, dict] = {}
+        for row in rows:
+            day = days.setdefault(row.day, {
+                'day': row.day, 'revenue': Decimal('0'), 'units': 0, 'cancelled_revenue': Decimal('0'), 'products': [],
+            })
+            day['revenue'] += row.revenue
+            day['units'] += row.units
+            day['cancelled_revenue'] += row.cancelled_revenue
+            day['products'].append({field: getattr(row, field) for field in ('product_id',) + SALES_FIELDS})
+        return {
+            'start': start,
+            'end': end,
+            'as_of': RollupRepositories.get_watermark(),
+            'revenue': sum((day['revenue'] - day['cancelled_revenue'] for day in days.values()), Decimal('0')),
+            'days': list(days.values()),
+        }
+
+    @staticmethod
+    def status_report(start: date, end: date) -> dict:
+        return {
+            'start': start,
+            'end': end,
+            'as_of': RollupRepositories.get_watermark(),
+            'statuses': [
+                {
+                    'status': row['from_status'],
+                    'transitions': row['count'],
+                    'average_seconds': row['total_seconds'] / row['count'] if row['count'] else 0.0,
+                }
+                for row in RollupRepositories.get_status_durations(start, end)
+            ],
+            'days': [
+                {
+                    'day': row.day,
+                    'from_status': row.from_status,
+                    'to_status': row.to_status,
+                    **{field: getattr(row, field) for field in TRANSITION_FIELDS},
+                }
+                for row in RollupRepositories.get_transitions(start, end)
+            ],
+        }
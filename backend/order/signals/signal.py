@@ -1,80 +1,35 @@
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.db import transaction
+from jobs.service.queue import JobService
+from ..job_handlers import jobs_for_status
 from ..models import OrderModel, OrderStatusHistory
-
-
-# Status values that should clear a user's cart when set on an order
-_CLEAR_CART_STATUSES = {"processing", "shipped"}
-
-
-@receiver(pre_save, sender=OrderModel)
-def order_pre_save(sender, instance, **kwargs):
-    """Store previous status on the instance before saving so post_save can detect changes."""
-    if not instance.pk:
-        # New instance — no previous status
-        instance._previous_status = None
-    else:
-        try:
-            previous = sender.objects.get(pk=instance.pk)
-            instance._previous_status = previous.status
-        except sender.DoesNotExist:
-            instance._previous_status = None
+from ..repositories.order import OrderRepositories
 
 
 @receiver(post_save, sender=OrderModel)
 def order_post_save(sender, instance, created, **kwargs):
-    """Create an OrderStatusHistory entry when the order's status changed or on creation.
+    """Record an OrderStatusHistory row and queue follow-up work when the status changes.
 
-    We use transaction.on_commit to ensure the history row is created after the
-    surrounding transaction commits successfully.
+    The history row and the jobs are written in the transaction that saves
+    the order, so they exist exactly when the new status does. Stock and
+    cart work runs later in ``run_jobs`` workers (see order.job_handlers),
+    where failures are retried and can be replayed.
     """
-    previous_status = getattr(instance, "_previous_status", None)
-
-    # If created or status changed, record history
-    if created or (previous_status != instance.status):
-        def _create_history():
-            OrderStatusHistory.objects.create(order=instance, status=instance.status)
-            # If the order moved into 'processing', deduct stock for each item.
-            if instance.status == 'processing':
-                try:
-                    from product.models import ProductModel
-
-                    # Deduct stock in an atomic block to avoid partial updates.
-                    with transaction.atomic():
-                        for order_item in instance.items.all():
-                            try:
-                                prod = ProductModel.objects.get(pk=order_item.product_id)
-                            except ProductModel.DoesNotExist:
-                                # Product missing -> cancel the order
-                                instance.update_status('cancelled')
-                                return
-                            try:
-                                prod.deduct_stock(order_item.quantity)
-                            except Exception:
-                                # Insufficient stock or other error -> cancel order
-                                instance.update_status('cancelled')
-                                return
-                except Exception:
-                    # swallow exceptions to avoid breaking order flow; optionally log
-                    try:
-                        instance.update_status('cancelled')
-                    except Exception:
-                        pass
-            # If the order moved into a status that should clear the user's cart,
-            # remove the cart for that user (if any). Import models lazily to avoid
-            # circular imports during app startup.
-            if instance.status in _CLEAR_CART_STATUSES:
-                try:
-                    from order.models import CartModel
-                    for cart in CartModel.objects.filter(user_id=instance.user_id):
-                            # Clear and delete the CartItem instances for this cart.
-                            # This removes items and keeps the empty CartModel row.
-                            try:
-                                cart.clear_and_delete_items()
-                            except Exception:
-                                pass
-                except Exception:
-                    # Avoid raising in signal; log if you have logging configured.
-                    pass
-        transaction.on_commit(_create_history)
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    # The status the instance was loaded with (see OrderModel.from_db), so
+    # detecting a change needs no extra query.
+    changed = created or instance._loaded_status != instance.status
+    instance.remember_loaded_status()
+    if not changed:
+        return
+
+    with transaction.atomic():
+        OrderStatusHistory.objects.create(order=instance, user_id=instance.user_id, status=instance.status)
+        if not created:
+            OrderRepositories.update_summary_status(instance)
+        jobs = jobs_for_status(instance.pk, instance.status)
+        if jobs:
+            JobService.enqueue_many(jobs)
@@ -1,3 +1,807 @@
-from django.test import TestCase
+import base64
+import json
+import threading
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authentication.models import User
+from backend.utils.query_plan import QueryPlanAssertions
+from jobs.models import Job
+from jobs.repositories.job import JobRepositories
+from jobs.service.queue import JobService
+from product.models import ProductCategory, ProductModel, StockReservation
+from product.service.reservation import ReservationService
+from . import job_handlers
+from .models import (ArchivedOrder, CartItem, CartModel, DailyProductSales, DailyStatusTransition, OrderItem,
+                     OrderModel, OrderStatusHistory, OrderSummary)
+from .repositories.cart import CartRepositories
+from .repositories.archive import ArchiveRepositories
+from .repositories.order import OrderRepositories
+from .repositories.rollup import RollupRepositories
+from .service import cart_store
+from .service.archiveService import ArchiveService
+from .service.cartService import CartService
+from .service.cart_store import CacheCartStore, CartBusy, CartStore
+from .service.orderService import OrderService
+from .service.rollupService import RollupService
+
+
+class OrderQueryPlanTests(QueryPlanAssertions, TestCase):
+    """Per-user order, history and cart reads must be answered from an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_id = uuid.uuid4()
+        for n in range(30):
+            user_id = cls.user_id if n % 3 == 0 else uuid.uuid4()
+            OrderRepositories.create_order(user_id, [
+                {'product_id': str(uuid.uuid4()), 'quantity': 1, 'price_per_item': Decimal('9.99')},
+                {'product_id': str(uuid.uuid4()), 'quantity': 2, 'price_per_item': Decimal('4.50')},
+            ])
+        for order in OrderModel.objects.filter(user_id=cls.user_id)[:5]:
+            order.update_status('processing')
+        cls.cart = CartModel.objects.create(user_id=cls.user_id)
+        for n in range(20):
+            cart = cls.cart if n == 0 else CartModel.objects.create(user_id=uuid.uuid4())
+            CartItem.objects.set_quantities(cart.pk, {str(uuid.uuid4()): 1, str(uuid.uuid4()): 2})
+
+    def test_orders_page_uses_an_index(self):
+        rows, cursor = self.assertIndexed(OrderRepositories.get_orders_page, self.user_id, None, 4)
+        self.assertEqual(len(rows), 4)
+        self.assertIndexed(OrderRepositories.get_orders_page, self.user_id, cursor, 4)
+
+    def test_order_summaries_page_uses_an_index(self):
+        rows, cursor = self.assertIndexed(OrderRepositories.get_order_summaries_page, self.user_id, None, 4)
+        self.assertEqual(len(rows), 4)
+        self.assertIndexed(OrderRepositories.get_order_summaries_page, self.user_id, cursor, 4)
+
+    def test_timeline_page_uses_an_index(self):
+        rows, cursor = self.assertIndexed(OrderRepositories.get_timeline_page, self.user_id, None, 5)
+        self.assertEqual(len(rows), 5)
+        self.assertIndexed(OrderRepositories.get_timeline_page, self.user_id, cursor, 5)
+
+    def test_order_history_uses_an_index(self):
+        history = self.assertIndexed(lambda user_id: list(OrderRepositories.get_order_history_for_user(user_id)),
+                                     self.user_id)
+        self.assertEqual(len(history), 15)
+
+    def test_cart_reads_use_an_index(self):
+        cart = self.assertIndexed(CartRepositories.get_cart_by_user_id, self.user_id)
+        self.assertEqual(cart, self.cart)
+        self.assertEqual(len(self.assertIndexed(CartRepositories.get_lines, cart)), 2)
+
+    def test_rollup_history_scan_uses_an_index(self):
+        first = self.assertIndexed(RollupRepositories.get_history_after, None, timezone.now(), 10)
+        self.assertEqual(len(first), 10)
+        position = (first[-1][3], str(first[-1][0]))
+        self.assertIndexed(RollupRepositories.get_history_after, position, timezone.now(), 10)
+
+
+class BulkTransitionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_id = uuid.uuid4()
+        cls.order_ids = [
+            str(OrderRepositories.create_order(cls.user_id, [
+                {'product_id': str(uuid.uuid4()), 'quantity': 1, 'price_per_item': Decimal('5.00')},
+            ]).pk)
+            for _ in range(20)
+        ]
+        OrderModel.objects.get(pk=cls.order_ids[0]).update_status('cancelled')
+
+    def test_moves_allowed_orders_and_skips_the_rest(self):
+        missing = str(uuid.uuid4())
+        result = OrderService.bulk_transition(self.order_ids + [missing], 'processing')
+        self.assertEqual(result['updated'], self.order_ids[1:])
+        self.assertEqual(set(result['skipped']), {self.order_ids[0], missing})
+        self.assertEqual(OrderModel.objects.filter(status='processing').count(), 19)
+        self.assertEqual(OrderSummary.objects.filter(status='processing').count(), 19)
+        self.assertEqual(
+            OrderStatusHistory.objects.filter(status='processing', user_id=self.user_id).count(), 19
+        )
+        self.assertEqual(Job.objects.filter(name='order.confirm_stock').count(), 19)
+
+    def test_rejects_moves_the_state_machine_forbids(self):
+        result = OrderService.bulk_transition(self.order_ids[1:3], 'delivered')
+        self.assertEqual(result['updated'], [])
+        self.assertFalse(OrderModel.objects.filter(status='delivered').exists())
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        with self.assertNumQueries(7):
+            OrderService.bulk_transition(self.order_ids[1:4], 'processing')
+        with self.assertNumQueries(7):
+            OrderService.bulk_transition(self.order_ids[4:], 'processing')
+
+    def test_unknown_status_is_rejected(self):
+        with self.assertRaises(ValueError):
+            OrderService.bulk_transition(self.order_ids, 'lost')
+
+
+@override_settings(ORDER_ROLLUPS={'BATCH_SIZE': 7, 'SETTLE_SECONDS': 0})
+class RollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.order_ids = [
+            str(OrderRepositories.create_order(uuid.uuid4(), [
+                {'product_id': 'p1', 'quantity': 2, 'price_per_item': Decimal('3.00')},
+                {'product_id': f'p{n % 3 + 2}', 'quantity': 1, 'price_per_item': Decimal('10.00')},
+            ]).pk)
+            for n in range(12)
+        ]
+
+    def snapshot(self):
+        return (
+            sorted(DailyProductSales.objects.values_list(
+                'day', 'product_id', 'units', 'revenue', 'orders', 'cancelled_units', 'cancelled_revenue'
+            )),
+            sorted(DailyStatusTransition.objects.values_list('day', 'from_status', 'to_status', 'count')),
+        )
+
+    def test_sales_count_sold_orders_and_their_cancellations(self):
+        OrderService.bulk_transition(self.order_ids, 'processing')
+        OrderService.bulk_transition(self.order_ids[:4], 'cancelled')
+        self.assertEqual(RollupService.update(), 28)
+        p1 = DailyProductSales.objects.get(product_id='p1')
+        self.assertEqual((p1.units, p1.revenue, p1.orders), (24, Decimal('72.00'), 12))
+        self.assertEqual((p1.cancelled_units, p1.cancelled_revenue), (8, Decimal('24.00')))
+        transitions = dict(DailyStatusTransition.objects.values_list('to_status', 'count'))
+        self.assertEqual(transitions, {'pending': 12, 'processing': 12, 'cancelled': 4})
+        report = RollupService.sales_report(timezone.localdate(), timezone.localdate())
+        self.assertEqual(report['revenue'], Decimal('192.00') - Decimal('64.00'))
+
+    def test_update_folds_each_row_once(self):
+        RollupService.update()
+        OrderService.bulk_transition(self.order_ids[:5], 'processing')
+        self.assertEqual(RollupService.update(), 5)
+        self.assertEqual(RollupService.update(), 0)
+        self.assertEqual(DailyProductSales.objects.get(product_id='p1').orders, 5)
+
+    def test_incremental_update_matches_rebuild(self):
+        RollupService.update()
+        OrderService.bulk_transition(self.order_ids[:8], 'processing')
+        OrderService.bulk_transition(self.order_ids[:3], 'shipped')
+        OrderService.bulk_transition(self.order_ids[5:8], 'cancelled')
+        RollupService.update()
+        incremental = self.snapshot()
+        self.assertEqual(RollupService.rebuild(workers=1, chunk_size=5), 26)
+        self.assertEqual(self.snapshot(), incremental)
+
+
+@override_settings(ORDER_ROLLUPS={'BATCH_SIZE': 1000, 'SETTLE_SECONDS': 0})
+class ArchiveTests(QueryPlanAssertions, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.order_ids = [
+            str(OrderRepositories.create_order(uuid.uuid4(), [
+                {'product_id': 'p1', 'quantity': 2, 'price_per_item': Decimal('3.00')},
+                {'product_id': 'p2', 'quantity': 1, 'price_per_item': Decimal('10.00')},
+            ]).pk)
+            for _ in range(10)
+        ]
+        OrderService.bulk_transition(cls.order_ids, 'processing')
+        OrderService.bulk_transition(cls.order_ids[:6], 'shipped')
+        OrderService.bulk_transition(cls.order_ids[:6], 'delivered')
+        OrderService.bulk_transition(cls.order_ids[6:8], 'cancelled')
+        # All final orders but the last delivered one are old
+        OrderModel.objects.filter(pk__in=cls.order_ids[:5] + cls.order_ids[6:8]).update(
+            updated_at=timezone.now() - timedelta(days=60)
+        )
+
+    def test_archives_old_final_orders_in_batches(self):
+        self.assertEqual(ArchiveService.archive(30, batch_size=3), 7)
+        archived = set(str(order_id) for order_id in ArchivedOrder.objects.values_list('order_id', flat=True))
+        self.assertEqual(archived, set(self.order_ids[:5] + self.order_ids[6:8]))
+        self.assertEqual(OrderModel.objects.count(), 3)
+        self.assertEqual(OrderItem.objects.count(), 6)
+        self.assertEqual(OrderSummary.objects.count(), 3)
+        self.assertFalse(OrderStatusHistory.objects.filter(order_id__in=archived).exists())
+        document = ArchivedOrder.objects.get(order_id=self.order_ids[0]).document
+        self.assertEqual([row['status'] for row in document['history']], ['pending', 'processing', 'shipped', 'delivered'])
+        self.assertEqual(ArchiveService.archive(30), 0)
+
+    def test_order_detail_falls_back_to_the_archive(self):
+        owner = User.objects.create_user(email='archive@example.com', password='x')
+        client, stranger = APIClient(), APIClient()
+        client.force_authenticate(owner)
+        stranger.force_authenticate(User.objects.create_user(email='stranger@example.com', password='x'))
+        order_id = self.order_ids[0]
+        OrderModel.objects.filter(pk=order_id).update(user_id=owner.pk)
+        live = client.get(f'/api/orders/{order_id}/').json()
+        self.assertEqual(stranger.get(f'/api/orders/{order_id}/').status_code, 404)
+        ArchiveService.archive(30)
+        self.assertFalse(OrderModel.objects.filter(pk=order_id).exists())
+        response = client.get(f'/api/orders/{order_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), live)
+        self.assertEqual(stranger.get(f'/api/orders/{order_id}/').status_code, 404)
+        self.assertEqual(client.get(f'/api/orders/{uuid.uuid4()}/').status_code, 404)
+        self.assertEqual(client.get('/api/orders/not-a-uuid/').status_code, 404)
+        self.assertEqual(client.post('/api/orders/not-a-uuid/add-item/', {}, format='json').status_code, 404)
+
+    def test_rollup_rebuild_reads_archived_history(self):
+        RollupService.update()
+        before = list(DailyProductSales.objects.order_by('product_id').values_list('product_id', 'units', 'revenue'))
+        ArchiveService.archive(30)
+        RollupService.rebuild(workers=1, chunk_size=4)
+        after = list(DailyProductSales.objects.order_by('product_id').values_list('product_id', 'units', 'revenue'))
+        self.assertEqual(after, before)
+
+    def test_archive_candidate_scan_uses_an_index(self):
+        with transaction.atomic():
+            self.assertIndexed(
+                ArchiveRepositories.archive_batch, timezone.now() - timedelta(days=30), None, 2
+            )
+
+
+class CartProductIdTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='cart@example.com', password='x')
+        cls.product = ProductModel.objects.create(
+            name='Kite', description='', category=ProductCategory.objects.create(name='toys'),
+            price=Decimal('9.00'), image_url='https://example.com/k.png', stock=5,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_malformed_product_ids_are_rejected(self):
+        for path, body in (
+            ('/api/cart/add-item/', {'product_id': 'abc', 'quantity': 1}),
+            ('/api/cart/remove-item/', {'product_id': 'abc'}),
+            ('/api/cart/batch/', {'operations': [{'op': 'add', 'product_id': 'abc', 'quantity': 1}]}),
+            ('/api/orders/create/', {'items': [{'product_id': 'abc', 'quantity': 1, 'price_per_item': '1.00'}]}),
+        ):
+            with self.subTest(path=path):
+                response = self.client.post(path, body, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(StockReservation.objects.exists())
+
+    def test_product_ids_are_stored_in_canonical_form(self):
+        canonical = str(self.product.pk)
+        for spelling in (canonical.upper(), self.product.pk.hex):
+            response = self.client.post('/api/cart/add-item/', {'product_id': spelling, 'quantity': 1}, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.json()['product_id'], canonical)
+        self.assertEqual(list(CartItem.objects.values_list('product_id', 'quantity')), [(canonical, 2)])
+        item = self.client.get('/api/cart/').json()['items'][0]
+        self.assertEqual((item['product_id'], item['name'], item['quantity']), (canonical, 'Kite', 2))
+        self.client.post('/api/cart/remove-item/', {'product_id': canonical.upper()}, format='json')
+        self.assertFalse(CartItem.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+
+
+class CartPricingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='priced@example.com', password='x')
+        category = ProductCategory.objects.create(name='toys')
+        cls.products = [
+            ProductModel.objects.create(
+                name=f'Toy {n}', description='', category=category, price=Decimal(price),
+                image_url='https://example.com/t.png', stock=4,
+            )
+            for n, price in enumerate(('2.50', '10.00', '0.10'))
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_cart(self):
+        with CaptureQueriesContext(connection) as queries:
+            cart = self.client.get('/api/cart/').json()
+        return cart, len(queries)
+
+    def test_lines_are_priced_with_one_product_query(self):
+        first, second, third = self.products
+        self.client.post('/api/cart/add-item/', {'product_id': str(first.pk), 'quantity': 2}, format='json')
+        _, one_line = self.get_cart()
+        self.client.post('/api/cart/batch/', {'operations': [
+            {'op': 'add', 'product_id': str(second.pk).upper(), 'quantity': 1},
+            {'op': 'set', 'product_id': second.pk.hex, 'quantity': 3},
+            {'op': 'add', 'product_id': str(third.pk), 'quantity': 4},
+        ]}, format='json')
+        cart, three_lines = self.get_cart()
+        self.assertEqual(three_lines, one_line)
+        self.assertEqual(cart['total'], '35.40')
+        self.assertEqual(cart['item_count'], 9)
+        lines = {item['product_id']: item for item in cart['items']}
+        self.assertEqual(lines[str(second.pk)]['line_total'], '30.00')
+        # Units this cart holds count as available to it
+        self.assertEqual((lines[str(third.pk)]['available_stock'], lines[str(third.pk)]['in_stock']), (4, True))
+
+
+class CheckoutTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='checkout@example.com', password='x')
+        category = ProductCategory.objects.create(name='toys')
+        cls.products = [
+            ProductModel.objects.create(
+                name=f'Toy {n}', description='', category=category, price=Decimal('1.25') * (n + 1),
+                image_url='https://example.com/t.png', stock=10,
+            )
+            for n in range(5)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self, products):
+        operations = [{'op': 'add', 'product_id': str(product.pk).upper(), 'quantity': 2} for product in products]
+        self.client.post('/api/cart/batch/', {'operations': operations}, format='json')
+
+    def checkout(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/orders/checkout/')
+        self.assertEqual(response.status_code, 201)
+        return response.json(), len(queries)
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        self.fill_cart(self.products[:1])
+        _, one_line = self.checkout()
+        self.fill_cart(self.products)
+        order, five_lines = self.checkout()
+        self.assertEqual(five_lines, one_line)
+        self.assertNotIn('query_count', order)
+        self.assertEqual(order['total_price'], '37.50')
+
+    def test_holds_move_from_the_cart_to_the_order(self):
+        self.fill_cart(self.products[:2])
+        order, _ = self.checkout()
+        self.assertEqual(
+            {item['product_id'] for item in order['items']}, {str(product.pk) for product in self.products[:2]}
+        )
+        self.assertEqual(
+            set(StockReservation.objects.filter(status=StockReservation.HELD).values_list('reference', 'product_id', 'quantity')),
+            {(f'order:{order["id"]}', product.pk, 2) for product in self.products[:2]},
+        )
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.client.post('/api/orders/checkout/').status_code, 400)
+
+    def test_query_count_is_reported_on_request(self):
+        self.fill_cart(self.products[:1])
+        one_line = self.client.post('/api/orders/checkout/', headers={'X-Query-Count': '1'}).json()['query_count']
+        self.fill_cart(self.products)
+        five_lines = self.client.post('/api/orders/checkout/', headers={'X-Query-Count': '1'}).json()['query_count']
+        self.assertGreater(one_line, 0)
+        self.assertEqual(five_lines, one_line)
+
+    def test_created_orders_are_priced_from_the_catalog(self):
+        first, second = self.products[:2]
+        response = self.client.post('/api/orders/create/', {'items': [
+            {'product_id': str(first.pk), 'quantity': 2, 'price_per_item': '0.01'},
+            {'product_id': str(second.pk).upper(), 'quantity': 1},
+            {'product_id': str(first.pk), 'quantity': 1},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        order = response.json()
+        self.assertEqual(order['total_price'], '6.25')
+        self.assertEqual(OrderModel.objects.get(pk=order['id']).user_id, self.user.pk)
+        self.assertEqual(
+            sorted((item['product_id'], item['quantity'], item['price_per_item']) for item in order['items']),
+            sorted([(str(first.pk), 3, '1.25'), (str(second.pk), 1, '2.50')]),
+        )
+        missing = self.client.post('/api/orders/create/', {'items': [
+            {'product_id': str(uuid.uuid4()), 'quantity': 1},
+        ]}, format='json')
+        self.assertEqual(missing.status_code, 400)
+
+
+class AddOrderItemTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='owner@example.com', password='x')
+        cls.stranger = User.objects.create_user(email='stranger@example.com', password='x')
+        category = ProductCategory.objects.create(name='toys')
+        cls.product = ProductModel.objects.create(
+            name='Kite', description='', category=category, price=Decimal('20.00'),
+            image_url='https://example.com/k.png', stock=10,
+        )
+
+    def setUp(self):
+        self.order = OrderService.place_order(self.owner.pk, {str(self.product.pk): 2})
+
+    def add(self, user, quantity=5):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(
+            f'/api/orders/{self.order.pk}/add-item/', {'product_id': str(self.product.pk), 'quantity': quantity},
+            format='json',
+        )
+
+    def reserved(self):
+        self.product.refresh_from_db(fields=['reserved'])
+        return self.product.reserved
+
+    def test_other_users_orders_are_not_found(self):
+        self.assertEqual(self.add(self.stranger).status_code, 404)
+        self.assertEqual(self.order.items.count(), 1)
+        self.assertEqual(OrderSummary.objects.get(order_id=self.order.pk).item_count, 2)
+        self.assertEqual(self.reserved(), 2)
+
+    def test_lines_are_priced_from_the_catalog_and_held(self):
+        response = self.add(self.owner)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['price_per_item'], '20.00')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal('140.00'))
+        summary = OrderSummary.objects.get(order_id=self.order.pk)
+        self.assertEqual((summary.item_count, summary.total_price), (7, Decimal('140.00')))
+        self.assertEqual(self.reserved(), 7)
+        self.assertEqual(self.add(self.owner, quantity=4).status_code, 409)
+        self.assertEqual(self.reserved(), 7)
+
+    def test_only_pending_orders_can_be_changed(self):
+        OrderService.bulk_transition([self.order.pk], 'processing')
+        self.assertEqual(self.add(self.owner).status_code, 409)
+        self.assertEqual(self.order.items.count(), 1)
+        # The repository refuses too: the rollups read sold orders' lines
+        self.order.refresh_from_db()
+        with self.assertRaises(ValueError):
+            OrderRepositories.add_order_item(self.order, str(self.product.pk), 1, Decimal('20.00'))
+        self.assertEqual(self.order.items.count(), 1)
+
+
+class CartUpsertTests(TestCase):
+
+    def setUp(self):
+        self.cart = CartRepositories.create_cart_for_user(uuid.uuid4())
+
+    def test_adds_create_then_increment_one_line(self):
+        with self.assertNumQueries(1):
+            first = CartRepositories.add_item_to_cart(self.cart, 'p1', 2)
+        with self.assertNumQueries(1):
+            second = CartRepositories.add_item_to_cart(self.cart, 'p1', 3)
+        self.assertEqual((second.pk, second.quantity), (first.pk, 5))
+        self.assertEqual(list(CartItem.objects.values_list('id', 'quantity')), [(first.pk, 5)])
+        second.quantity = 1
+        second.save()
+        self.assertEqual(CartItem.objects.get().quantity, 1)
+
+    def test_set_quantities_upserts_in_one_statement(self):
+        existing = CartRepositories.add_item_to_cart(self.cart, 'p1', 2)
+        with self.assertNumQueries(1):
+            CartRepositories.set_item_quantities(self.cart, {'p1': 7, 'p2': 1})
+        self.assertEqual(CartRepositories.get_quantities(self.cart, ['p1', 'p2']), {'p1': 7, 'p2': 1})
+        self.assertEqual(CartItem.objects.get(product_id='p1').pk, existing.pk)
+
+    def test_lines_are_per_cart(self):
+        other = CartRepositories.create_cart_for_user(uuid.uuid4())
+        CartRepositories.add_item_to_cart(self.cart, 'p1', 2)
+        CartRepositories.add_item_to_cart(other, 'p1', 4)
+        self.assertEqual(list(self.cart.items.values_list('product_id', 'quantity')), [('p1', 2)])
+        self.assertEqual(CartRepositories.create_cart_for_user(other.user_id), other)
+
+
+class ConcurrentBatchTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user_id = uuid.uuid4()
+        category = ProductCategory.objects.create(name='toys')
+        self.product = ProductModel.objects.create(
+            name='Toy', description='', category=category, price=Decimal('1.00'),
+            image_url='https://example.com/t.png', stock=10,
+        )
+        self.add = [{'op': 'add', 'product_id': str(self.product.pk), 'quantity': 1}]
+
+    def test_the_cart_row_is_locked_before_the_lines_are_read(self):
+        CartService.get_or_create_cart(self.user_id)
+        with CaptureQueriesContext(connection) as queries:
+            CartService.apply_batch(self.user_id, self.add)
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        cart_table, item_table = CartModel._meta.db_table, CartItem._meta.db_table
+        first_lines = next(n for n, sql in enumerate(selects) if f'FROM "{item_table}"' in sql)
+        locks = [n for n, sql in enumerate(selects[:first_lines]) if f'FROM "{cart_table}"' in sql]
+        self.assertTrue(locks)
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', selects[locks[-1]])
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_two_batches_adding_the_same_new_line_hold_it_once_each(self):
+        CartService.get_or_create_cart(self.user_id)
+        both_read = threading.Barrier(2)
+        read_quantities = CartRepositories.get_quantities
+
+        def get_quantities(*args, **kwargs):
+            # Let both batches read the cart before either writes, unless
+            # the second one is kept waiting on the cart lock
+            try:
+                both_read.wait(timeout=1)
+            except threading.BrokenBarrierError:
+                pass
+            return read_quantities(*args, **kwargs)
+
+        def batch():
+            try:
+                CartService.apply_batch(self.user_id, self.add)
+            finally:
+                connection.close()
+
+        with mock.patch.object(CartRepositories, 'get_quantities', side_effect=get_quantities):
+            threads = [threading.Thread(target=batch) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+        held = ReservationService.get_held(ReservationService.cart_reference(self.user_id))
+        self.assertEqual(held, {str(self.product.pk): 2})
+
+
+class CacheCartStoreTests(TestCase):
+
+    def store(self, **options):
+        return CacheCartStore(prefix=f'test-cart-{uuid.uuid4().hex}', **options)
+
+    def cart(self, version=1):
+        return {'id': str(uuid.uuid4()), 'version': version, 'lines': {'p1': version}}
+
+    def test_the_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            CartStore()
+
+    def test_changed_carts_are_pending_until_acknowledged(self):
+        store = self.store()
+        store.save('u1', self.cart())
+        store.save('u2', self.cart())
+        store.save('u1', self.cart(2))
+        store.save('u3', self.cart(), dirty=False)
+        users, marker = store.pending(10)
+        self.assertEqual(users, {'u1': 2, 'u2': 1})
+        # Only one flusher drains at a time
+        self.assertEqual(store.pending(10), ({}, None))
+        store.ack(marker)
+        self.assertEqual(store.pending(10), ({}, None))
+
+    def test_draining_stops_at_a_slot_not_written_yet(self):
+        store = self.store()
+        store.save('u1', self.cart())
+        # A writer has claimed slot 2 but not filled it
+        store.cache.incr(store._key('seq'))
+        store.save('u3', self.cart())
+        users, marker = store.pending(10)
+        self.assertEqual(users, {'u1': 1})
+        store.ack(marker)
+        self.assertEqual(store.pending(10), ({}, None))
+        store.cache.set(store._key('dirty', 2), ('u2', 4))
+        users, marker = store.pending(10)
+        self.assertEqual(users, {'u2': 4, 'u3': 1})
+        store.ack(marker)
+
+    def test_slots_empty_for_too_long_are_skipped(self):
+        store = self.store(gap_timeout=0)
+        store.cache.add(store._key('seq'), 0, None)
+        store.cache.incr(store._key('seq'))
+        store.save('u2', self.cart())
+        users, marker = store.pending(10)
+        self.assertEqual(users, {'u2': 1})
+        store.ack(marker)
+        self.assertEqual(store.pending(10), ({}, None))
+
+    def test_lock_times_out_instead_of_sharing_the_cart(self):
+        store = self.store(lock_timeout=5, lock_wait=0.05)
+        with store.lock('u1'):
+            with self.assertRaises(CartBusy):
+                with store.lock('u1'):
+                    pass
+            with store.lock('u2'):
+                pass
+        with store.lock('u1'):
+            pass
+
+    def test_lock_release_leaves_another_holders_key(self):
+        store = self.store()
+        key = store._key('lock', 'u1')
+        with store.lock('u1'):
+            # Our key expired and another request took the lock
+            store.cache.set(key, 'other')
+        self.assertEqual(store.cache.get(key), 'other')
+
+
+@override_settings(CART_STORE={'FLUSH_INTERVAL': 0})
+class WriteBehindCartTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='toys')
+        cls.products = [
+            str(ProductModel.objects.create(
+                name=f'Toy {n}', description='', category=category, price=Decimal('2.00'),
+                image_url='https://example.com/t.png', stock=5,
+            ).pk)
+            for n in range(2)
+        ]
+
+    def setUp(self):
+        self.user_id = str(uuid.uuid4())
+        previous, cart_store._store = cart_store._store, CacheCartStore(prefix=f'test-cart-{uuid.uuid4().hex}')
+        self.addCleanup(setattr, cart_store, '_store', previous)
+
+    def test_changes_reach_the_tables_on_flush(self):
+        first, second = self.products
+        CartService.add_item(self.user_id, first, 2)
+        CartService.apply_batch(self.user_id, [
+            {'op': 'add', 'product_id': second, 'quantity': 1},
+            {'op': 'set', 'product_id': first, 'quantity': 3},
+        ])
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(CartService.get_cart_data(self.user_id)['item_count'], 4)
+        self.assertEqual(CartService.flush_all(), 1)
+        cart = CartRepositories.get_cart_by_user_id(self.user_id)
+        self.assertEqual(CartRepositories.get_lines(cart), {first: 3, second: 1})
+        CartService.remove_item(self.user_id, second)
+        self.assertEqual(CartService.flush_all(), 1)
+        self.assertEqual(CartRepositories.get_lines(cart), {first: 3})
+        # Write-behind carts hold no stock; the order does
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_checkout_writes_the_cart_through(self):
+        CartService.add_item(self.user_id, self.products[0], 2)
+        order = OrderService.checkout(self.user_id)
+        self.assertEqual([(item.product_id, item.quantity) for item in order.items.all()], [(self.products[0], 2)])
+        self.assertEqual(CartService.get_cart_data(self.user_id)['items'], [])
+        CartService.flush_all()
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_a_clear_racing_a_flush_is_not_undone(self):
+        store = cart_store._store
+        store.lock_wait = 0.05
+        CartService.add_item(self.user_id, self.products[0], 2)
+        load, rejected = store.load, []
+
+        def load_then_clear(user_id):
+            cart = load(user_id)
+            store.load = load
+            # The user clears the cart between the flush's read and its write
+            try:
+                CartService.clear_cart(self.user_id)
+            except CartBusy:
+                rejected.append(user_id)
+            return cart
+
+        store.load = load_then_clear
+        CartService.flush()
+        self.assertEqual(rejected, [self.user_id])
+        CartService.clear_cart(self.user_id)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(CartService.flush_all(), 0)
+
+    def test_carts_changed_since_they_were_journalled_are_skipped(self):
+        CartService.add_item(self.user_id, self.products[0], 2)
+        store = cart_store._store
+        cart = store.load(self.user_id)
+        # A write-through (clear, checkout) moved the cart on
+        store.save(self.user_id, {**cart, 'version': cart['version'] + 1, 'lines': {}}, dirty=False)
+        with self.assertNumQueries(0):
+            self.assertEqual(CartService.flush(), 1)
+        self.assertFalse(CartItem.objects.exists())
+
+
+class ConfirmStockJobTests(TestCase):
+
+    def setUp(self):
+        self.user_id = uuid.uuid4()
+        self.product = ProductModel.objects.create(
+            name='Kite', description='', category=ProductCategory.objects.create(name='toys'),
+            price=Decimal('9.00'), image_url='https://example.com/k.png', stock=5,
+        )
+        self.order = OrderService.create_order(self.user_id, [
+            {'product_id': str(self.product.pk), 'quantity': 2, 'price_per_item': Decimal('9.00')},
+        ])
+
+    def move(self, *statuses):
+        for new_status in statuses:
+            OrderService.bulk_transition([self.order.pk], new_status)
+
+    def counters(self):
+        self.product.refresh_from_db(fields=['stock', 'reserved'])
+        return self.product.stock, self.product.reserved
+
+    def test_processing_deducts_the_held_stock(self):
+        self.move('processing')
+        JobService.run_batch('w1')
+        self.assertEqual(self.counters(), (3, 0))
+
+    def test_orders_that_moved_on_before_the_job_ran_are_still_deducted(self):
+        self.move('processing', 'shipped', 'delivered')
+        JobService.run_batch('w1')
+        self.assertEqual(self.counters(), (3, 0))
+        # A second run finds the holds confirmed and deducts nothing
+        JobService.enqueue('order.confirm_stock', {'order_id': str(self.order.pk)})
+        JobService.run_batch('w1')
+        self.assertEqual(self.counters(), (3, 0))
+
+    def test_orders_cancelled_before_the_job_ran_are_not_deducted(self):
+        self.move('processing', 'cancelled')
+        JobService.run_batch('w1')
+        self.assertEqual(self.counters(), (5, 0))
+
+    def test_a_job_reclaimed_from_a_slow_worker_takes_effect_once(self):
+        self.move('processing')
+        Job.objects.exclude(name='order.confirm_stock').delete()
+        [stale] = JobRepositories.claim('w1', 10, timezone.now())
+        # w1 is still running the handler when its lease runs out
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        JobRepositories.reclaim_expired(timezone.now() - timedelta(minutes=5))
+        [current] = JobRepositories.claim('w2', 10, timezone.now())
+        self.assertFalse(JobService.run(stale, 'w1'))
+        self.assertEqual(self.counters(), (5, 2))
+        self.assertTrue(JobService.run(current, 'w2'))
+        self.assertEqual(self.counters(), (3, 0))
+        self.assertFalse(Job.objects.exists())
+
+    def test_order_handlers_can_run_twice(self):
+        CartService.add_item(self.user_id, str(self.product.pk), 1)
+        cancelled = OrderService.create_order(self.user_id, [
+            {'product_id': str(self.product.pk), 'quantity': 1, 'price_per_item': Decimal('9.00')},
+        ])
+        OrderService.bulk_transition([cancelled.pk], 'cancelled')
+        self.move('processing')
+        Job.objects.all().delete()
+        for _ in range(2):
+            job_handlers.confirm_stock(str(self.order.pk))
+            job_handlers.release_stock(str(cancelled.pk))
+            job_handlers.clear_cart(str(self.order.pk))
+            self.assertEqual(self.counters(), (3, 0))
+            self.assertFalse(CartItem.objects.exists())
+
+
+class RebuildSummariesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.orders = [
+            OrderRepositories.create_order(uuid.uuid4(), [
+                {'product_id': f'p{n}', 'quantity': n + 1, 'price_per_item': Decimal('2.00')},
+            ])
+            for n in range(5)
+        ]
+
+    def snapshot(self):
+        return list(OrderSummary.objects.order_by('order_id').values())
+
+    def test_rebuild_repairs_drifted_and_missing_summaries_in_batches(self):
+        expected = self.snapshot()
+        OrderSummary.objects.filter(order=self.orders[0]).update(status='shipped', item_count=99)
+        OrderSummary.objects.filter(order=self.orders[1]).delete()
+        self.assertEqual(OrderRepositories.rebuild_summaries(batch_size=2), 5)
+        self.assertEqual(self.snapshot(), expected)
+
+
+class ForgedCursorTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='cursor@example.com', password='x'))
+
+    def test_forged_cursors_are_rejected(self):
+        for path, params, key, values in (
+            ('/api/orders/', {}, 'orders', ['abc', 'def']),
+            ('/api/orders/', {'view': 'summary'}, 'order-summaries', [str(timezone.now()), 'not-a-uuid']),
+            ('/api/orders/timeline/', {}, 'timeline', [str(timezone.now()), 'abc']),
+            ('/api/orders/timeline/', {}, 'timeline', [None, '1']),
+        ):
+            with self.subTest(path=path, values=values):
+                cursor = base64.urlsafe_b64encode(json.dumps({'k': key, 'v': values}).encode()).decode()
+                self.assertEqual(self.client.get(path, {**params, 'cursor': cursor}).status_code, 400)
@@ -1,16 +1,24 @@
 from  django.urls import path
 from .views import (OrderListView, OrderDetailView, OrderHistoryView,
-                    CartAddItemView, CartRemoveItemView, CartDetailView,
-                    CreateOrderView, AddOrderItemView)
+                    CartAddItemView, CartRemoveItemView, CartDetailView, CartBatchView,
+                    CreateOrderView, AddOrderItemView, CheckoutView,
+                    OrderTimelineView, OrderBulkStatusView,
+                    SalesReportView, OrderStatusReportView)
 
 
 urlpatterns = [
     path('orders/', OrderListView.as_view(), name='order-list'),
-    path('orders/<str:order_id>/', OrderDetailView.as_view(), name='order-detail'),
     path('orders/history/', OrderHistoryView.as_view(), name='order-history'),
+    path('orders/timeline/', OrderTimelineView.as_view(), name='order-timeline'),
+    path('orders/create/', CreateOrderView.as_view(), name='create-order'), 
+    path('orders/checkout/', CheckoutView.as_view(), name='checkout'),
+    path('orders/bulk-status/', OrderBulkStatusView.as_view(), name='order-bulk-status'),
+    path('orders/<uuid:order_id>/', OrderDetailView.as_view(), name='order-detail'),
     path('cart/add-item/', CartAddItemView.as_view(), name='cart-add-item'),
     path('cart/remove-item/', CartRemoveItemView.as_view(), name='cart-remove-item'),
+    path('cart/batch/', CartBatchView.as_view(), name='cart-batch'),
     path('cart/', CartDetailView.as_view(), name='cart-detail'),
-    path('orders/create/', CreateOrderView.as_view(), name='create-order'), 
-    path('orders/<str:order_id>/add-item/', AddOrderItemView.as_view(), name='add-order-item'),
+    path('orders/<uuid:order_id>/add-item/', AddOrderItemView.as_view(), name='add-order-item'),
+    path('reports/sales/', SalesReportView.as_view(), name='report-sales'),
+    path('reports/order-status/', OrderStatusReportView.as_view(), name='report-order-status'),
 ]
\ No newline at end of file
@@ -4,11 +4,23 @@ from rest_framework import status
 from .serializers import (OrderSerializer, CartAddItemSerializer,
                           CartRemoveItemSerializer, CartSerializer,
                           CreateOrderSerializer, UpdateOrderStatusSerializer,
-                          OrderStatusHistorySerializer)
-from .service.orderService import OrderService
+                          OrderStatusHistorySerializer, CartBatchSerializer,
+                          OrderSummarySerializer, BulkOrderStatusSerializer,
+                          ArchivedOrderSerializer)
+from .service.orderService import OrderNotEditable, OrderService
 from .service.cartService import CartService
+from .service.cart_store import CartBusy
+from .service.rollupService import RollupService
+from .service.archiveService import ArchiveService
 from .utils.user_id import fetch_user_id
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from product.models import InsufficientStock
+from backend.utils.cursor_pagination import parse_limit
+from backend.utils.query_counter import QUERY_COUNT_HEADER, count_queries
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import timedelta
 
 
 class OrderListView(GenericAPIView):
@@ -19,10 +31,23 @@ class OrderListView(GenericAPIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        user_id = fetch_user_id(request)
-        orders = OrderService.list_orders_for_user(user_id)
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        """
+        Newest orders first, ``limit`` per page, continued with ``cursor``.
+
+        ``?view=summary`` returns the compact order summaries instead of
+        the orders with their items.
+        """
+        summary = request.query_params.get('view') == 'summary'
+        try:
+            limit = parse_limit(request.query_params)
+            orders, next_cursor = OrderService.list_orders_page(
+                fetch_user_id(request), request.query_params.get('cursor'), limit, summary=summary
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer_class = OrderSummarySerializer if summary else self.get_serializer_class()
+        serializer = serializer_class(orders, many=True)
+        return Response({"results": serializer.data, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
     
 class OrderDetailView(GenericAPIView):
     """
@@ -32,11 +57,19 @@ class OrderDetailView(GenericAPIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, order_id):
+        # Other users' orders get the same 404 as missing ones
+        user_id = str(fetch_user_id(request))
         order = OrderService.get_order_details(order_id)
-        if not order:
-            return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = self.get_serializer(order)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if order:
+            if str(order.user_id) == user_id:
+                serializer = self.get_serializer(order)
+                return Response(serializer.data, status=status.HTTP_200_OK)
+        else:
+            # Old delivered and cancelled orders live in the archive
+            archived = ArchiveService.get_archived_order(order_id)
+            if archived and archived['user_id'] == user_id:
+                return Response(ArchivedOrderSerializer(archived).data, status=status.HTTP_200_OK)
+        return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
     
 class OrderHistoryView(GenericAPIView):
     """
@@ -51,6 +84,29 @@ class OrderHistoryView(GenericAPIView):
         serializer = self.get_serializer(order_history, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+class OrderTimelineView(GenericAPIView):
+    """
+    API view to page through the authenticated user's order status changes, newest first
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            since = None
+            if request.query_params.get('since'):
+                since = parse_datetime(request.query_params['since'])
+                if since is None:
+                    raise ValueError("since must be an ISO 8601 datetime")
+                if timezone.is_naive(since):
+                    since = timezone.make_aware(since)
+            limit = parse_limit(request.query_params, default=50, maximum=200)
+            timeline = OrderService.get_timeline(
+                fetch_user_id(request), request.query_params.get('cursor'), limit, since
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(timeline, status=status.HTTP_200_OK)
+
 class CartAddItemView(GenericAPIView):
     """
     API view to add item to cart
@@ -61,7 +117,14 @@ class CartAddItemView(GenericAPIView):
     def post(self, request):
         serializer = self.get_serializer(data=request.data, context={"request": request})
         serializer.is_valid(raise_exception=True)
-        item = CartService.add_item(serializer.validated_data)
+        try:
+            item = CartService.add_item(
+                fetch_user_id(request),
+                serializer.validated_data['product_id'],
+                serializer.validated_data['quantity'],
+            )
+        except (InsufficientStock, CartBusy) as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
         return Response({"id": item.id, "product_id": item.product_id, "quantity": item.quantity}, status=status.HTTP_201_CREATED)
     
 class CartRemoveItemView(GenericAPIView):
@@ -74,9 +137,28 @@ class CartRemoveItemView(GenericAPIView):
     def post(self, request):
         serializer = self.get_serializer(data=request.data, context={"request": request})
         serializer.is_valid(raise_exception=True)
-        CartService.remove_item(serializer.validated_data)
+        try:
+            CartService.remove_item(fetch_user_id(request), serializer.validated_data['product_id'])
+        except CartBusy as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
         return Response({"success": True, "message": "Item removed from cart."}, status=status.HTTP_200_OK)
     
+class CartBatchView(GenericAPIView):
+    """
+    API view to apply several add/set/remove operations to the cart at once
+    """
+    serializer_class = CartBatchSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        try:
+            cart = CartService.apply_batch(fetch_user_id(request), serializer.validated_data['operations'])
+        except (InsufficientStock, CartBusy) as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(CartSerializer(cart).data, status=status.HTTP_200_OK)
+    
 class CartDetailView(GenericAPIView):
     """
     API view to get cart details
@@ -85,7 +167,7 @@ class CartDetailView(GenericAPIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        cart = CartService.get_or_create_cart(fetch_user_id(request))
+        cart = CartService.get_cart_data(fetch_user_id(request))
         serializer = self.get_serializer(cart)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
@@ -99,11 +181,103 @@ class CreateOrderView(GenericAPIView):
     def post(self, request):
         serializer = self.get_serializer(data=request.data, context={"request": request})
         serializer.is_valid(raise_exception=True)
-        order = OrderService.create_order(serializer.validated_data)
+        lines = {}
+        for item in serializer.validated_data['items']:
+            lines[item['product_id']] = lines.get(item['product_id'], 0) + item['quantity']
+        try:
+            order = OrderService.place_order(fetch_user_id(request), lines)
+        except InsufficientStock as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         order_serializer = OrderSerializer(order)
         return Response(order_serializer.data, status=status.HTTP_201_CREATED)
 
 
+
+class CheckoutView(GenericAPIView):
+    """
+    API view to turn the authenticated user's cart into an order
+    """
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        # The query count is reported in DEBUG, or when asked for with a header
+        with count_queries(settings.DEBUG or QUERY_COUNT_HEADER in request.headers) as queries:
+            try:
+                order = OrderService.checkout(fetch_user_id(request))
+            except (InsufficientStock, CartBusy) as e:
+                return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            data = self.get_serializer(order).data
+        if queries.enabled:
+            data = {**data, "query_count": queries.count}
+        return Response(data, status=status.HTTP_201_CREATED)
+
+class OrderBulkStatusView(GenericAPIView):
+    """
+    Admin API view to move many orders to one status
+    """
+    serializer_class = BulkOrderStatusSerializer
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = OrderService.bulk_transition(
+            serializer.validated_data['order_ids'], serializer.validated_data['status']
+        )
+        return Response(result, status=status.HTTP_200_OK)
+
+def _report_range(params, default_days: int = 30, max_days: int = 366):
+    """Read ``start`` and ``end`` (ISO dates, inclusive); defaults to the last ``default_days`` days."""
+    end = timezone.localdate()
+    if params.get('end'):
+        end = parse_date(params['end'])
+        if end is None:
+            raise ValueError("end must be an ISO 8601 date")
+    start = end - timedelta(days=default_days - 1)
+    if params.get('start'):
+        start = parse_date(params['start'])
+        if start is None:
+            raise ValueError("start must be an ISO 8601 date")
+    if start > end:
+        raise ValueError("start must not be after end")
+    if (end - start).days >= max_days:
+        raise ValueError(f"The range may span at most {max_days} days")
+    return start, end
+
+
+class SalesReportView(GenericAPIView):
+    """
+    Admin API view for daily revenue and units per product, read from the sales rollup
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            start, end = _report_range(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        report = RollupService.sales_report(start, end, request.query_params.get('product_id'))
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class OrderStatusReportView(GenericAPIView):
+    """
+    Admin API view for status changes per day and the average time spent in each status
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            start, end = _report_range(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(RollupService.status_report(start, end), status=status.HTTP_200_OK)
+
 class AddOrderItemView(GenericAPIView):
     """
     API view to add item to an existing order
@@ -114,13 +288,21 @@ class AddOrderItemView(GenericAPIView):
     def post(self, request, order_id):
         serializer = self.get_serializer(data=request.data, context={"request": request})
         serializer.is_valid(raise_exception=True)
-        order = OrderService.get_order_details(order_id)
-        if not order:
+        try:
+            item = OrderService.add_order_item(
+                fetch_user_id(request),
+                order_id,
+                serializer.validated_data['product_id'],
+                serializer.validated_data['quantity'],
+            )
+        except (InsufficientStock, OrderNotEditable) as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # Other users' orders get the same 404 as missing ones
+        if item is None:
             return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
-        item = OrderService.add_order_item(
-            order,
-            serializer.validated_data['product_id'],
-            serializer.validated_data['quantity'],
-            price_per_item=serializer.validated_data.get('price_per_item', 0.0)
-        )
-        return Response({"id": item.id, "product_id": item.product_id, "quantity": item.quantity}, status=status.HTTP_201_CREATED)
\ No newline at end of file
+        return Response({
+            "id": item.id, "product_id": item.product_id, "quantity": item.quantity,
+            "price_per_item": str(item.price_per_item),
+        }, status=status.HTTP_201_CREATED)
\ No newline at end of file
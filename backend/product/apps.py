@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ProductConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'product'
+
+    def ready(self):
+        # Import signal handlers to ensure they're registered when the app is ready.
+        import product.signals.cache  # noqa: F401
+        import product.signals.search  # noqa: F401
+        import product.signals.facets  # noqa: F401
+        import product.signals.embedding  # noqa: F401
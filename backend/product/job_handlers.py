@@ -0,0 +1,22 @@
+"""
+Background catalog work, run by ``run_jobs`` workers.
+
+``product.embed`` is enqueued by ``product.signals.embedding`` when product
+content changes.
+"""
+from jobs.registry import register
+from jobs.service.queue import JobService
+
+from .service.embedding import run_embedding_stage
+
+# Rows scanned per job. Each job runs in one transaction, so a large
+# catalog is embedded by a chain of jobs resuming from the checkpoint.
+EMBED_ROWS_PER_JOB = 5000
+
+
+@register('product.embed')
+def embed_products(max_rows: int = EMBED_ROWS_PER_JOB) -> None:
+    """Embed changed products; queue the next chunk until the catalog is scanned."""
+    stats = run_embedding_stage(max_rows=max_rows)
+    if not stats.completed:
+        JobService.enqueue('product.embed', {'max_rows': max_rows})
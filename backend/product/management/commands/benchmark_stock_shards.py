@@ -0,0 +1,110 @@
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from product.models import InsufficientStock, ProductCategory, ProductModel
+from product.repositories.inventory import InventoryRepositories
+from product.service.reservation import ReservationService
+
+PATHS = ('decrement', 'commit', 'confirm')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure checkout throughput on a single product with and without stock shards. "
+        "Run it against PostgreSQL: SQLite serialises all writers, whatever the shard count."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', default='0,1,4,16',
+                            help="Comma separated shard counts to compare; 0 leaves the product unsharded.")
+        parser.add_argument('--threads', default='1,4,16', help="Comma separated worker counts to compare.")
+        parser.add_argument('--paths', default=','.join(PATHS),
+                            help="Comma separated paths to time: decrement (shards only), commit "
+                                 "(InventoryRepositories.commit) and confirm (order confirmation).")
+        parser.add_argument('--ops', type=int, default=2000, help="Units sold per run.")
+
+    def handle(self, *args, **options):
+        shard_counts = [int(value) for value in options['shards'].split(',')]
+        thread_counts = [int(value) for value in options['threads'].split(',')]
+        paths = options['paths'].split(',')
+        unknown = set(paths) - set(PATHS)
+        if unknown:
+            raise CommandError(f"Unknown paths: {', '.join(sorted(unknown))}.")
+        ops = options['ops']
+
+        # Category names are a fixed choice list and unique; borrow one and
+        # only delete it afterwards if this run created it. The workers use
+        # their own connections, so a rolled-back transaction would hide the
+        # product from them.
+        category, created_category = ProductCategory.objects.get_or_create(name='electronics')
+        product = ProductModel.objects.create(
+            name='benchmark-stock-shards', description='', price=1, stock=0, category=category
+        )
+        try:
+            self.stdout.write(f"{'path':>9} {'shards':>6} {'threads':>7} {'ops/s':>10} {'failed':>7}")
+            for path in paths:
+                operation = self._operation(path, product.pk)
+                for shards in shard_counts:
+                    if path == 'decrement' and not shards:
+                        continue
+                    for threads in thread_counts:
+                        InventoryRepositories.disable_sharding(product.pk)
+                        ProductModel.objects.filter(pk=product.pk).update(stock=ops, reserved=0)
+                        if shards:
+                            InventoryRepositories.enable_sharding(product.pk, shards)
+                        rate, failed = self._run(operation, shards, threads, ops)
+                        self.stdout.write(f"{path:>9} {shards:>6} {threads:>7} {rate:>10.0f} {failed:>7}")
+        finally:
+            product.delete()
+            if created_category:
+                category.delete()
+
+    @staticmethod
+    def _operation(path, product_id):
+        """A callable selling one unit through ``path``; returns False when it could not."""
+        line = {str(product_id): 1}
+
+        def decrement(shards):
+            return InventoryRepositories.decrement_shards(product_id, 1, shards)
+
+        def commit(shards):
+            InventoryRepositories.commit(line)
+            return True
+
+        def confirm(shards):
+            # An order with no holds: the units come from free stock or the shards
+            ReservationService.confirm_order(uuid.uuid4(), line)
+            return True
+
+        return {'decrement': decrement, 'commit': commit, 'confirm': confirm}[path]
+
+    def _run(self, operation, shards, threads, ops):
+        per_thread = [ops // threads + (1 if n < ops % threads else 0) for n in range(threads)]
+        failed = [0] * threads
+        barrier = threading.Barrier(threads + 1)
+
+        def worker(n):
+            barrier.wait()
+            try:
+                for _ in range(per_thread[n]):
+                    try:
+                        if not operation(shards):
+                            failed[n] += 1
+                    except (DatabaseError, InsufficientStock):
+                        failed[n] += 1
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for thread in workers:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return ops / elapsed, sum(failed)
@@ -0,0 +1,53 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from product.search.vector import BruteForceIndex, IVFIndex
+
+
+class Command(BaseCommand):
+    help = "Compare brute-force and IVF vector search latency and recall on synthetic data."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100_000)
+        parser.add_argument('--dim', type=int, default=256)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--nprobe', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        size, dim, k = options['size'], options['dim'], options['k']
+        rng = np.random.default_rng(options['seed'])
+        # Clustered data: real embeddings are far from uniform on the sphere
+        centers = rng.standard_normal((max(1, size // 500), dim)).astype(np.float32)
+        vectors = centers[rng.integers(len(centers), size=size)] + 0.3 * rng.standard_normal((size, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = vectors[rng.choice(size, options['queries'], replace=False)]
+        ids = list(range(size))
+
+        brute = BruteForceIndex(dim)
+        for doc_id, vector in zip(ids, vectors):
+            brute.add(doc_id, vector)
+
+        started = time.perf_counter()
+        ivf = IVFIndex(dim, nlist=int(np.sqrt(size)), nprobe=options['nprobe'])
+        ivf.train(vectors)
+        ivf.add_many(ids, vectors)
+        build_seconds = time.perf_counter() - started
+
+        exact, brute_ms = self._run(brute, queries, k)
+        approximate, ivf_ms = self._run(ivf, queries, k)
+        recall = np.mean([len(set(a) & set(e)) / k for a, e in zip(approximate, exact)])
+
+        self.stdout.write(f"vectors={size} dim={dim} k={k} nlist={ivf.nlist} nprobe={ivf.nprobe}")
+        self.stdout.write(f"brute-force: {brute_ms:.2f} ms/query")
+        self.stdout.write(f"ivf:         {ivf_ms:.2f} ms/query, recall@{k}={recall:.3f}, build {build_seconds:.1f}s")
+
+    def _run(self, index, queries, k):
+        results = []
+        started = time.perf_counter()
+        for query in queries:
+            results.append([doc_id for doc_id, _ in index.search(query, k)])
+        return results, 1000 * (time.perf_counter() - started) / len(queries)
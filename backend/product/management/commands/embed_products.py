@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from product.service.embedding import EmbeddingPipeline
+
+
+class Command(BaseCommand):
+    help = "Embed products whose content changed since their vector was computed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=256, help="Rows per embedder call and bulk write.")
+        parser.add_argument('--scan-size', type=int, default=2000, help="Rows hashed per chunk between checkpoints.")
+        parser.add_argument('--max-rows', type=int, default=None, help="Stop after scanning this many rows.")
+        parser.add_argument('--restart', action='store_true', help="Ignore the saved checkpoint.")
+        parser.add_argument('--force', action='store_true', help="Re-embed every product.")
+
+    def handle(self, *args, **options):
+        pipeline = EmbeddingPipeline(batch_size=options['batch_size'], scan_size=options['scan_size'])
+        stats = pipeline.run(
+            resume=not options['restart'],
+            force=options['force'],
+            max_rows=options['max_rows'],
+            progress=lambda s: self.stdout.write(
+                f"scanned {s.scanned} embedded {s.embedded} ({s.scanned_per_second:.0f} rows/s)"
+            ),
+        )
+        if stats.resumed_from:
+            self.stdout.write(f"Resumed after product {stats.resumed_from}.")
+        state = "Finished" if stats.completed else "Stopped"
+        self.stdout.write(self.style.SUCCESS(
+            f"{state}: scanned {stats.scanned}, embedded {stats.embedded} in {stats.seconds:.2f}s "
+            f"({stats.scanned_per_second:.0f} rows/s scanned, {stats.embedded_per_second:.0f} rows/s embedded)."
+        ))
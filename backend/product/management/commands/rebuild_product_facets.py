@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from product.repositories.facets import FacetRepositories
+from product.service.cache import catalog_cache
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized product facet counts from the product table."
+
+    def handle(self, *args, **options):
+        cells = FacetRepositories.rebuild()
+        catalog_cache.invalidate('products')
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {cells} facet cells."))
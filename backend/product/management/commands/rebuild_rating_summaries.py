@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from product.repositories.rating import RatingRepositories
+from product.service.cache import catalog_cache
+
+
+class Command(BaseCommand):
+    help = "Rebuild product rating summaries and average_rating from the review table."
+
+    def handle(self, *args, **options):
+        rebuilt = RatingRepositories.rebuild()
+        catalog_cache.invalidate('products')
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating summaries for {rebuilt} products."))
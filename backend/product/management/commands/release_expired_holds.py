@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from product.service.reservation import ReservationService
+
+
+class Command(BaseCommand):
+    help = "Release stock holds whose TTL has passed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        released = ReservationService.release_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired holds."))
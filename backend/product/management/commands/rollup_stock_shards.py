@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from product.repositories.inventory import InventoryRepositories
+
+
+class Command(BaseCommand):
+    help = "Refresh ProductModel.stock of sharded products from their shard counters."
+
+    def handle(self, *args, **options):
+        products = InventoryRepositories.rollup()
+        self.stdout.write(self.style.SUCCESS(f"Rolled up stock for {products} sharded products."))
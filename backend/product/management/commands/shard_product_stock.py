@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from product.models import ProductModel
+from product.repositories.inventory import InventoryRepositories
+
+
+class Command(BaseCommand):
+    help = "Split a product's unreserved stock across N counter rows (0 folds it back into one)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id')
+        parser.add_argument('--shards', type=int, default=8)
+
+    def handle(self, *args, **options):
+        try:
+            if options['shards'] == 0:
+                InventoryRepositories.disable_sharding(options['product_id'])
+            else:
+                InventoryRepositories.enable_sharding(options['product_id'], options['shards'])
+        except ProductModel.DoesNotExist:
+            raise CommandError("Product not found.")
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f"Product {options['product_id']} now uses {options['shards']} stock shards."
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0002_productmodel_average_rating_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productmodel',
+            name='embedding',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0009_stock_shards'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productmodel',
+            index=models.Index(condition=models.Q(('stock__lte', 0)), fields=['-created_at', '-id'], name='product_sold_out_idx'),
+        ),
+    ]
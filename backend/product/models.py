@@ -1,5 +1,12 @@
 from django.db import models
+from django.db.models import F
+from decimal import Decimal
 import uuid
+from .signals.stock import stock_changed
+
+
+class InsufficientStock(ValueError):
+    """Raised when a stock hold or deduction cannot be satisfied."""
 
 class ProductCategory(models.Model):
     CATEGORIES_CHOICES = [
@@ -28,13 +35,70 @@ class ProductModel(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image_url = models.URLField()
     stock = models.IntegerField()
+    # Units held by active StockReservation rows; available = stock - reserved
+    reserved = models.IntegerField(default=0)
+    # > 0 when stock is split across that many ProductStockShard rows; stock
+    # is then a periodically rolled-up total (see InventoryRepositories)
+    stock_shards = models.PositiveSmallIntegerField(default=0)
+    average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    # float32 vector from the configured PRODUCT_EMBEDDER, see product.search.embedding
+    embedding = models.BinaryField(null=True, editable=False)
+    # Hash of the embedder and content the stored embedding was computed from
+    embedding_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # One index per catalog sort order (see ProductRepositories.SORT_ORDERS).
+        # They are partial on stock > 0 so they only cover listable rows.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_newest_idx', condition=models.Q(stock__gt=0)),
+            models.Index(fields=['price', 'id'], name='product_price_idx', condition=models.Q(stock__gt=0)),
+            models.Index(fields=['-average_rating', '-id'], name='product_rating_idx', condition=models.Q(stock__gt=0)),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_newest_idx', condition=models.Q(stock__gt=0)),
+            # The out-of-stock listing (in_stock=false) is small; any sort reads it from here
+            models.Index(fields=['-created_at', '-id'], name='product_sold_out_idx', condition=models.Q(stock__lte=0)),
+        ]
+
+    # Fields whose last persisted values are remembered so write handlers
+    # (e.g. facet counts) can see what changed without re-reading the row.
+    TRACKED_FIELDS = ('category_id', 'price', 'stock')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded_values()
+        return instance
+
+    def remember_loaded_values(self) -> None:
+        self._loaded_values = {
+            field: self.__dict__[field] for field in self.TRACKED_FIELDS if field in self.__dict__
+        }
     
     def deduct_stock(self, quantity):
-        if quantity > self.stock:
-            raise ValueError("Insufficient stock available.")
-        self.stock -= quantity
-        self.save() 
+        """
+        Remove ``quantity`` unreserved units in one conditional UPDATE.
+
+        Concurrent deductions cannot oversell: the row only changes if
+        ``stock - reserved >= quantity`` at the moment of the write.
+        """
+        if self.stock_shards:
+            from .repositories.inventory import InventoryRepositories
+            if not InventoryRepositories.decrement_shards(self.pk, quantity, self.stock_shards):
+                raise InsufficientStock("Insufficient stock available.")
+            InventoryRepositories.settle_shards([self.pk])
+            return
+        updated = ProductModel.objects.filter(
+            pk=self.pk, stock__gte=F('reserved') + quantity
+        ).update(stock=F('stock') - quantity)
+        if not updated:
+            raise InsufficientStock("Insufficient stock available.")
+        stock_changed.send(sender=ProductModel, changes={str(self.pk): -quantity})
+        self.refresh_from_db(fields=['stock', 'reserved'])
+        self.remember_loaded_values()
+
+    @property
+    def available_stock(self) -> int:
+        return self.stock - self.reserved
         
     def __str__(self):
         return self.name
@@ -47,6 +111,143 @@ class ProductReview(models.Model):
     rating = models.IntegerField()
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_recent_idx'),
+        ]
     
     def __str__(self):
         return f'Review for {self.product.name} by {self.user_id}'
+
+
+class PipelineCheckpoint(models.Model):
+    """
+    Resume position of a long-running batch pipeline, keyed by pipeline name.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    position = models.CharField(max_length=255, blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} at {self.position or "start"}'
+
+
+class ProductRatingSummary(models.Model):
+    """
+    Running review totals for one product.
+
+    Updated in the same transaction as every new review (see
+    ``ProductRepositories.add_product_review``), so product payloads and the
+    rating sort never aggregate ProductReview rows.
+    """
+    product = models.OneToOneField(ProductModel, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    count = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    star_1 = models.IntegerField(default=0)
+    star_2 = models.IntegerField(default=0)
+    star_3 = models.IntegerField(default=0)
+    star_4 = models.IntegerField(default=0)
+    star_5 = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'Rating summary for {self.product_id}: {self.count} reviews'
+
+    @property
+    def average(self) -> Decimal:
+        if not self.count:
+            return Decimal('0.00')
+        return (Decimal(self.total) / self.count).quantize(Decimal('0.01'))
+
+    @property
+    def histogram(self) -> list:
+        """Review counts for 1 to 5 stars."""
+        return [self.star_1, self.star_2, self.star_3, self.star_4, self.star_5]
+
+
+class StockReservation(models.Model):
+    """
+    A time-limited hold on product stock.
+
+    ``reference`` names the owner of the hold, e.g. ``cart:<user id>`` or
+    ``order:<order id>``. While a hold is ``held`` its quantity is counted in
+    ``ProductModel.reserved``. It ends as ``confirmed`` (stock deducted),
+    ``released`` (given back by its owner) or ``expired`` (swept after
+    ``expires_at``).
+    """
+    HELD = 'held'
+    CONFIRMED = 'confirmed'
+    RELEASED = 'released'
+    EXPIRED = 'expired'
+    STATUS_CHOICES = (
+        (HELD, 'Held'),
+        (CONFIRMED, 'Confirmed'),
+        (RELEASED, 'Released'),
+        (EXPIRED, 'Expired'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product = models.ForeignKey(ProductModel, on_delete=models.CASCADE, related_name='reservations')
+    reference = models.CharField(max_length=100)
+    quantity = models.IntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=HELD)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # One live hold per owner and product; adding more extends it
+            models.UniqueConstraint(
+                fields=['reference', 'product'], condition=models.Q(status='held'), name='reservation_live_hold_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='reservation_held_expiry_idx', condition=models.Q(status='held')),
+        ]
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id} for {self.reference} ({self.status})'
+
+
+class ProductStockShard(models.Model):
+    """
+    One slice of a sharded product's stock.
+
+    Decrements pick a random shard, so concurrent checkouts of the same
+    product usually lock different rows instead of queueing on one.
+    """
+    product = models.ForeignKey(ProductModel, on_delete=models.CASCADE, related_name='stock_shard_rows')
+    shard = models.PositiveSmallIntegerField()
+    stock = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'shard'], name='product_stock_shard_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} shard {self.shard}: {self.stock}'
+
+
+class ProductFacetCount(models.Model):
+    """
+    Materialized product counts per (category, price bucket, in-stock) cell.
+
+    Catalog facets are sums over this small table instead of GROUP BY over
+    every product. Rows are maintained incrementally by
+    ``product.signals.facets`` and can be rebuilt with the
+    ``rebuild_product_facets`` command.
+    """
+    category = models.ForeignKey(ProductCategory, on_delete=models.CASCADE, related_name='facet_counts')
+    price_bucket = models.PositiveSmallIntegerField()
+    in_stock = models.BooleanField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'price_bucket', 'in_stock'], name='product_facet_cell_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.category_id} bucket {self.price_bucket} in_stock={self.in_stock}: {self.count}'
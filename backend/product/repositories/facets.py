@@ -0,0 +1,127 @@
+from bisect import bisect_right
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Case, Count, F, IntegerField, Sum, Value, When
+
+from ..models import ProductCategory, ProductFacetCount, ProductModel
+
+# (category_id, price_bucket, in_stock)
+FacetCell = Tuple[object, int, bool]
+
+
+def price_bucket_edges() -> List[Decimal]:
+    """Lower bound of every price bucket; the last bucket is open-ended."""
+    return [Decimal(str(edge)) for edge in getattr(settings, 'PRODUCT_PRICE_BUCKETS', [0, 10, 25, 50, 100, 250, 500, 1000])]
+
+
+def price_bucket(price) -> int:
+    return max(0, bisect_right(price_bucket_edges(), Decimal(str(price))) - 1)
+
+
+def facet_cell(category_id, price, stock) -> FacetCell:
+    return category_id, price_bucket(price), stock > 0
+
+
+class FacetRepositories:
+    """
+    Handle reads and incremental maintenance of ProductFacetCount
+    """
+
+    @staticmethod
+    def apply_delta(cell: FacetCell, delta: int) -> None:
+        category_id, bucket, in_stock = cell
+        with transaction.atomic():
+            updated = ProductFacetCount.objects.filter(
+                category_id=category_id, price_bucket=bucket, in_stock=in_stock
+            ).update(count=F('count') + delta)
+            if updated:
+                return
+            try:
+                with transaction.atomic():
+                    ProductFacetCount.objects.create(
+                        category_id=category_id, price_bucket=bucket, in_stock=in_stock, count=delta
+                    )
+            except IntegrityError:
+                # A concurrent writer created the cell first
+                ProductFacetCount.objects.filter(
+                    category_id=category_id, price_bucket=bucket, in_stock=in_stock
+                ).update(count=F('count') + delta)
+
+    @staticmethod
+    def move(old: Optional[FacetCell], new: Optional[FacetCell]) -> None:
+        """Move one product from the ``old`` cell to the ``new`` one (either may be None)."""
+        if old == new:
+            return
+        with transaction.atomic():
+            if old is not None:
+                FacetRepositories.apply_delta(old, -1)
+            if new is not None:
+                FacetRepositories.apply_delta(new, 1)
+
+    @staticmethod
+    def _buckets_for_range(min_price: Optional[Decimal], max_price: Optional[Decimal]) -> List[int]:
+        edges = price_bucket_edges()
+        first = price_bucket(min_price) if min_price is not None else 0
+        last = price_bucket(max_price) if max_price is not None else len(edges) - 1
+        return list(range(first, last + 1))
+
+    @staticmethod
+    def get_facets(category: Optional[str] = None, min_price: Optional[Decimal] = None,
+                   max_price: Optional[Decimal] = None, in_stock: bool = True) -> Dict[str, list]:
+        """
+        Facet counts for the current filters.
+
+        Each facet applies every filter except its own, so the counts tell
+        the client what selecting another value would return. Price ranges
+        are matched at bucket granularity.
+        """
+        cells = ProductFacetCount.objects.filter(in_stock=in_stock)
+
+        category_counts = dict(
+            cells.filter(price_bucket__in=FacetRepositories._buckets_for_range(min_price, max_price))
+            .values_list('category_id')
+            .annotate(total=Sum('count'))
+        )
+        categories = [
+            {"id": c.id, "name": c.name, "count": category_counts.get(c.id, 0)}
+            for c in ProductCategory.objects.order_by('name')
+        ]
+
+        price_cells = cells.filter(category__name=category) if category else cells
+        bucket_counts = dict(price_cells.values_list('price_bucket').annotate(total=Sum('count')))
+        # Rendered like DecimalField values elsewhere in the API
+        edges = [str(edge.quantize(Decimal('0.01'))) for edge in price_bucket_edges()]
+        price = [
+            {"min": edge, "max": edges[i + 1] if i + 1 < len(edges) else None, "count": bucket_counts.get(i, 0)}
+            for i, edge in enumerate(edges)
+        ]
+        return {"categories": categories, "price": price}
+
+    @staticmethod
+    def rebuild() -> int:
+        """Recompute every cell from ProductModel in one aggregate query."""
+        edges = price_bucket_edges()
+        bucket = Case(
+            *[When(price__gte=edge, then=Value(i)) for i, edge in reversed(list(enumerate(edges)))],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        in_stock = Case(When(stock__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField())
+        rows = (
+            ProductModel.objects.annotate(bucket=bucket, available=in_stock)
+            .values('category_id', 'bucket', 'available')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        cells = [
+            ProductFacetCount(category_id=row['category_id'], price_bucket=row['bucket'],
+                              in_stock=row['available'], count=row['total'])
+            for row in rows
+        ]
+        with transaction.atomic():
+            ProductFacetCount.objects.all().delete()
+            ProductFacetCount.objects.bulk_create(cells, batch_size=1000)
+        return len(cells)
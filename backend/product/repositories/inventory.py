@@ -0,0 +1,288 @@
+import random
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from ..models import InsufficientStock, ProductModel, ProductStockShard
+from ..signals.stock import inventory_changed, stock_changed
+
+
+class InventoryRepositories:
+    """
+    Handle sharded stock counters.
+
+    In sharded mode a product's stock lives in ``stock_shards`` counter rows.
+    A decrement is a conditional UPDATE on one randomly chosen shard, so N
+    shards let up to N checkouts of the same product commit in parallel.
+    ``ProductModel.stock`` becomes a rolled-up total (shards plus
+    ``reserved``) that ``rollup`` refreshes. Use ``get_available_stock`` when
+    an exact figure is needed.
+
+    Stock holds are not placed on sharded products. Checkouts go straight to
+    the shard counters, which still never oversell. Holds that already
+    existed when sharding was enabled stay in ``reserved``, outside the
+    shards: confirming one consumes its units from there, and releasing or
+    expiring one puts its units back into a shard.
+    """
+
+    @staticmethod
+    def enable_sharding(product_id, shards: int) -> None:
+        """
+        Split the product's unreserved stock evenly across ``shards`` counters.
+
+        Units under live holds are not split; see the class docstring for
+        how those holds are settled.
+        """
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        with transaction.atomic():
+            product = ProductModel.objects.select_for_update().get(pk=product_id)
+            stock = InventoryRepositories._locked_total(product)
+            ProductStockShard.objects.filter(product=product).delete()
+            base, extra = divmod(max(stock - product.reserved, 0), shards)
+            ProductStockShard.objects.bulk_create([
+                ProductStockShard(product=product, shard=n, stock=base + (1 if n < extra else 0))
+                for n in range(shards)
+            ])
+            ProductModel.objects.filter(pk=product_id).update(stock_shards=shards, stock=stock)
+            inventory_changed.send(sender=ProductModel, product_ids=[str(product_id)])
+
+    @staticmethod
+    def disable_sharding(product_id) -> None:
+        """Fold the shards back into ``ProductModel.stock``."""
+        with transaction.atomic():
+            product = ProductModel.objects.select_for_update().get(pk=product_id)
+            stock = InventoryRepositories._locked_total(product)
+            ProductStockShard.objects.filter(product=product).delete()
+            ProductModel.objects.filter(pk=product_id).update(stock_shards=0, stock=stock)
+            if stock != product.stock:
+                stock_changed.send(sender=ProductModel, changes={str(product_id): stock - product.stock})
+            else:
+                inventory_changed.send(sender=ProductModel, product_ids=[str(product_id)])
+
+    @staticmethod
+    def _locked_total(product: ProductModel) -> int:
+        """Units on hand, held ones included."""
+        if not product.stock_shards:
+            return product.stock
+        shards = ProductStockShard.objects.select_for_update().filter(product=product)
+        return sum(shards.values_list('stock', flat=True)) + product.reserved
+
+    @staticmethod
+    def decrement_shards(product_id, quantity: int, shards: int) -> bool:
+        """
+        Take ``quantity`` units from the product's shards.
+
+        Shards are tried in random order with one conditional UPDATE each.
+        Only when no single shard can cover the quantity are all shards
+        locked (in shard order, to avoid deadlocks) and drained together.
+        Returns False when the shards hold fewer than ``quantity`` units.
+        """
+        order = list(range(shards))
+        random.shuffle(order)
+        for shard in order:
+            if ProductStockShard.objects.filter(
+                product_id=product_id, shard=shard, stock__gte=quantity
+            ).update(stock=F('stock') - quantity):
+                return True
+
+        with transaction.atomic():
+            rows = list(
+                ProductStockShard.objects.select_for_update()
+                .filter(product_id=product_id, stock__gt=0)
+                .order_by('shard')
+                .values_list('shard', 'stock')
+            )
+            if sum(stock for _, stock in rows) < quantity:
+                return False
+            remaining = quantity
+            for shard, stock in rows:
+                take = min(stock, remaining)
+                ProductStockShard.objects.filter(product_id=product_id, shard=shard).update(stock=F('stock') - take)
+                remaining -= take
+                if not remaining:
+                    break
+        return True
+
+    @staticmethod
+    def restock_shards(lines: Dict) -> None:
+        """
+        Put released units (product_id -> quantity) back into sharded products.
+
+        Products that are not sharded are ignored: their units return by the
+        ``reserved`` decrement alone. Each product's units go to one random
+        shard, and products that were sold out are rolled up.
+        """
+        lines = {str(product_id): quantity for product_id, quantity in lines.items() if quantity}
+        if not lines:
+            return
+        sharded = InventoryRepositories.get_sharded_products(lines)
+        for product_id, shards in sharded.items():
+            ProductStockShard.objects.filter(
+                product_id=product_id, shard=random.randrange(shards)
+            ).update(stock=F('stock') + lines[product_id])
+        InventoryRepositories.settle_shards(sharded)
+
+    @staticmethod
+    def commit(lines: Dict, held: Optional[Dict] = None) -> Dict[str, int]:
+        """
+        Deduct ``lines`` (product_id -> quantity) from stock in one statement.
+
+        ``held`` (product_id -> quantity) are units reserved for this commit.
+        They are consumed first, and any left over are given back. The rows
+        of unsharded products are locked in id order by one SELECT ... FOR
+        UPDATE, so concurrent commits cannot deadlock. Every line is checked
+        in memory, and the stock and reserved counters then move in a single
+        ``UPDATE ... CASE``. Raises InsufficientStock, naming every short
+        product, before anything is written.
+
+        Sharded product rows are not locked, which is the point of sharding:
+        their lines are taken from their held units first and then from
+        their shards, and held units left over go back to a shard. Those
+        whose shards ran out are rolled up (see ``settle_shards``).
+
+        Returns the stock change per unsharded product, for the caller to
+        send as ``stock_changed``.
+        """
+        lines = {str(product_id): quantity for product_id, quantity in lines.items()}
+        held = {str(product_id): quantity for product_id, quantity in (held or {}).items()}
+        product_ids = sorted(set(lines) | set(held))
+        if not product_ids:
+            return {}
+        with transaction.atomic():
+            sharded = InventoryRepositories.get_sharded_products(product_ids)
+            plain = [product_id for product_id in product_ids if product_id not in sharded]
+            rows = {
+                str(pk): (stock, reserved)
+                for pk, stock, reserved in ProductModel.objects.select_for_update()
+                .filter(pk__in=plain, stock_shards=0).order_by('pk')
+                .values_list('pk', 'stock', 'reserved')
+            } if plain else {}
+            short = []
+            stock_delta, reserved_delta = {}, {}
+            for product_id in product_ids:
+                quantity, from_hold = lines.get(product_id, 0), held.get(product_id, 0)
+                if from_hold:
+                    reserved_delta[product_id] = -from_hold
+                if product_id in sharded:
+                    continue
+                if product_id not in rows:
+                    short.append(product_id)
+                    continue
+                stock, reserved = rows[product_id]
+                if not quantity:
+                    continue
+                # Units held for this commit are usable on top of free stock
+                if stock - (reserved - from_hold) < quantity:
+                    short.append(product_id)
+                    continue
+                stock_delta[product_id] = -quantity
+            if short:
+                raise InsufficientStock(f"Insufficient stock for product {', '.join(short)}.")
+
+            leftover, decremented = {}, []
+            for product_id, shards in sharded.items():
+                quantity, from_hold = lines.get(product_id, 0), held.get(product_id, 0)
+                needed = max(quantity - from_hold, 0)
+                if needed:
+                    if not InventoryRepositories.decrement_shards(product_id, needed, shards):
+                        raise InsufficientStock(f"Insufficient stock for product {product_id}.")
+                    decremented.append(product_id)
+                if from_hold > quantity:
+                    leftover[product_id] = from_hold - quantity
+
+            if stock_delta or reserved_delta:
+                ProductModel.objects.filter(pk__in=list(set(stock_delta) | set(reserved_delta))).update(
+                    stock=F('stock') + InventoryRepositories._case(stock_delta),
+                    reserved=F('reserved') + InventoryRepositories._case(reserved_delta),
+                )
+            InventoryRepositories.restock_shards(leftover)
+            InventoryRepositories.settle_shards(decremented)
+            # Stock changes are reported by the caller through stock_changed
+            held_only = set(reserved_delta) - set(stock_delta) - set(leftover) - set(decremented)
+            if held_only:
+                inventory_changed.send(sender=ProductModel, product_ids=sorted(held_only))
+        return stock_delta
+
+    @staticmethod
+    def settle_shards(product_ids: Iterable) -> None:
+        """
+        Roll up the sharded products whose shards ran out or refilled.
+
+        Facets, search and cached products read ``ProductModel.stock``,
+        which shard decrements leave alone. Products whose in-stock state
+        flipped are rolled up right away, so ``rollup`` reports their change
+        through ``stock_changed``. The hot row is only written on those
+        rare flips. The rest get ``inventory_changed``.
+        """
+        product_ids = [str(product_id) for product_id in product_ids]
+        if not product_ids:
+            return
+        totals = {
+            str(pk): total
+            for pk, total in ProductStockShard.objects.filter(product_id__in=product_ids)
+            .values('product').annotate(total=Sum('stock')).values_list('product', 'total')
+        }
+        flipped, moved = [], []
+        for pk, stock, reserved in ProductModel.objects.filter(
+            pk__in=product_ids, stock_shards__gt=0
+        ).values_list('pk', 'stock', 'reserved'):
+            in_stock = totals.get(str(pk), 0) > 0
+            (flipped if in_stock != (stock - reserved > 0) else moved).append(str(pk))
+        if flipped:
+            InventoryRepositories.rollup(flipped)
+        if moved:
+            inventory_changed.send(sender=ProductModel, product_ids=sorted(moved))
+
+    @staticmethod
+    def _case(deltas: Dict[str, int]):
+        return Case(
+            *[When(pk=product_id, then=Value(delta)) for product_id, delta in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+
+    @staticmethod
+    def get_available_stock(product_id) -> int:
+        product = ProductModel.objects.only('stock', 'reserved', 'stock_shards').get(pk=product_id)
+        if not product.stock_shards:
+            return product.stock - product.reserved
+        total = ProductStockShard.objects.filter(product_id=product_id).aggregate(total=Sum('stock'))['total']
+        return total or 0
+
+    @staticmethod
+    def get_sharded_products(product_ids: Iterable) -> Dict[str, int]:
+        """Map the sharded products among ``product_ids`` to their shard count."""
+        return {
+            str(pk): shards
+            for pk, shards in ProductModel.objects.filter(
+                pk__in=list(product_ids), stock_shards__gt=0
+            ).values_list('pk', 'stock_shards')
+        }
+
+    @staticmethod
+    def rollup(product_ids: Optional[Iterable] = None) -> int:
+        """
+        Write each sharded product's shard total into ``ProductModel.stock``.
+
+        The total includes the units held outside the shards. One UPDATE for
+        all products. Sends ``stock_changed`` for the ones whose total moved.
+        """
+        with transaction.atomic():
+            products = ProductModel.objects.select_for_update().filter(stock_shards__gt=0)
+            if product_ids is not None:
+                products = products.filter(pk__in=list(product_ids))
+            before = dict(products.values_list('pk', 'stock'))
+            if not before:
+                return 0
+            total = ProductStockShard.objects.filter(product=OuterRef('pk')).values('product').annotate(
+                total=Sum('stock')
+            ).values('total')
+            ProductModel.objects.filter(pk__in=list(before)).update(stock=Coalesce(Subquery(total), 0) + F('reserved'))
+            after = dict(ProductModel.objects.filter(pk__in=list(before)).values_list('pk', 'stock'))
+            changes = {str(pk): after[pk] - before[pk] for pk in before if after[pk] != before[pk]}
+            if changes:
+                stock_changed.send(sender=ProductModel, changes=changes)
+        return len(before)
@@ -1,19 +1,147 @@
-from ..models import ProductModel, ProductReview, ProductCategory
+from ..models import ProductModel, ProductReview, ProductCategory, PipelineCheckpoint
 from django.db.models import QuerySet
+from django.db import transaction
+from .rating import RatingRepositories
+from backend.utils.cursor_pagination import paginate_keyset
+from typing import Optional, Tuple, List, Dict, Iterable, Iterator
+from decimal import Decimal
+import uuid
 
 class ProductRepositories():
     """
     Hanlde all database query for product
     """
+
+    # Catalog sort orders. Each one ends with the primary key so positions are
+    # unique, and each is backed by a matching index on ProductModel.
+    SORT_ORDERS = {
+        'newest': ('-created_at', '-id'),
+        'price_asc': ('price', 'id'),
+        'price_desc': ('-price', '-id'),
+        'rating': ('-average_rating', '-id'),
+    }
     
     @staticmethod
     def get_all_product() -> QuerySet[ProductModel]:
-        return ProductModel.objects.filter(stock__gt=0)
+        return ProductModel.objects.filter(stock__gt=0).defer('embedding')
+
+    @staticmethod
+    def filter_products(category: Optional[str] = None, min_price: Optional[Decimal] = None,
+                        max_price: Optional[Decimal] = None, in_stock: bool = True) -> QuerySet[ProductModel]:
+        queryset = ProductModel.objects.filter(stock__gt=0) if in_stock else ProductModel.objects.filter(stock__lte=0)
+        # The embedding blob is only read by the semantic index
+        queryset = queryset.select_related('rating_summary').defer('embedding')
+        if category:
+            queryset = queryset.filter(category__name=category)
+        if min_price is not None:
+            queryset = queryset.filter(price__gte=min_price)
+        if max_price is not None:
+            queryset = queryset.filter(price__lte=max_price)
+        return queryset
+
+    @staticmethod
+    def get_product_page(sort: str, cursor: Optional[str], limit: int, **filters) -> Tuple[List[ProductModel], Optional[str]]:
+        """
+        Return one keyset page of products and the cursor for the next page.
+
+        ``filters`` are those of ``filter_products``; by default only in-stock
+        products are listed. Raises ValueError for an unknown sort or an
+        invalid cursor.
+        """
+        ordering = ProductRepositories.SORT_ORDERS.get(sort)
+        if ordering is None:
+            raise ValueError(f"Unknown sort '{sort}'.")
+        return paginate_keyset(ProductRepositories.filter_products(**filters), ordering, sort, cursor, limit)
     
+    @staticmethod
+    def get_products_by_ids(product_ids: List[str]) -> Dict[str, ProductModel]:
+        """Fetch in-stock products in one query, keyed by their pk as a string."""
+        if not product_ids:
+            return {}
+        products = ProductModel.objects.filter(id__in=product_ids, stock__gt=0).select_related('rating_summary').defer('embedding')
+        return {str(p.pk): p for p in products}
+
+    @staticmethod
+    def get_product_snapshots(product_ids: Iterable[str]) -> Dict[str, dict]:
+        """
+        Fetch name, price, image and available stock of products in one query.
+
+        Out-of-stock products are included; ids that are not valid product
+        keys are ignored. Keyed by pk as a string.
+        """
+        valid_ids = []
+        for product_id in product_ids:
+            try:
+                valid_ids.append(uuid.UUID(str(product_id)))
+            except ValueError:
+                continue
+        if not valid_ids:
+            return {}
+        rows = ProductModel.objects.filter(id__in=valid_ids).values(
+            'id', 'name', 'price', 'image_url', 'stock', 'reserved'
+        )
+        return {
+            str(row['id']): {
+                'name': row['name'],
+                'price': row['price'],
+                'image_url': row['image_url'],
+                'available_stock': max(row['stock'] - row['reserved'], 0),
+            }
+            for row in rows
+        }
+
+    @staticmethod
+    def iter_searchable_products(category_id: Optional[str] = None, product_ids: Optional[List] = None) -> Iterator[Tuple]:
+        """Stream ``(id, name, description, category name)`` of in-stock products."""
+        queryset = ProductModel.objects.filter(stock__gt=0)
+        if category_id is not None:
+            queryset = queryset.filter(category_id=category_id)
+        if product_ids is not None:
+            queryset = queryset.filter(pk__in=product_ids)
+        return queryset.values_list('id', 'name', 'description', 'category__name').iterator(chunk_size=2000)
+
+    @staticmethod
+    def iter_embedded_products() -> Iterator[Tuple]:
+        """Stream ``(id, embedding)`` of in-stock products that have a vector."""
+        return (
+            ProductModel.objects.filter(stock__gt=0, embedding__isnull=False)
+            .values_list('id', 'embedding')
+            .iterator(chunk_size=2000)
+        )
+
+    @staticmethod
+    def get_products_for_embedding(after_id: Optional[str], limit: int) -> List[Tuple]:
+        """
+        Return the next ``limit`` products after ``after_id`` in pk order as
+        ``(id, name, description, category name, embedding_hash)``.
+        """
+        queryset = ProductModel.objects.order_by('id')
+        if after_id:
+            queryset = queryset.filter(id__gt=after_id)
+        return list(queryset.values_list('id', 'name', 'description', 'category__name', 'embedding_hash')[:limit])
+
+    @staticmethod
+    def save_embeddings(embeddings: Dict[str, Tuple[bytes, str]]) -> None:
+        """Write many ``(vector, content hash)`` pairs with one bulk UPDATE per batch."""
+        products = [
+            ProductModel(id=product_id, embedding=vector, embedding_hash=content_hash)
+            for product_id, (vector, content_hash) in embeddings.items()
+        ]
+        ProductModel.objects.bulk_update(products, ['embedding', 'embedding_hash'], batch_size=500)
+
+    @staticmethod
+    def get_checkpoint(name: str) -> str:
+        checkpoint = PipelineCheckpoint.objects.filter(name=name).first()
+        return checkpoint.position if checkpoint else ''
+
+    @staticmethod
+    def save_checkpoint(name: str, position: str) -> None:
+        PipelineCheckpoint.objects.update_or_create(name=name, defaults={'position': position})
+
     @staticmethod
     def get_product_by_id(product_id: str) -> ProductModel | None:
         try:
-            product = ProductModel.objects.get(id=product_id)
+            product = ProductModel.objects.select_related('rating_summary').defer('embedding').get(id=product_id)
             if product.stock > 0:
                 return product
             return "product out of stock"
@@ -23,16 +151,31 @@ class ProductRepositories():
     @staticmethod
     def get_reviews_for_product(product_id: str) -> QuerySet[ProductReview]:
         return ProductReview.objects.filter(product_id=product_id)
+
+    @staticmethod
+    def get_reviews_page(product_id: str, cursor: Optional[str], limit: int) -> Tuple[List[ProductReview], Optional[str]]:
+        """
+        Return one page of a product's reviews, newest first.
+
+        Served by the (product, created_at DESC, id DESC) index, so any page
+        costs the same whatever the product's review count.
+        """
+        return paginate_keyset(
+            ProductReview.objects.filter(product_id=product_id),
+            ('-created_at', '-id'), 'reviews', cursor, limit,
+        )
     
     @staticmethod
     def add_product_review(product: ProductModel, user_id: str, user_first_name: str, rating: int, comment: str) -> ProductReview:
-        review = ProductReview.objects.create(
-            product=product,
-            user_id=user_id,
-            user_first_name=user_first_name,
-            rating=rating,
-            comment=comment
-        )
+        with transaction.atomic():
+            review = ProductReview.objects.create(
+                product=product,
+                user_id=user_id,
+                user_first_name=user_first_name,
+                rating=rating,
+                comment=comment
+            )
+            RatingRepositories.record_rating(product.pk, rating)
         return review
 
     @staticmethod
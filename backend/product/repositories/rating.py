@@ -0,0 +1,66 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from ..models import ProductModel, ProductRatingSummary, ProductReview
+
+
+class RatingRepositories:
+    """
+    Handle maintenance of ProductRatingSummary
+    """
+
+    @staticmethod
+    def record_rating(product_id, rating: int) -> ProductRatingSummary:
+        """
+        Add one rating to the product's summary and refresh its average_rating.
+
+        Must run inside the transaction that inserts the review. The counter
+        update is a single ``UPDATE ... SET count = count + 1``, so concurrent
+        reviews never lose increments.
+        """
+        star = f'star_{rating}'
+        increments = {'count': F('count') + 1, 'total': F('total') + rating, star: F(star) + 1}
+        with transaction.atomic():
+            if not ProductRatingSummary.objects.filter(product_id=product_id).update(**increments):
+                try:
+                    with transaction.atomic():
+                        ProductRatingSummary.objects.create(product_id=product_id, count=1, total=rating, **{star: 1})
+                except IntegrityError:
+                    # A concurrent first review created the row
+                    ProductRatingSummary.objects.filter(product_id=product_id).update(**increments)
+            summary = ProductRatingSummary.objects.get(product_id=product_id)
+            ProductModel.objects.filter(pk=product_id).update(average_rating=summary.average)
+        return summary
+
+    @staticmethod
+    def rebuild() -> int:
+        """Recompute every summary and average_rating from ProductReview in bulk."""
+        rows = (
+            ProductReview.objects.values('product_id')
+            .annotate(
+                review_count=Count('id'),
+                rating_total=Sum('rating'),
+                **{f'stars_{n}': Count('id', filter=Q(rating=n)) for n in range(1, 6)},
+            )
+            .order_by()
+        )
+        summaries = [
+            ProductRatingSummary(
+                product_id=row['product_id'],
+                count=row['review_count'],
+                total=row['rating_total'],
+                **{f'star_{n}': row[f'stars_{n}'] for n in range(1, 6)},
+            )
+            for row in rows
+        ]
+        summary = ProductRatingSummary.objects.filter(product_id=OuterRef('pk'))
+        with transaction.atomic():
+            ProductRatingSummary.objects.all().delete()
+            ProductRatingSummary.objects.bulk_create(summaries, batch_size=1000)
+            # One UPDATE for the whole catalog; products without reviews get 0
+            ProductModel.objects.update(average_rating=Coalesce(
+                Subquery(summary.values('total')[:1]) * Value(1.0) / Subquery(summary.values('count')[:1]),
+                Value(0.0),
+            ))
+        return len(summaries)
@@ -0,0 +1,226 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from ..models import InsufficientStock, ProductModel, StockReservation
+from ..signals.stock import inventory_changed, stock_changed
+from .inventory import InventoryRepositories
+
+
+class ReservationRepositories:
+    """
+    Handle database operations for stock holds.
+
+    Availability checks and counter changes are single conditional UPDATEs
+    on the product row, never read-modify-write, so concurrent checkouts
+    cannot oversell and the row is only locked for the statement itself.
+    ``hold_many`` instead locks its rows for the check, so it can report
+    every short product before anything moves.
+    """
+
+    @staticmethod
+    def hold(product_id, quantity: int, reference: str, expires_at: datetime) -> None:
+        """
+        Reserve ``quantity`` more units of a product for ``reference``.
+
+        Extends the reference's live hold on that product if it has one.
+        Sharded products are not held (see InventoryRepositories). Raises
+        InsufficientStock when fewer units are available.
+        """
+        with transaction.atomic():
+            reserved = ProductModel.objects.filter(
+                pk=product_id, stock_shards=0, stock__gte=F('reserved') + quantity
+            ).update(reserved=F('reserved') + quantity)
+            if not reserved:
+                if ProductModel.objects.filter(pk=product_id, stock_shards__gt=0).exists():
+                    return
+                raise InsufficientStock(f"Insufficient stock for product {product_id}.")
+            inventory_changed.send(sender=ProductModel, product_ids=[str(product_id)])
+            live = StockReservation.objects.filter(reference=reference, product_id=product_id, status=StockReservation.HELD)
+            if live.update(quantity=F('quantity') + quantity, expires_at=expires_at):
+                return
+            try:
+                with transaction.atomic():
+                    StockReservation.objects.create(
+                        product_id=product_id, reference=reference, quantity=quantity, expires_at=expires_at
+                    )
+            except IntegrityError:
+                live.update(quantity=F('quantity') + quantity, expires_at=expires_at)
+
+    @staticmethod
+    def hold_many(lines: Dict, reference: str, expires_at: datetime) -> None:
+        """
+        Reserve every ``product_id -> quantity`` line for ``reference`` at once.
+
+        The product rows are locked in id order by one SELECT ... FOR UPDATE
+        and every line is checked against them; if any product lacks stock,
+        InsufficientStock names all of them and nothing is held. The counters
+        then move in one ``UPDATE ... CASE`` and the hold rows are extended or
+        created with one bulk statement each. Sharded products are skipped,
+        as in ``hold``.
+        """
+        if not lines:
+            return
+        lines = {str(product_id): quantity for product_id, quantity in lines.items()}
+        sharded = InventoryRepositories.get_sharded_products(lines)
+        lines = {product_id: quantity for product_id, quantity in lines.items() if product_id not in sharded}
+        if not lines:
+            return
+        with transaction.atomic():
+            available = {
+                str(pk): stock - reserved
+                for pk, stock, reserved in ProductModel.objects.select_for_update()
+                .filter(pk__in=list(lines), stock_shards=0).order_by('pk')
+                .values_list('pk', 'stock', 'reserved')
+            }
+            short = sorted(
+                product_id for product_id, quantity in lines.items() if available.get(product_id, 0) < quantity
+            )
+            if short:
+                raise InsufficientStock(f"Insufficient stock for product {', '.join(short)}.")
+            ProductModel.objects.filter(pk__in=list(lines)).update(reserved=F('reserved') + Case(
+                *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in lines.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            ))
+            inventory_changed.send(sender=ProductModel, product_ids=list(lines))
+
+            live = {
+                str(hold.product_id): hold
+                for hold in StockReservation.objects.select_for_update().filter(
+                    reference=reference, product_id__in=list(lines), status=StockReservation.HELD
+                )
+            }
+            for product_id, hold in live.items():
+                hold.quantity += lines[product_id]
+                hold.expires_at = expires_at
+            StockReservation.objects.bulk_update(live.values(), ['quantity', 'expires_at'])
+            StockReservation.objects.bulk_create([
+                StockReservation(product_id=product_id, reference=reference, quantity=quantity, expires_at=expires_at)
+                for product_id, quantity in lines.items() if product_id not in live
+            ])
+
+    @staticmethod
+    def release_quantities(reference: str, lines: Dict) -> int:
+        """
+        Give back part of the live holds of ``reference`` (product_id -> quantity).
+
+        Never releases more than is held; a hold reduced to zero is closed.
+        Returns the number of holds touched.
+        """
+        if not lines:
+            return 0
+        lines = {str(product_id): quantity for product_id, quantity in lines.items()}
+        with transaction.atomic():
+            holds = list(
+                StockReservation.objects.select_for_update()
+                .filter(reference=reference, product_id__in=list(lines), status=StockReservation.HELD)
+            )
+            if not holds:
+                return 0
+            released: Dict = defaultdict(int)
+            for hold in holds:
+                quantity = min(hold.quantity, lines[str(hold.product_id)] - released[str(hold.product_id)])
+                released[str(hold.product_id)] += quantity
+                hold.quantity -= quantity
+                if not hold.quantity:
+                    hold.status = StockReservation.RELEASED
+            ProductModel.objects.filter(pk__in=list(released)).update(reserved=Case(
+                *[When(pk=product_id, then=F('reserved') - quantity) for product_id, quantity in released.items()],
+                default=F('reserved'),
+            ))
+            InventoryRepositories.restock_shards(released)
+            StockReservation.objects.bulk_update(holds, ['quantity', 'status'])
+            inventory_changed.send(sender=ProductModel, product_ids=list(released))
+            return len(holds)
+
+    @staticmethod
+    def get_held(reference: str) -> Dict[str, int]:
+        """Units currently held by ``reference``, per product."""
+        return {
+            str(product_id): quantity
+            for product_id, quantity in StockReservation.objects.filter(
+                reference=reference, status=StockReservation.HELD
+            ).values_list('product_id', 'quantity')
+        }
+
+    @staticmethod
+    def is_confirmed(reference: str) -> bool:
+        """Whether any hold of ``reference`` was confirmed."""
+        return StockReservation.objects.filter(reference=reference, status=StockReservation.CONFIRMED).exists()
+
+    @staticmethod
+    def _end_holds(holds: List[Tuple], status: str) -> int:
+        """Give ``(id, product_id, quantity)`` holds back with one UPDATE per table."""
+        if not holds:
+            return 0
+        totals: Dict = defaultdict(int)
+        for _, product_id, quantity in holds:
+            totals[product_id] += quantity
+        ProductModel.objects.filter(pk__in=list(totals)).update(reserved=Case(
+            *[When(pk=product_id, then=F('reserved') - quantity) for product_id, quantity in totals.items()],
+            default=F('reserved'),
+        ))
+        # Holds from before a product was sharded return their units to a shard
+        InventoryRepositories.restock_shards(totals)
+        StockReservation.objects.filter(pk__in=[hold_id for hold_id, _, _ in holds]).update(status=status)
+        inventory_changed.send(sender=ProductModel, product_ids=[str(product_id) for product_id in totals])
+        return len(holds)
+
+    @staticmethod
+    def release(reference: str, product_ids: Optional[Iterable] = None) -> int:
+        """Release the live holds of ``reference`` (optionally only for some products)."""
+        with transaction.atomic():
+            holds = StockReservation.objects.select_for_update().filter(reference=reference, status=StockReservation.HELD)
+            if product_ids is not None:
+                holds = holds.filter(product_id__in=list(product_ids))
+            return ReservationRepositories._end_holds(
+                list(holds.values_list('id', 'product_id', 'quantity')), StockReservation.RELEASED
+            )
+
+    @staticmethod
+    def release_expired(now: datetime, batch_size: int = 1000) -> int:
+        """
+        Expire one batch of holds past their deadline.
+
+        Rows locked by another sweeper are skipped, so several workers can
+        sweep at once. Returns the number of holds expired.
+        """
+        with transaction.atomic():
+            holds = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(status=StockReservation.HELD, expires_at__lt=now)
+                .order_by('expires_at')
+                .values_list('id', 'product_id', 'quantity')[:batch_size]
+            )
+            return ReservationRepositories._end_holds(holds, StockReservation.EXPIRED)
+
+    @staticmethod
+    def confirm(reference: str, lines: Dict) -> None:
+        """
+        Deduct stock for ``lines`` (product_id -> quantity) and close the holds.
+
+        The units held by ``reference`` are consumed first, and any shortfall
+        must come from unreserved stock. The counters move through
+        ``InventoryRepositories.commit``: one locking read and one UPDATE
+        for the whole order. Raises InsufficientStock and rolls everything
+        back if a line cannot be satisfied.
+        """
+        with transaction.atomic():
+            held: Dict = defaultdict(int)
+            hold_ids = []
+            for hold_id, product_id, quantity in (
+                StockReservation.objects.select_for_update()
+                .filter(reference=reference, status=StockReservation.HELD)
+                .values_list('id', 'product_id', 'quantity')
+            ):
+                held[str(product_id)] += quantity
+                hold_ids.append(hold_id)
+
+            changes = InventoryRepositories.commit(lines, held)
+            StockReservation.objects.filter(pk__in=hold_ids).update(status=StockReservation.CONFIRMED)
+            if changes:
+                stock_changed.send(sender=ProductModel, changes=changes)
@@ -0,0 +1,83 @@
+import hashlib
+from typing import List, Sequence
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .text import tokenize
+
+EMBEDDING_DTYPE = np.dtype('<f4')
+
+
+def product_text(name: str, description: str, category: str) -> str:
+    """The text a product is embedded from."""
+    return f"{name}\n{category}\n{description}"
+
+
+def content_hash(embedder, name: str, description: str, category: str) -> str:
+    """
+    Fingerprint of everything an embedding depends on.
+
+    The embedder class and dimension are part of it, so switching models
+    re-embeds every product on the next pipeline run.
+    """
+    identity = f"{type(embedder).__module__}.{type(embedder).__qualname__}:{embedder.dim}"
+    payload = "\x1f".join((identity, name, description, category))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def to_bytes(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype=EMBEDDING_DTYPE).tobytes()
+
+
+def from_bytes(data) -> np.ndarray:
+    return np.frombuffer(bytes(data), dtype=EMBEDDING_DTYPE)
+
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder based on signed feature hashing.
+
+    Each stemmed token and each character trigram of it is hashed into one
+    of ``dim`` buckets with a +/-1 sign, and the result is L2-normalized.
+    Texts sharing vocabulary land close together, which is enough to build
+    and benchmark the retrieval path offline. Swap in a real model through
+    the ``PRODUCT_EMBEDDER`` setting; any class with a ``dim`` attribute and
+    an ``embed(texts)`` method returning an ``(n, dim)`` float32 array works.
+    """
+
+    def __init__(self, dim: int = 256, trigram_weight: float = 0.5):
+        self.dim = dim
+        self.trigram_weight = trigram_weight
+
+    def _bucket(self, feature: str):
+        digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+        value = int.from_bytes(digest, 'little')
+        return value % self.dim, 1.0 if (value >> 63) & 1 else -1.0
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=EMBEDDING_DTYPE)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                bucket, sign = self._bucket(token)
+                vectors[row, bucket] += sign
+                padded = f"#{token}#"
+                for start in range(len(padded) - 2):
+                    bucket, sign = self._bucket(padded[start:start + 3])
+                    vectors[row, bucket] += sign * self.trigram_weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+def get_embedder():
+    """Instantiate the embedder named by ``settings.PRODUCT_EMBEDDER``."""
+    path = getattr(settings, 'PRODUCT_EMBEDDER', 'product.search.embedding.HashingEmbedder')
+    options = getattr(settings, 'PRODUCT_EMBEDDER_OPTIONS', {})
+    return import_string(path)(**options)
+
+
+def embed_products(embedder, rows: List[Sequence[str]]) -> np.ndarray:
+    """Embed ``(name, description, category)`` rows in one batch."""
+    return embedder.embed([product_text(*row) for row in rows])
@@ -0,0 +1,106 @@
+import heapq
+import math
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .text import tokenize
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index with BM25 ranking.
+
+    Documents are keyed by an opaque id (the product pk as a string) and carry
+    a category used for filtering. Name terms are counted ``name_weight`` times
+    so a match in the name outranks the same match in the description.
+
+    A query only touches the posting lists of its own terms, so its cost
+    depends on how many documents contain those terms, not on catalog size.
+    All methods are thread-safe.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, name_weight: int = 2):
+        self.k1 = k1
+        self.b = b
+        self.name_weight = name_weight
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_length: Dict[str, int] = {}
+        self._doc_category: Dict[str, str] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_length)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_length
+
+    def _analyze(self, name: str, description: str, category: str) -> Counter:
+        terms = Counter(tokenize(description))
+        terms.update(tokenize(category))
+        for term in tokenize(name):
+            terms[term] += self.name_weight
+        return terms
+
+    def add(self, doc_id: str, name: str, description: str, category: str) -> None:
+        """Add a document, replacing any previous version of it."""
+        terms = self._analyze(name, description, category)
+        with self._lock:
+            self._remove_locked(doc_id)
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = frequency
+            length = sum(terms.values())
+            self._doc_terms[doc_id] = terms
+            self._doc_length[doc_id] = length
+            self._doc_category[doc_id] = category
+            self._total_length += length
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+        self._total_length -= self._doc_length.pop(doc_id)
+        self._doc_category.pop(doc_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_length.clear()
+            self._doc_category.clear()
+            self._total_length = 0
+
+    def search(self, query: str, limit: int = 20, categories: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Return up to ``limit`` ``(doc_id, score)`` pairs, best first."""
+        query_terms = set(tokenize(query))
+        allowed = set(categories) if categories else None
+        with self._lock:
+            doc_count = len(self._doc_length)
+            if not query_terms or not doc_count:
+                return []
+            average_length = self._total_length / doc_count
+            k1, b = self.k1, self.b
+            scores: Dict[str, float] = {}
+            for term in query_terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, frequency in posting.items():
+                    if allowed is not None and self._doc_category[doc_id] not in allowed:
+                        continue
+                    norm = k1 * (1 - b + b * self._doc_length[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (k1 + 1) / (frequency + norm)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
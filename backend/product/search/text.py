@@ -0,0 +1,64 @@
+import re
+from typing import List
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "that", "the", "this", "to", "with",
+})
+
+# (suffix, replacement, minimum stem length) checked in order, first match wins
+_SUFFIX_RULES = (
+    ("sses", "ss", 2),
+    ("ies", "y", 2),
+    ("ational", "ate", 3),
+    ("ization", "ize", 3),
+    ("fulness", "ful", 3),
+    ("ness", "", 3),
+    ("ments", "", 3),
+    ("ment", "", 3),
+    ("ings", "", 3),
+    ("ing", "", 3),
+    ("edly", "", 3),
+    ("ed", "", 3),
+    ("ly", "", 3),
+    ("es", "", 3),
+    ("s", "", 3),
+)
+
+
+# Suffixes after which a doubled final consonant is undone ("shipped" -> "ship")
+_UNDOUBLE_AFTER = frozenset({"ings", "ing", "edly", "ed"})
+
+
+def stem(token: str) -> str:
+    """
+    Light suffix-stripping stemmer.
+
+    It is far simpler than Porter but maps the common English inflections
+    ("phone", "phones", "charge", "charging", "charged") onto one term,
+    which is what matters for product names. A trailing "e" is dropped
+    from every stem, so a base form and its "-es"/"-ing"/"-ed" forms end
+    up equal. It must be applied identically to documents and queries.
+    """
+    if token.isdigit():
+        return token
+    for suffix, replacement, min_stem in _SUFFIX_RULES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= min_stem:
+            if suffix == "s" and token.endswith("ss"):
+                break
+            token = token[: -len(suffix)] + replacement
+            if suffix in _UNDOUBLE_AFTER and token[-1] == token[-2] and token[-1] not in "aeioulsz":
+                token = token[:-1]
+            break
+    if token.endswith("e") and len(token) > 3:
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split on non-alphanumerics, drop stop words and stem."""
+    if not text:
+        return []
+    return [stem(token) for token in _TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
@@ -0,0 +1,202 @@
+import threading
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class _VectorStore:
+    """
+    Growable matrix of unit vectors with O(1) add, replace and remove by id.
+
+    Removal moves the last row into the hole, so rows stay contiguous and a
+    search is a single matrix-vector product. Not thread-safe on its own;
+    the indexes below serialize access to their stores.
+    """
+
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.dim = dim
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids: List[Hashable] = []
+        self._positions: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, doc_id: Hashable, vector: np.ndarray) -> None:
+        position = self._positions.get(doc_id)
+        if position is None:
+            position = len(self._ids)
+            if position == len(self._vectors):
+                grown = np.zeros((max(1024, 2 * position), self.dim), dtype=np.float32)
+                grown[:position] = self._vectors[:position]
+                self._vectors = grown
+            self._ids.append(doc_id)
+            self._positions[doc_id] = position
+        self._vectors[position] = vector
+
+    def remove(self, doc_id: Hashable) -> bool:
+        position = self._positions.pop(doc_id, None)
+        if position is None:
+            return False
+        last = len(self._ids) - 1
+        if position != last:
+            moved = self._ids[last]
+            self._vectors[position] = self._vectors[last]
+            self._ids[position] = moved
+            self._positions[moved] = position
+        self._ids.pop()
+        return True
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[Hashable, float]]:
+        size = len(self._ids)
+        if not size or k <= 0:
+            return []
+        scores = self._vectors[:size] @ query
+        if k < size:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(size)
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[i], float(scores[i])) for i in top]
+
+
+class BruteForceIndex:
+    """
+    Exact cosine search over every vector.
+
+    Vectors must be L2-normalized. A query is one BLAS matrix-vector product,
+    which is the fastest option until the catalog reaches tens of thousands
+    of rows. All methods are thread-safe.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._store = _VectorStore(dim)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def add(self, doc_id: Hashable, vector: np.ndarray) -> None:
+        with self._lock:
+            self._store.add(doc_id, vector)
+
+    def remove(self, doc_id: Hashable) -> None:
+        with self._lock:
+            self._store.remove(doc_id)
+
+    def search(self, query: np.ndarray, k: int = 10) -> List[Tuple[Hashable, float]]:
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            return self._store.search(query, k)
+
+
+def _kmeans(vectors: np.ndarray, clusters: int, iterations: int, seed: int) -> np.ndarray:
+    """Spherical k-means; returns unit-length centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(clusters):
+            members = vectors[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+            else:
+                # Reseed empty clusters on a random point
+                centroids[cluster] = vectors[rng.integers(len(vectors))]
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids /= norms
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate index.
+
+    Vectors are partitioned around ``nlist`` k-means centroids. A query scores
+    the centroids and searches only the ``nprobe`` closest partitions, so it
+    touches roughly ``nprobe / nlist`` of the catalog. Raise ``nprobe`` to
+    trade latency for recall.
+
+    New vectors are assigned to their nearest existing centroid. Centroids
+    are only retrained by ``train``, so rebuild periodically if the catalog
+    drifts far from the training set. All methods are thread-safe.
+    """
+
+    def __init__(self, dim: int, nlist: int = 256, nprobe: int = 8, seed: int = 0):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[_VectorStore] = []
+        self._assignment: Dict[Hashable, int] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._assignment)
+
+    def train(self, vectors: np.ndarray, iterations: int = 10, sample_size: int = 100_000) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.nlist = max(1, min(self.nlist, len(vectors)))
+        if len(vectors) > sample_size:
+            rng = np.random.default_rng(self.seed)
+            vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = _kmeans(vectors, self.nlist, iterations, self.seed)
+        with self._lock:
+            self._centroids = centroids
+            self._lists = [_VectorStore(self.dim, capacity=64) for _ in range(self.nlist)]
+            self._assignment = {}
+
+    def add_many(self, doc_ids: Iterable[Hashable], vectors: np.ndarray) -> None:
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            nearest = np.argmax(vectors @ self._centroids.T, axis=1)
+            for doc_id, vector, cluster in zip(doc_ids, vectors, nearest):
+                self.remove(doc_id)
+                self._lists[cluster].add(doc_id, vector)
+                self._assignment[doc_id] = int(cluster)
+
+    def add(self, doc_id: Hashable, vector: np.ndarray) -> None:
+        self.add_many([doc_id], np.asarray(vector, dtype=np.float32)[None, :])
+
+    def remove(self, doc_id: Hashable) -> None:
+        with self._lock:
+            cluster = self._assignment.pop(doc_id, None)
+            if cluster is not None:
+                self._lists[cluster].remove(doc_id)
+
+    def search(self, query: np.ndarray, k: int = 10) -> List[Tuple[Hashable, float]]:
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            if self._centroids is None or not self._assignment:
+                return []
+            probes = min(self.nprobe, self.nlist)
+            closest = np.argpartition(-(self._centroids @ query), probes - 1)[:probes]
+            hits: List[Tuple[Hashable, float]] = []
+            for cluster in closest:
+                hits.extend(self._lists[cluster].search(query, k))
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:k]
+
+
+def build_vector_index(doc_ids: List[Hashable], vectors: np.ndarray, dim: int, ivf_threshold: int = 50_000, nprobe: int = 8):
+    """
+    Build the index that suits the catalog size.
+
+    Below ``ivf_threshold`` vectors an exact brute-force index is both faster
+    and exact. Above it an IVF index with about sqrt(n) partitions is used.
+    """
+    if len(doc_ids) < ivf_threshold:
+        index = BruteForceIndex(dim)
+        for doc_id, vector in zip(doc_ids, vectors):
+            index.add(doc_id, vector)
+        return index
+    index = IVFIndex(dim, nlist=int(np.sqrt(len(doc_ids))), nprobe=nprobe)
+    index.train(vectors)
+    index.add_many(doc_ids, vectors)
+    return index
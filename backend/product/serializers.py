@@ -1,16 +1,40 @@
 from rest_framework import serializers
-from .models import ProductModel, ProductReview, ProductCategory
+from .models import ProductModel, ProductReview, ProductCategory, ProductRatingSummary
+
+class ProductRatingSummarySerializer(serializers.ModelSerializer):
+    average = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
+    histogram = serializers.ListField(child=serializers.IntegerField(), read_only=True)
+
+    class Meta:
+        model = ProductRatingSummary
+        fields = ['average', 'count', 'histogram']
 
 class ProductSerializer(serializers.ModelSerializer):
+    rating = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductModel
-        fields = '__all__'
+        # Listed explicitly: internal counters and search columns stay private
+        fields = ['id', 'name', 'description', 'category', 'price', 'image_url', 'stock', 'rating', 'created_at']
+
+    def get_rating(self, obj):
+        # Load with select_related('rating_summary') to avoid a query per product
+        summary = getattr(obj, 'rating_summary', None)
+        if summary is None:
+            return {"average": "0.00", "count": 0, "histogram": [0, 0, 0, 0, 0]}
+        return ProductRatingSummarySerializer(summary).data
 
 class ProductReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductReview
         fields = '__all__'
 
+class ProductReviewCompactSerializer(serializers.ModelSerializer):
+    """Review as listed under its product; the product id is implied by the URL."""
+    class Meta:
+        model = ProductReview
+        fields = ['id', 'user_first_name', 'rating', 'comment', 'created_at']
+
 class ProductCategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductCategory
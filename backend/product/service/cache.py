@@ -0,0 +1,197 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class _LocalLRU:
+    """
+    Small thread-safe in-process LRU with a per-entry expiry.
+
+    Entries remember the tags they were stored with so that invalidations
+    raised in this process can evict them immediately.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, frozenset, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, _, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: Any, tags: Iterable[str], ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, frozenset(tags), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict_tags(self, tags: Iterable[str]) -> None:
+        tags = set(tags)
+        with self._lock:
+            for key in [k for k, (_, entry_tags, _) in self._entries.items() if entry_tags & tags]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class CatalogCache:
+    """
+    Read-through cache for catalog queries.
+
+    Lookups go to an in-process LRU first, then to the shared Django cache
+    backend, and only then to the builder (the database). Shared entries are
+    stamped with the current token of each of their tags; invalidating a tag
+    replaces its token, which makes every entry carrying the old token a miss
+    without having to know their keys.
+
+    The local tier is evicted directly by invalidations raised in this
+    process; invalidations from other processes reach it after ``local_ttl``
+    seconds at most, so keep that value short.
+
+    On a miss, a single-flight lock (a per-key thread lock plus ``cache.add``
+    on the shared backend) lets one worker rebuild the key while the others
+    wait for its result instead of all hitting the database at once.
+    """
+
+    def __init__(self, alias: str = 'default', prefix: str = 'catalog', ttl: int = 300,
+                 local_ttl: float = 5, local_size: int = 1024, lock_timeout: float = 10):
+        self.alias = alias
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.lock_timeout = lock_timeout
+        self.local = _LocalLRU(local_size)
+        # Striped locks: bounded memory however many distinct keys we see
+        self._key_locks = [threading.Lock() for _ in range(64)]
+
+    @classmethod
+    def from_settings(cls) -> "CatalogCache":
+        options = getattr(settings, 'CATALOG_CACHE', {})
+        return cls(
+            alias=options.get('ALIAS', 'default'),
+            prefix=options.get('PREFIX', 'catalog'),
+            ttl=options.get('TTL', 300),
+            local_ttl=options.get('LOCAL_TTL', 5),
+            local_size=options.get('LOCAL_SIZE', 1024),
+            lock_timeout=options.get('LOCK_TIMEOUT', 10),
+        )
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _entry_key(self, key: str) -> str:
+        return f'{self.prefix}:entry:{key}'
+
+    def _tag_key(self, tag: str) -> str:
+        return f'{self.prefix}:tag:{tag}'
+
+    def _lock_key(self, key: str) -> str:
+        return f'{self.prefix}:lock:{key}'
+
+    def _tag_tokens(self, tags: Iterable[str]) -> Dict[str, str]:
+        """Return the current token of each tag, creating missing ones."""
+        tag_keys = {self._tag_key(tag): tag for tag in tags}
+        found = self.shared.get_many(list(tag_keys))
+        tokens = {}
+        for tag_key, tag in tag_keys.items():
+            token = found.get(tag_key)
+            if token is None:
+                token = uuid.uuid4().hex
+                # add() so a concurrent creator wins and we both use its token
+                if not self.shared.add(tag_key, token, None):
+                    token = self.shared.get(tag_key, token)
+            tokens[tag] = token
+        return tokens
+
+    def _get_shared(self, key: str, tags: Tuple[str, ...]) -> Tuple[bool, Any]:
+        entry_key = self._entry_key(key)
+        found = self.shared.get_many([entry_key] + [self._tag_key(tag) for tag in tags])
+        entry = found.get(entry_key)
+        if entry is None:
+            return False, None
+        for tag in tags:
+            if entry['tags'].get(tag) != found.get(self._tag_key(tag)):
+                return False, None
+        return True, entry['value']
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        return self._key_locks[hash(key) % len(self._key_locks)]
+
+    def get_or_set(self, key: str, builder: Callable[[], Any], tags: Iterable[str] = ()) -> Any:
+        """Return the cached value for ``key``, building and storing it on a miss."""
+        tags = tuple(tags)
+        hit, value = self.local.get(key)
+        if hit:
+            return value
+
+        with self._key_lock(key):
+            # Another thread may have filled the key while we waited for the lock
+            hit, value = self.local.get(key)
+            if hit:
+                return value
+            hit, value = self._get_shared(key, tags)
+            if not hit:
+                value = self._rebuild(key, builder, tags)
+            self.local.set(key, value, tags, self.local_ttl)
+            return value
+
+    def _rebuild(self, key: str, builder: Callable[[], Any], tags: Tuple[str, ...]) -> Any:
+        lock_key = self._lock_key(key)
+        owns_lock = self.shared.add(lock_key, 1, self.lock_timeout)
+        if not owns_lock:
+            # Another worker is rebuilding this key; wait for its result
+            deadline = time.monotonic() + self.lock_timeout
+            delay = 0.01
+            while time.monotonic() < deadline:
+                time.sleep(delay)
+                hit, value = self._get_shared(key, tags)
+                if hit:
+                    return value
+                if self.shared.get(lock_key) is None:
+                    break
+                delay = min(delay * 2, 0.2)
+        try:
+            # Read the tag tokens before building: an invalidation raised while
+            # we build replaces them and the stored entry is born stale.
+            tokens = self._tag_tokens(tags)
+            value = builder()
+            self.shared.set(self._entry_key(key), {'tags': tokens, 'value': value}, self.ttl)
+            return value
+        finally:
+            if owns_lock:
+                self.shared.delete(lock_key)
+
+    def tag_token(self, tag: str) -> str:
+        """Current token of ``tag``; it changes every time the tag is invalidated."""
+        return self._tag_tokens([tag])[tag]
+
+    def invalidate(self, *tags: str) -> None:
+        """Invalidate every entry carrying any of ``tags`` in both tiers."""
+        if not tags:
+            return
+        self.shared.set_many({self._tag_key(tag): uuid.uuid4().hex for tag in tags}, None)
+        self.local.evict_tags(tags)
+
+    def clear_local(self) -> None:
+        self.local.clear()
+
+
+catalog_cache = CatalogCache.from_settings()
@@ -0,0 +1,99 @@
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from ..repositories.product import ProductRepositories
+from ..search.embedding import content_hash, embed_products, get_embedder, to_bytes
+from .cache import catalog_cache
+
+
+@dataclass
+class EmbeddingRunStats:
+    scanned: int = 0
+    embedded: int = 0
+    seconds: float = 0.0
+    resumed_from: str = ''
+    completed: bool = False
+
+    @property
+    def scanned_per_second(self) -> float:
+        return self.scanned / self.seconds if self.seconds else 0.0
+
+    @property
+    def embedded_per_second(self) -> float:
+        return self.embedded / self.seconds if self.seconds else 0.0
+
+
+class EmbeddingPipeline:
+    """
+    Keep product embeddings in step with product content.
+
+    Products are scanned in primary key order. Each row's content hash
+    (embedder identity, name, description and category) is compared with
+    the hash stored next to its vector, and only rows whose hash changed are
+    embedded, in batches, and written back with bulk updates.
+
+    The last scanned pk is checkpointed after every chunk, so an interrupted
+    run resumes where it stopped. A finished run clears the checkpoint.
+    """
+
+    CHECKPOINT = 'product-embeddings'
+
+    def __init__(self, embedder=None, batch_size: int = 256, scan_size: int = 2000):
+        self.embedder = embedder or get_embedder()
+        self.batch_size = batch_size
+        self.scan_size = scan_size
+
+    def run(self, resume: bool = True, force: bool = False, max_rows: Optional[int] = None,
+            progress: Optional[Callable[[EmbeddingRunStats], None]] = None) -> EmbeddingRunStats:
+        """
+        Run until the catalog is exhausted or ``max_rows`` rows were scanned.
+
+        ``force`` re-embeds every row regardless of its hash.
+        """
+        position = ProductRepositories.get_checkpoint(self.CHECKPOINT) if resume else ''
+        stats = EmbeddingRunStats(resumed_from=position)
+        started = time.perf_counter()
+        try:
+            while max_rows is None or stats.scanned < max_rows:
+                limit = self.scan_size if max_rows is None else min(self.scan_size, max_rows - stats.scanned)
+                rows = ProductRepositories.get_products_for_embedding(position or None, limit)
+                if not rows:
+                    stats.completed = True
+                    break
+                stats.embedded += self._process(rows, force)
+                stats.scanned += len(rows)
+                position = str(rows[-1][0])
+                ProductRepositories.save_checkpoint(self.CHECKPOINT, position)
+                stats.seconds = time.perf_counter() - started
+                if progress:
+                    progress(stats)
+        finally:
+            stats.seconds = time.perf_counter() - started
+            if stats.embedded:
+                # Workers holding an ANN index reload it on their next search
+                catalog_cache.invalidate('embeddings')
+        if stats.completed:
+            ProductRepositories.save_checkpoint(self.CHECKPOINT, '')
+        return stats
+
+    def _process(self, rows, force: bool) -> int:
+        changed = []
+        for product_id, name, description, category, stored_hash in rows:
+            new_hash = content_hash(self.embedder, name, description, category)
+            if force or new_hash != stored_hash:
+                changed.append((product_id, (name, description, category), new_hash))
+
+        for start in range(0, len(changed), self.batch_size):
+            batch = changed[start:start + self.batch_size]
+            vectors = embed_products(self.embedder, [content for _, content, _ in batch])
+            ProductRepositories.save_embeddings({
+                product_id: (to_bytes(vector), new_hash)
+                for (product_id, _, new_hash), vector in zip(batch, vectors)
+            })
+        return len(changed)
+
+
+def run_embedding_stage(max_rows: Optional[int] = None) -> EmbeddingRunStats:
+    """Worker entry point: embed whatever changed since the last run."""
+    return EmbeddingPipeline().run(max_rows=max_rows)
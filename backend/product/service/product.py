@@ -1,25 +1,91 @@
+from django.db import transaction
+
 from ..repositories.product import ProductRepositories
+from ..repositories.facets import FacetRepositories
+from .cache import catalog_cache
 
 class ProductService():
     """
     Handle business logic for product operations
+
+    Catalog reads go through ``catalog_cache``; entries are tagged so that the
+    handlers in ``product.signals.cache`` can invalidate them on writes.
+    Every listing carries ``products``, bumped by product saves and deletes.
+    Stock moves only bump the tags of what shows the moved products: their
+    ``category:<id>`` listings, ``products:unfiltered`` listings and, when
+    a product sells out or comes back, ``facets``.
     """
     
     @staticmethod
     def list_all_products():
-        return ProductRepositories.get_all_product()
+        return catalog_cache.get_or_set(
+            'products:all',
+            lambda: list(ProductRepositories.get_all_product()),
+            tags=['products', 'products:unfiltered'],
+        )
+
+    @staticmethod
+    def list_products_page(sort: str = 'newest', cursor: str | None = None, limit: int = 20, **filters):
+        filter_key = ':'.join(f'{name}={filters[name]}' for name in sorted(filters))
+        return catalog_cache.get_or_set(
+            f'products:page:{sort}:{cursor or ""}:{limit}:{filter_key}',
+            lambda: ProductRepositories.get_product_page(sort, cursor, limit, **filters),
+            tags=ProductService._listing_tags(filters.get('category')),
+        )
+
+    @staticmethod
+    def _listing_tags(category: str | None):
+        """Tags of a listing, filtered by the category named ``category`` if given."""
+        if not category:
+            return ['products', 'products:unfiltered']
+        category_ids = {c.name: c.pk for c in ProductService.list_categories()}
+        if category not in category_ids:
+            # Empty until the category is created, which bumps 'categories'
+            return ['products', 'categories']
+        return ['products', f'category:{category_ids[category]}']
+
+    @staticmethod
+    def get_product_facets(**filters):
+        filter_key = ':'.join(f'{name}={filters[name]}' for name in sorted(filters))
+        return catalog_cache.get_or_set(
+            f'products:facets:{filter_key}',
+            lambda: FacetRepositories.get_facets(**filters),
+            tags=['products', 'categories', 'facets'],
+        )
     
     @staticmethod
     def get_product_details(product_id: str):
-        return ProductRepositories.get_product_by_id(product_id)
+        return catalog_cache.get_or_set(
+            f'product:{product_id}',
+            lambda: ProductRepositories.get_product_by_id(product_id),
+            tags=[f'product:{product_id}'],
+        )
     
+    @staticmethod
+    def get_product_snapshots(product_ids):
+        """Current price and availability of several products; not cached, stock must be live."""
+        return ProductRepositories.get_product_snapshots(product_ids)
+
     @staticmethod
     def list_product_reviews(product_id: str):
         return ProductRepositories.get_reviews_for_product(product_id)
+
+    @staticmethod
+    def list_product_reviews_page(product_id: str, cursor: str | None = None, limit: int = 20):
+        return ProductRepositories.get_reviews_page(product_id, cursor, limit)
     
     @staticmethod
     def create_product_review(product, user_id: str, user_first_name: str, rating: int, comment: str):
-        return ProductRepositories.add_product_review(product, user_id, user_first_name, rating, comment)
+        try:
+            rating = int(rating)
+        except (TypeError, ValueError):
+            raise ValueError("rating must be an integer between 1 and 5")
+        if not 1 <= rating <= 5:
+            raise ValueError("rating must be an integer between 1 and 5")
+        review = ProductRepositories.add_product_review(product, user_id, user_first_name, rating, comment)
+        # The rating refresh is a queryset update, which sends no post_save
+        transaction.on_commit(lambda: catalog_cache.invalidate(f'product:{product.pk}', 'products'))
+        return review
     
     @staticmethod
     def reduce_product_stock(product, quantity: int):
@@ -27,4 +93,8 @@ class ProductService():
     
     @staticmethod
     def list_categories():
-        return ProductRepositories.get_category()
\ No newline at end of file
+        return catalog_cache.get_or_set(
+            'categories',
+            lambda: list(ProductRepositories.get_category()),
+            tags=['categories'],
+        )
\ No newline at end of file
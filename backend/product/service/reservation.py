@@ -0,0 +1,98 @@
+from datetime import timedelta
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import InsufficientStock
+from ..repositories.reservation import ReservationRepositories
+
+
+class ReservationService:
+    """
+    Handle business logic for stock holds
+
+    Holds are placed when items go into a cart (``cart:<user id>``) or an
+    order is created (``order:<order id>``), confirmed when the order is
+    processed and released when it is cancelled. Holds that are never
+    confirmed or released expire after their TTL and are swept by the
+    ``release_expired_holds`` command.
+    """
+
+    @staticmethod
+    def cart_reference(user_id) -> str:
+        return f'cart:{user_id}'
+
+    @staticmethod
+    def order_reference(order_id) -> str:
+        return f'order:{order_id}'
+
+    @staticmethod
+    def _expires_at(ttl: Optional[int]):
+        if ttl is None:
+            ttl = getattr(settings, 'STOCK_HOLD_TTL_SECONDS', 900)
+        return timezone.now() + timedelta(seconds=ttl)
+
+    @staticmethod
+    def hold(product_id, quantity: int, reference: str, ttl: Optional[int] = None) -> None:
+        try:
+            ReservationRepositories.hold(product_id, quantity, reference, ReservationService._expires_at(ttl))
+        except InsufficientStock:
+            # Expired holds stay counted until swept; sweep a batch and retry once
+            if not ReservationRepositories.release_expired(timezone.now()):
+                raise
+            ReservationRepositories.hold(product_id, quantity, reference, ReservationService._expires_at(ttl))
+
+    @staticmethod
+    def hold_many(lines: Dict, reference: str, ttl: Optional[int] = None) -> None:
+        try:
+            ReservationRepositories.hold_many(lines, reference, ReservationService._expires_at(ttl))
+        except InsufficientStock:
+            if not ReservationRepositories.release_expired(timezone.now()):
+                raise
+            ReservationRepositories.hold_many(lines, reference, ReservationService._expires_at(ttl))
+
+    @staticmethod
+    def hold_order(order_id, lines: Dict, release_from: Optional[str] = None) -> None:
+        """
+        Hold every ``product_id -> quantity`` line for an order.
+
+        Holds the order's owner had on those products under ``release_from``
+        (normally their cart) are released first so the units are not held
+        twice.
+        """
+        if release_from:
+            ReservationRepositories.release(release_from, lines.keys())
+        ttl = getattr(settings, 'STOCK_ORDER_HOLD_TTL_SECONDS', 3600)
+        ReservationService.hold_many(lines, ReservationService.order_reference(order_id), ttl)
+
+    @staticmethod
+    def release(reference: str, product_ids: Optional[Iterable] = None) -> int:
+        return ReservationRepositories.release(reference, product_ids)
+
+    @staticmethod
+    def get_held(reference: str) -> Dict:
+        return ReservationRepositories.get_held(reference)
+
+    @staticmethod
+    def release_quantities(reference: str, lines: Dict) -> int:
+        return ReservationRepositories.release_quantities(reference, lines)
+
+    @staticmethod
+    def confirm_order(order_id, lines: Dict) -> None:
+        ReservationRepositories.confirm(ReservationService.order_reference(order_id), lines)
+
+    @staticmethod
+    def is_order_confirmed(order_id) -> bool:
+        return ReservationRepositories.is_confirmed(ReservationService.order_reference(order_id))
+
+    @staticmethod
+    def release_expired(batch_size: int = 1000) -> int:
+        """Sweep expired holds in batches until none are left."""
+        now = timezone.now()
+        total = 0
+        while True:
+            released = ReservationRepositories.release_expired(now, batch_size)
+            total += released
+            if released < batch_size:
+                return total
@@ -0,0 +1,169 @@
+import threading
+import time
+from typing import List, Optional
+
+from ..repositories.product import ProductRepositories
+from ..search.index import InvertedIndex
+from .cache import catalog_cache
+
+
+class ProductSearchService:
+    """
+    Full-text product search over an in-process inverted index.
+
+    The index is built from the database on first use and then kept current
+    by the handlers in ``product.signals.search``. Only in-stock products are
+    indexed, matching what the catalog listing shows. Every process holds its
+    own copy, so memory grows with catalog text size per worker.
+
+    Signals only reach the process that made the write, so writers also
+    append the ids they changed to a change log in the shared cache: ``incr``
+    on a sequence key gives each write a version whose slot holds the ids.
+    Before a search, a process re-reads just the products logged past its
+    own version. It rebuilds from scratch only when it is more than
+    ``MAX_LAG`` versions behind or a slot stayed empty for ``GAP_TIMEOUT``
+    seconds (the cache lost it), as ``CacheCartStore`` treats its journal.
+    """
+
+    MAX_LAG = 500
+    GAP_TIMEOUT = 10
+    CHANGE_TTL = 3600
+
+    index = InvertedIndex()
+    _built = False
+    _version = 0
+    _gap_since = None
+    _build_lock = threading.Lock()
+
+    @staticmethod
+    def _key(*parts) -> str:
+        return ':'.join((catalog_cache.prefix, 'search') + tuple(str(part) for part in parts))
+
+    @classmethod
+    def _head(cls) -> int:
+        return catalog_cache.shared.get(cls._key('seq'), 0)
+
+    @classmethod
+    def ensure_index(cls) -> InvertedIndex:
+        head = cls._head()
+        if not cls._built or cls._version != head:
+            with cls._build_lock:
+                if not cls._built or head - cls._version > cls.MAX_LAG:
+                    cls.rebuild_index()
+                elif cls._version < head:
+                    cls._catch_up_locked(head)
+        return cls.index
+
+    @classmethod
+    def _catch_up_locked(cls, head: int) -> None:
+        """Apply the logged changes between this index's version and ``head``."""
+        versions = range(cls._version + 1, head + 1)
+        slots = catalog_cache.shared.get_many([cls._key('change', version) for version in versions])
+        changed, done = set(), cls._version
+        for version in versions:
+            ids = slots.get(cls._key('change', version))
+            if ids is None:
+                # Claimed but not written yet, unless it has been empty too long
+                if cls._gap_since is None or cls._gap_since[0] != version:
+                    cls._gap_since = (version, time.monotonic())
+                elif time.monotonic() - cls._gap_since[1] >= cls.GAP_TIMEOUT:
+                    cls.rebuild_index()
+                    return
+                break
+            changed.update(ids)
+            done = version
+        if changed:
+            cls._reload(changed)
+        cls._version = done
+
+
+    @classmethod
+    def _reload(cls, product_ids) -> None:
+        """Re-read ``product_ids`` from the database into the index."""
+        for product_id in product_ids:
+            cls.index.remove(product_id)
+        for product_id, name, description, category in ProductRepositories.iter_searchable_products(
+            product_ids=list(product_ids)
+        ):
+            cls.index.add(str(product_id), name, description, category)
+
+    @classmethod
+    def _publish(cls, product_ids) -> None:
+        """Log ``product_ids`` for other processes; this one already holds the change."""
+        product_ids = [str(product_id) for product_id in product_ids]
+        if not product_ids:
+            return
+        shared = catalog_cache.shared
+        shared.add(cls._key('seq'), 0, None)
+        version = shared.incr(cls._key('seq'))
+        shared.set(cls._key('change', version), product_ids, cls.CHANGE_TTL)
+        with cls._build_lock:
+            if cls._built and cls._version == version - 1:
+                cls._version = version
+
+    @classmethod
+    def rebuild_index(cls) -> int:
+        # Read the head first: changes logged while this runs are re-applied
+        head = cls._head()
+        cls.index.clear()
+        for product_id, name, description, category in ProductRepositories.iter_searchable_products():
+            cls.index.add(str(product_id), name, description, category)
+        cls._built = True
+        cls._version = head
+        cls._gap_since = None
+        return len(cls.index)
+
+    @classmethod
+    def _apply(cls, product) -> None:
+        if product.stock > 0:
+            cls.index.add(str(product.pk), product.name, product.description, product.category.name)
+        else:
+            cls.index.remove(str(product.pk))
+
+    @classmethod
+    def index_product(cls, product) -> None:
+        # Without an index the first search builds from the database
+        if cls._built:
+            cls._apply(product)
+        cls._publish([product.pk])
+
+    @classmethod
+    def refresh_stock(cls, products, changes) -> None:
+        """
+        Re-list products whose stock crossed zero; other stock moves leave the index alone.
+
+        ``changes`` maps each product pk to the stock change just applied, as
+        sent with ``stock_changed``.
+        """
+        moved = [
+            product for product in products
+            if (product.stock > 0) != (product.stock - changes.get(str(product.pk), 0) > 0)
+        ]
+        if cls._built:
+            for product in products:
+                if (str(product.pk) in cls.index) != (product.stock > 0):
+                    cls._apply(product)
+                    if product not in moved:
+                        moved.append(product)
+        cls._publish([product.pk for product in moved])
+
+    @classmethod
+    def remove_product(cls, product_id) -> None:
+        if cls._built:
+            cls.index.remove(str(product_id))
+        cls._publish([product_id])
+
+    @classmethod
+    def reindex_category(cls, category_id) -> None:
+        rows = list(ProductRepositories.iter_searchable_products(category_id))
+        if cls._built:
+            for product_id, name, description, category in rows:
+                cls.index.add(str(product_id), name, description, category)
+        cls._publish([product_id for product_id, _, _, _ in rows])
+
+    @classmethod
+    def search(cls, query: str, category: Optional[str] = None, limit: int = 20) -> List:
+        """Return in-stock products matching ``query``, best match first."""
+        hits = cls.ensure_index().search(query, limit=limit, categories=[category] if category else None)
+        products = ProductRepositories.get_products_by_ids([product_id for product_id, _ in hits])
+        return [products[product_id] for product_id, _ in hits if product_id in products]
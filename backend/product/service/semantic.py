@@ -0,0 +1,86 @@
+import threading
+from typing import List
+
+import numpy as np
+from django.conf import settings
+
+from ..repositories.product import ProductRepositories
+from ..search.embedding import from_bytes, get_embedder
+from ..search.vector import build_vector_index
+from .cache import catalog_cache
+
+
+class SemanticSearchService:
+    """
+    Nearest-neighbour product search over stored embeddings.
+
+    The ANN index is loaded from ``ProductModel.embedding`` on first use and
+    kept current by ``product.signals.search``. Products without a vector
+    (see the ``embed_products`` command) are not searchable yet.
+
+    Bulk vector writes bypass signals, so writers invalidate the
+    ``embeddings`` catalog cache tag and every process reloads its index on
+    the next search after the tag token changes.
+    """
+
+    embedder = None
+    index = None
+    _index_token = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_embedder(cls):
+        if cls.embedder is None:
+            cls.embedder = get_embedder()
+        return cls.embedder
+
+    @classmethod
+    def ensure_index(cls):
+        token = catalog_cache.tag_token('embeddings')
+        if cls.index is None or cls._index_token != token:
+            with cls._lock:
+                if cls.index is None or cls._index_token != token:
+                    cls.rebuild_index()
+                    cls._index_token = token
+        return cls.index
+
+    @classmethod
+    def rebuild_index(cls):
+        dim = cls.get_embedder().dim
+        doc_ids, vectors = [], []
+        for product_id, embedding in ProductRepositories.iter_embedded_products():
+            vector = from_bytes(embedding)
+            if len(vector) == dim:  # skip vectors from a different embedder
+                doc_ids.append(str(product_id))
+                vectors.append(vector)
+        matrix = np.vstack(vectors) if vectors else np.zeros((0, dim), dtype=np.float32)
+        cls.index = build_vector_index(
+            doc_ids, matrix, dim,
+            ivf_threshold=getattr(settings, 'VECTOR_INDEX_IVF_THRESHOLD', 50_000),
+            nprobe=getattr(settings, 'VECTOR_INDEX_NPROBE', 8),
+        )
+        return cls.index
+
+    @classmethod
+    def index_product(cls, product) -> None:
+        if cls.index is None:
+            return
+        if product.stock > 0 and product.embedding is not None:
+            vector = from_bytes(product.embedding)
+            if len(vector) == cls.get_embedder().dim:
+                cls.index.add(str(product.pk), vector)
+                return
+        cls.index.remove(str(product.pk))
+
+    @classmethod
+    def remove_product(cls, product_id) -> None:
+        if cls.index is not None:
+            cls.index.remove(str(product_id))
+
+    @classmethod
+    def search(cls, query: str, k: int = 10) -> List:
+        """Return the ``k`` in-stock products closest to ``query``, best first."""
+        vector = cls.get_embedder().embed([query])[0]
+        hits = cls.ensure_index().search(vector, k)
+        products = ProductRepositories.get_products_by_ids([product_id for product_id, _ in hits])
+        return [products[product_id] for product_id, _ in hits if product_id in products]
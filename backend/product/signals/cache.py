@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from ..models import ProductModel, ProductCategory
+from ..service.cache import catalog_cache
+from .stock import inventory_changed, stock_changed
+
+
+@receiver([post_save, post_delete], sender=ProductModel)
+def invalidate_product_cache(sender, instance, **kwargs):
+    """Drop cached catalog entries that may contain this product."""
+    # After commit: a read racing the write would otherwise rebuild the
+    # entry from pre-commit rows under the new tag token.
+    tags = (f'product:{instance.pk}', f'category:{instance.category_id}', 'products')
+    transaction.on_commit(lambda: catalog_cache.invalidate(*tags))
+
+
+@receiver([post_save, post_delete], sender=ProductCategory)
+def invalidate_category_cache(sender, instance, **kwargs):
+    """Drop cached category listings and entries filtered by this category."""
+    tags = (f'category:{instance.pk}', 'categories')
+    transaction.on_commit(lambda: catalog_cache.invalidate(*tags))
+
+
+@receiver(stock_changed, sender=ProductModel)
+def invalidate_stock_cache(sender, changes, **kwargs):
+    """
+    Drop the entries showing the moved products, not every listing.
+
+    Runs inside the writing transaction, after the update, so the rows read
+    here hold the new stock and ``stock - change`` is the old one.
+    """
+    tags = {'products:unfiltered'}
+    rows = sender.objects.filter(pk__in=list(changes)).values_list('pk', 'category_id', 'stock')
+    for pk, category_id, stock in rows:
+        tags.update((f'product:{pk}', f'category:{category_id}'))
+        if (stock > 0) != (stock - changes[str(pk)] > 0):
+            tags.add('facets')
+    transaction.on_commit(lambda: catalog_cache.invalidate(*tags))
+
+
+@receiver(inventory_changed, sender=ProductModel)
+def invalidate_inventory_cache(sender, product_ids, **kwargs):
+    """Cached products carry their counters; listings show none that moved here."""
+    tags = [f'product:{pk}' for pk in product_ids]
+    transaction.on_commit(lambda: catalog_cache.invalidate(*tags))
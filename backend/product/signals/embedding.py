@@ -0,0 +1,21 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from jobs.service.queue import JobService
+from ..models import ProductModel
+
+# Fields that feed the content hash, see product.search.embedding.content_hash
+_EMBEDDED_FIELDS = {'name', 'description', 'category', 'category_id'}
+
+
+@receiver(post_save, sender=ProductModel)
+def schedule_embedding(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Queue an embedding run when a product's content may have changed.
+
+    The pipeline skips rows whose hash still matches, so saves that do not
+    touch the text only cost a pending-job check.
+    """
+    if update_fields is not None and not _EMBEDDED_FIELDS.intersection(update_fields):
+        return
+    JobService.enqueue_once('product.embed')
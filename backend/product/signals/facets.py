@@ -0,0 +1,50 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from ..models import ProductModel
+from .stock import stock_changed
+from ..repositories.facets import FacetRepositories, facet_cell
+
+
+def _loaded_cell(instance):
+    loaded = getattr(instance, '_loaded_values', None)
+    if not loaded or len(loaded) != len(ProductModel.TRACKED_FIELDS):
+        return None
+    return facet_cell(loaded['category_id'], loaded['price'], loaded['stock'])
+
+
+@receiver(pre_save, sender=ProductModel)
+def load_previous_facet_cell(sender, instance, **kwargs):
+    """Only instances that were not loaded from the database need a read here."""
+    if instance._state.adding or _loaded_cell(instance) is not None:
+        return
+    previous = sender.objects.filter(pk=instance.pk).values('category_id', 'price', 'stock').first()
+    instance._loaded_values = previous or {}
+
+
+@receiver(post_save, sender=ProductModel)
+def update_facet_counts(sender, instance, created, **kwargs):
+    old = None if created else _loaded_cell(instance)
+    FacetRepositories.move(old, facet_cell(instance.category_id, instance.price, instance.stock))
+    instance.remember_loaded_values()
+
+
+@receiver(post_delete, sender=ProductModel)
+def remove_from_facet_counts(sender, instance, **kwargs):
+    old = _loaded_cell(instance) or facet_cell(instance.category_id, instance.price, instance.stock)
+    FacetRepositories.move(old, None)
+
+
+@receiver(stock_changed, sender=ProductModel)
+def update_facet_counts_for_stock(sender, changes, **kwargs):
+    """
+    Move products whose in-stock state flipped.
+
+    Runs inside the writing transaction, after the update, so the rows read
+    here hold the new stock and ``stock - change`` is the old one.
+    """
+    rows = sender.objects.filter(pk__in=list(changes)).values_list('pk', 'category_id', 'price', 'stock')
+    for pk, category_id, price, stock in rows:
+        FacetRepositories.move(
+            facet_cell(category_id, price, stock - changes[str(pk)]),
+            facet_cell(category_id, price, stock),
+        )
@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from ..models import ProductModel, ProductCategory
+from ..service.search import ProductSearchService
+from ..service.semantic import SemanticSearchService
+from .stock import stock_changed
+
+
+def _index(product):
+    ProductSearchService.index_product(product)
+    SemanticSearchService.index_product(product)
+
+
+def _unindex(product_id):
+    ProductSearchService.remove_product(product_id)
+    SemanticSearchService.remove_product(product_id)
+
+
+@receiver(post_save, sender=ProductModel)
+def index_product(sender, instance, **kwargs):
+    """Update the search indexes once the product write has committed."""
+    transaction.on_commit(lambda: _index(instance))
+
+
+@receiver(post_delete, sender=ProductModel)
+def unindex_product(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: _unindex(product_id))
+
+
+@receiver(post_save, sender=ProductCategory)
+def reindex_category(sender, instance, created, **kwargs):
+    """Category names are indexed with each product, so a rename touches all of them."""
+    if not created:
+        category_id = instance.pk
+        transaction.on_commit(lambda: ProductSearchService.reindex_category(category_id))
+
+
+@receiver(stock_changed, sender=ProductModel)
+def reindex_stock_changes(sender, changes, **kwargs):
+    """Products that sold out leave the indexes; restocked ones come back."""
+    product_ids = list(changes)
+
+    def _refresh():
+        products = list(sender.objects.filter(pk__in=product_ids).select_related('category'))
+        ProductSearchService.refresh_stock(products, changes)
+        for product in products:
+            SemanticSearchService.index_product(product)
+    transaction.on_commit(_refresh)
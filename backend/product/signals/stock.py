@@ -0,0 +1,11 @@
+from django.dispatch import Signal
+
+# Sent by code that changes ProductModel.stock with queryset updates (which
+# skip post_save), from inside the writing transaction. ``changes`` maps each
+# product pk (as a string) to the signed change applied to its stock.
+stock_changed = Signal()
+
+# Sent the same way when queryset updates move a product's ``reserved`` or
+# ``stock_shards`` counters but not its stock. ``product_ids`` lists the
+# products touched.
+inventory_changed = Signal()
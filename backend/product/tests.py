@@ -1,3 +1,729 @@
-from django.test import TestCase
+import base64
+import json
+import threading
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authentication.models import User
+from jobs.models import Job
+from jobs.service.queue import JobService
+from backend.utils.query_plan import QueryPlanAssertions, capture_selects
+from .models import (InsufficientStock, ProductCategory, ProductFacetCount, ProductModel, ProductReview,
+                     StockReservation)
+from .repositories.facets import FacetRepositories
+from .repositories.inventory import InventoryRepositories
+from .repositories.product import ProductRepositories
+from .repositories.reservation import ReservationRepositories
+from .search.text import stem
+from .search.vector import BruteForceIndex, IVFIndex
+from .service.cache import CatalogCache, catalog_cache
+from .service.embedding import EmbeddingPipeline
+from .service.product import ProductService
+from .service.reservation import ReservationService
+from .service.search import ProductSearchService
+from .signals.stock import inventory_changed, stock_changed
+
+
+class ProductQueryPlanTests(QueryPlanAssertions, TestCase):
+    """Catalog and reservation reads must be answered from an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='toys')
+        cls.products = ProductModel.objects.bulk_create([
+            ProductModel(
+                name=f'Product {n}', description='', category=category, price=Decimal(n % 50 + 1),
+                image_url='https://example.com/p.png', stock=n % 4, average_rating=Decimal(n % 5),
+            )
+            for n in range(200)
+        ])
+        cls.product = cls.products[1]
+        ProductReview.objects.bulk_create([
+            ProductReview(product=product, user_id=uuid.uuid4(), user_first_name='A', rating=4, comment='')
+            for product in cls.products[:20] for _ in range(3)
+        ])
+        expires_at = timezone.now() - timedelta(minutes=1)
+        StockReservation.objects.bulk_create([
+            StockReservation(product=product, reference=f'cart:{n}', quantity=1, expires_at=expires_at)
+            for n, product in enumerate(cls.products[:50])
+        ])
+
+    def test_product_page_uses_an_index_for_every_sort(self):
+        for sort in ProductRepositories.SORT_ORDERS:
+            with self.subTest(sort=sort):
+                rows, cursor = self.assertIndexed(ProductRepositories.get_product_page, sort, None, 20)
+                self.assertEqual(len(rows), 20)
+                self.assertIndexed(ProductRepositories.get_product_page, sort, cursor, 20)
+
+    def test_reviews_page_uses_an_index(self):
+        rows, _ = self.assertIndexed(ProductRepositories.get_reviews_page, str(self.product.pk), None, 2)
+        self.assertEqual(len(rows), 2)
+
+    def test_products_by_ids_uses_an_index(self):
+        ids = [str(product.pk) for product in self.products[:10]]
+        self.assertIndexed(ProductRepositories.get_products_by_ids, ids)
+
+    def test_release_uses_an_index(self):
+        self.assertEqual(self.assertIndexed(ReservationRepositories.release, 'cart:1'), 1)
+
+    def test_release_expired_uses_an_index(self):
+        self.assertEqual(self.assertIndexed(ReservationRepositories.release_expired, timezone.now(), 10), 10)
+
+    def test_filtered_product_pages_use_an_index(self):
+        for filters in (
+            {'category': 'toys'},
+            {'min_price': Decimal('10'), 'max_price': Decimal('20')},
+            {'in_stock': False},
+        ):
+            with self.subTest(filters=filters):
+                rows, _ = self.assertIndexed(ProductRepositories.get_product_page, 'price_asc', None, 20, **filters)
+                self.assertTrue(rows)
+
+    def test_facets_use_an_index(self):
+        # The fixture was bulk-created, which skips the facet signal handlers
+        FacetRepositories.rebuild()
+        facets = self.assertIndexed(FacetRepositories.get_facets, category='toys', min_price=Decimal('10'))
+        self.assertEqual(sum(row['count'] for row in facets['price']), 150)
+
+    def test_search_uses_an_index(self):
+        ProductSearchService.rebuild_index()
+        self.assertEqual(len(self.assertIndexed(ProductSearchService.search, 'product', limit=10)), 10)
+
+    def test_catalog_reads_skip_embeddings(self):
+        ids = [str(product.pk) for product in self.products[:10]]
+        with capture_selects() as capture:
+            ProductRepositories.get_product_page('newest', None, 20)
+            list(ProductRepositories.get_all_product())
+            ProductRepositories.get_products_by_ids(ids)
+            ProductRepositories.get_product_snapshots(ids)
+            ProductRepositories.get_product_by_id(str(self.product.pk))
+        self.assertEqual(len(capture.queries), 5)
+        for sql, _ in capture.queries:
+            self.assertNotIn('"embedding"', sql)
+
+
+class ProductListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='toys')
+        for price, stock in (('5.00', 2), ('5.00', 1), ('12.00', 3), ('30.00', 0), ('7.50', 4), ('1.00', 1)):
+            ProductModel.objects.create(
+                name='P', description='', category=category, price=Decimal(price),
+                image_url='https://example.com/p.png', stock=stock,
+            )
+
+    def walk(self, sort, limit):
+        ids, cursor = [], None
+        while True:
+            params = {'sort': sort, 'limit': limit}
+            if cursor:
+                params['cursor'] = cursor
+            page = self.client.get('/api/products/', params).json()
+            self.assertLessEqual(len(page['results']), limit)
+            ids += [row['id'] for row in page['results']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                return ids
+
+    def test_every_sort_lists_each_in_stock_product_once_in_order(self):
+        for sort, ordering in ProductRepositories.SORT_ORDERS.items():
+            with self.subTest(sort=sort):
+                expected = ProductModel.objects.filter(stock__gt=0).order_by(*ordering).values_list('id', flat=True)
+                self.assertEqual(self.walk(sort, 2), [str(pk) for pk in expected])
+
+    def test_stock_changes_before_the_cursor_do_not_shift_later_pages(self):
+        first = self.client.get('/api/products/', {'sort': 'price_asc', 'limit': 2}).json()
+        ProductModel.objects.filter(pk=first['results'][0]['id']).update(stock=0)
+        second = self.client.get('/api/products/', {'sort': 'price_asc', 'limit': 2, 'cursor': first['next_cursor']}).json()
+        expected = ProductModel.objects.filter(stock__gt=0).order_by('price', 'id').values_list('id', flat=True)[1:3]
+        self.assertEqual([row['id'] for row in second['results']], [str(pk) for pk in expected])
+
+    def test_bad_parameters_are_rejected(self):
+        cursor = self.client.get('/api/products/', {'sort': 'price_asc', 'limit': 1}).json()['next_cursor']
+        for params in (
+            {'sort': 'cheapest'},
+            {'limit': 'ten'},
+            {'cursor': 'not-a-cursor'},
+            {'sort': 'newest', 'cursor': cursor},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/products/', params).status_code, 400)
+
+    def test_forged_cursors_are_rejected(self):
+        product = ProductModel.objects.first()
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email='reader@example.com', password='x'))
+        for path, params, values in (
+            ('/api/products/', {'sort': 'newest'}, ['abc', 'def']),
+            ('/api/products/', {'sort': 'price_asc'}, ['NaN', str(product.pk)]),
+            ('/api/products/', {'sort': 'rating'}, [['4.5'], str(product.pk)]),
+            (f'/api/products/{product.pk}/reviews/', {}, ['yesterday', 'not-a-uuid']),
+        ):
+            with self.subTest(path=path, values=values):
+                # Well-formed cursors a client built by hand, not ones we issued
+                key = params.get('sort', 'reviews')
+                cursor = base64.urlsafe_b64encode(json.dumps({'k': key, 'v': values}).encode()).decode()
+                self.assertEqual(client.get(path, {**params, 'cursor': cursor}).status_code, 400)
+
+
+class CatalogCacheTests(TestCase):
+
+    def setUp(self):
+        self.cache = CatalogCache(prefix=f'test-{uuid.uuid4().hex}', local_ttl=60)
+        self.calls = 0
+
+    def build(self):
+        self.calls += 1
+        return self.calls
+
+    def test_hits_do_not_rebuild(self):
+        self.assertEqual(self.cache.get_or_set('key', self.build, tags=['a']), 1)
+        self.assertEqual(self.cache.get_or_set('key', self.build, tags=['a']), 1)
+        self.cache.clear_local()
+        self.assertEqual(self.cache.get_or_set('key', self.build, tags=['a']), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_invalidating_a_tag_misses_both_tiers(self):
+        self.cache.get_or_set('key', self.build, tags=['a', 'b'])
+        self.cache.get_or_set('other', self.build, tags=['c'])
+        self.cache.invalidate('b')
+        self.assertEqual(self.cache.get_or_set('key', self.build, tags=['a', 'b']), 3)
+        self.assertEqual(self.cache.get_or_set('other', self.build, tags=['c']), 2)
+
+    def test_other_processes_invalidations_reach_the_shared_tier(self):
+        self.cache.get_or_set('key', self.build, tags=['a'])
+        # Another process shares the backend but not this local tier
+        CatalogCache(prefix=self.cache.prefix).invalidate('a')
+        self.cache.clear_local()
+        self.assertEqual(self.cache.get_or_set('key', self.build, tags=['a']), 2)
+
+    def test_product_writes_invalidate_after_commit(self):
+        category = ProductCategory.objects.create(name='books')
+        token = catalog_cache.tag_token('products')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            ProductModel.objects.create(
+                name='Book', description='', category=category, price=Decimal('5.00'),
+                image_url='https://example.com/b.png', stock=1,
+            )
+            self.assertEqual(catalog_cache.tag_token('products'), token)
+        self.assertTrue(callbacks)
+        self.assertNotEqual(catalog_cache.tag_token('products'), token)
+
+    def test_product_payload_lists_only_public_fields(self):
+        category = ProductCategory.objects.create(name='books')
+        product = ProductModel.objects.create(
+            name='Book', description='', category=category, price=Decimal('5.00'),
+            image_url='https://example.com/b.png', stock=1,
+        )
+        self.assertEqual(
+            set(self.client.get(f'/api/products/{product.pk}/').json()),
+            {'id', 'name', 'description', 'category', 'price', 'image_url', 'stock', 'rating', 'created_at'},
+        )
+
+    def test_holds_and_sharding_invalidate_the_cached_product(self):
+        category = ProductCategory.objects.create(name='books')
+        product = ProductModel.objects.create(
+            name='Book', description='', category=category, price=Decimal('5.00'),
+            image_url='https://example.com/b.png', stock=5,
+        )
+        listing = catalog_cache.tag_token('products')
+        for write in (
+            lambda: ReservationService.hold(product.pk, 2, 'cart:1'),
+            lambda: ReservationService.release('cart:1'),
+            lambda: InventoryRepositories.enable_sharding(product.pk, 2),
+        ):
+            token = catalog_cache.tag_token(f'product:{product.pk}')
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            self.assertNotEqual(catalog_cache.tag_token(f'product:{product.pk}'), token)
+        # Listings do not show these counters and keep their entries
+        self.assertEqual(catalog_cache.tag_token('products'), listing)
+
+    def test_stock_moves_drop_only_the_listings_showing_the_product(self):
+        books = ProductCategory.objects.create(name='books')
+        games = ProductCategory.objects.create(name='games')
+        product = ProductModel.objects.create(
+            name='Book', description='', category=books, price=Decimal('5.00'),
+            image_url='https://example.com/b.png', stock=2,
+        )
+        dropped = (f'product:{product.pk}', f'category:{books.pk}', 'products:unfiltered')
+        kept = ('products', f'category:{games.pk}')
+        # Selling the last unit also changes the facet counts
+        for facets_dropped in (False, True):
+            tokens = {tag: catalog_cache.tag_token(tag) for tag in dropped + kept + ('facets',)}
+            with self.captureOnCommitCallbacks(execute=True):
+                ReservationService.confirm_order(uuid.uuid4(), {str(product.pk): 1})
+            for tag in dropped:
+                self.assertNotEqual(catalog_cache.tag_token(tag), tokens[tag], tag)
+            for tag in kept:
+                self.assertEqual(catalog_cache.tag_token(tag), tokens[tag], tag)
+            self.assertEqual(catalog_cache.tag_token('facets') != tokens['facets'], facets_dropped)
+
+    def test_category_listings_are_tagged_with_their_category(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            books = ProductCategory.objects.create(name='books')
+        self.assertEqual(ProductService._listing_tags('books'), ['products', f'category:{books.pk}'])
+        self.assertEqual(ProductService._listing_tags(None), ['products', 'products:unfiltered'])
+        self.assertEqual(ProductService._listing_tags('comics'), ['products', 'categories'])
+
+
+class StemTests(SimpleTestCase):
+
+    def test_base_and_inflected_forms_share_a_stem(self):
+        for forms in (
+            ('phone', 'phones'),
+            ('shoe', 'shoes'),
+            ('charge', 'charges', 'charging', 'charged'),
+            ('ship', 'shipped', 'shipping'),
+            ('run', 'running'),
+            ('battery', 'batteries'),
+        ):
+            with self.subTest(forms=forms):
+                self.assertEqual(len({stem(form) for form in forms}), 1)
+
+    def test_words_ending_in_ss_and_numbers_are_kept(self):
+        self.assertEqual(stem('dress'), stem('dresses'))
+        self.assertEqual(stem('dress'), 'dress')
+        self.assertEqual(stem('2024'), '2024')
+
+
+class ProductSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='electronics')
+        cls.phone = ProductModel.objects.create(
+            name='Android Phones', description='Fast charging', category=category, price=Decimal('199.00'),
+            image_url='https://example.com/p.png', stock=3,
+        )
+
+    def setUp(self):
+        ProductSearchService.rebuild_index()
+
+    def test_singular_and_base_queries_match_inflected_text(self):
+        self.assertEqual(ProductSearchService.search('phone'), [self.phone])
+        self.assertEqual(ProductSearchService.search('charged phone'), [self.phone])
+
+    def log_from_another_process(self, *product_ids, write_slot=True):
+        shared = catalog_cache.shared
+        shared.add(ProductSearchService._key('seq'), 0, None)
+        version = shared.incr(ProductSearchService._key('seq'))
+        if write_slot:
+            shared.set(ProductSearchService._key('change', version), [str(pk) for pk in product_ids])
+
+    def test_other_processes_writes_are_applied_without_a_rebuild(self):
+        ProductModel.objects.filter(pk=self.phone.pk).update(name='Tablet')
+        self.assertEqual(ProductSearchService.search('tablet'), [])
+        self.log_from_another_process(self.phone.pk)
+        with mock.patch.object(ProductSearchService, 'rebuild_index') as rebuild:
+            self.assertEqual(ProductSearchService.search('tablet'), [self.phone])
+            self.assertEqual(ProductSearchService.search('phone'), [])
+        rebuild.assert_not_called()
+
+    def test_a_lost_log_slot_or_a_long_lag_rebuilds(self):
+        ProductModel.objects.filter(pk=self.phone.pk).update(name='Tablet')
+        self.log_from_another_process(write_slot=False)
+        with mock.patch.object(ProductSearchService, 'GAP_TIMEOUT', 0):
+            # The slot may still be on its way on the first look
+            self.assertEqual(ProductSearchService.search('tablet'), [])
+            self.assertEqual(ProductSearchService.search('tablet'), [self.phone])
+
+        ProductModel.objects.filter(pk=self.phone.pk).update(name='Phone')
+        with mock.patch.object(ProductSearchService, 'MAX_LAG', 2):
+            for _ in range(3):
+                self.log_from_another_process(uuid.uuid4())
+            with mock.patch.object(ProductSearchService, '_reload') as reload:
+                self.assertEqual(ProductSearchService.search('phone'), [self.phone])
+            reload.assert_not_called()
+
+    def test_local_writes_do_not_rebuild_this_process(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phone.name = 'Tablet'
+            self.phone.save()
+        self.assertEqual(ProductSearchService._version, ProductSearchService._head())
+        self.assertEqual(ProductSearchService.search('tablet'), [self.phone])
+
+    def test_stock_moves_only_log_products_that_sold_out_or_came_back(self):
+        ProductSearchService._built = False
+        head = ProductSearchService._head()
+        with self.captureOnCommitCallbacks(execute=True):
+            ReservationService.confirm_order(uuid.uuid4(), {str(self.phone.pk): 1})
+        # Without an index there is nothing to build for a stock move
+        self.assertFalse(ProductSearchService._built)
+        self.assertEqual(ProductSearchService._head(), head)
+        with self.captureOnCommitCallbacks(execute=True):
+            ReservationService.confirm_order(uuid.uuid4(), {str(self.phone.pk): 2})
+        self.assertEqual(ProductSearchService._head(), head + 1)
+        self.assertFalse(ProductSearchService._built)
+
+
+class VectorIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # Clustered, like real embeddings
+        centers = rng.standard_normal((20, 32)).astype(np.float32)
+        vectors = centers[rng.integers(20, size=2000)] + 0.3 * rng.standard_normal((2000, 32)).astype(np.float32)
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.queries = self.vectors[rng.choice(2000, 50, replace=False)]
+
+    def brute(self):
+        index = BruteForceIndex(32)
+        for doc_id, vector in enumerate(self.vectors):
+            index.add(doc_id, vector)
+        return index
+
+    def ivf(self, nprobe):
+        index = IVFIndex(32, nlist=40, nprobe=nprobe)
+        index.train(self.vectors)
+        index.add_many(range(len(self.vectors)), self.vectors)
+        return index
+
+    def recall(self, index, exact, k=10):
+        found = [{doc_id for doc_id, _ in index.search(query, k)} for query in self.queries]
+        return np.mean([len(hits & {doc_id for doc_id, _ in exact.search(query, k)}) / k
+                        for hits, query in zip(found, self.queries)])
+
+    def test_brute_force_is_exact(self):
+        query = self.queries[0]
+        expected = np.argsort(-(self.vectors @ query))[:10]
+        self.assertEqual([doc_id for doc_id, _ in self.brute().search(query, 10)], list(expected))
+
+    def test_ivf_recall_against_brute_force(self):
+        exact = self.brute()
+        self.assertEqual(self.recall(self.ivf(nprobe=40), exact), 1.0)
+        self.assertGreaterEqual(self.recall(self.ivf(nprobe=8), exact), 0.9)
+
+    def test_removed_vectors_leave_and_moved_rows_keep_their_ids(self):
+        for index in (self.brute(), self.ivf(nprobe=40)):
+            with self.subTest(index=type(index).__name__):
+                for doc_id in range(0, 2000, 3):
+                    index.remove(doc_id)
+                self.assertEqual(len(index), 2000 - 667)
+                for query in self.queries:
+                    hits = index.search(query, 10)
+                    self.assertFalse([doc_id for doc_id, _ in hits if doc_id % 3 == 0])
+                    for doc_id, score in hits:
+                        self.assertAlmostEqual(score, float(self.vectors[doc_id] @ query), places=4)
+                index.add(0, self.vectors[0])
+                self.assertEqual(index.search(self.vectors[0], 1)[0][0], 0)
+
+    def test_searches_during_writes_see_consistent_rows(self):
+        for index in (self.brute(), self.ivf(nprobe=8)):
+            errors, done = [], threading.Event()
+
+            def churn():
+                rng = np.random.default_rng(1)
+                while not done.is_set():
+                    doc_id = int(rng.integers(2000))
+                    index.remove(doc_id)
+                    index.add(doc_id, self.vectors[doc_id])
+
+            writer = threading.Thread(target=churn)
+            writer.start()
+            try:
+                for _ in range(20):
+                    for query in self.queries:
+                        for doc_id, score in index.search(query, 10):
+                            if abs(score - float(self.vectors[doc_id] @ query)) > 1e-4:
+                                errors.append(doc_id)
+            finally:
+                done.set()
+                writer.join()
+            self.assertEqual(errors, [])
+
+
+class EmbeddingPipelineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='books')
+        cls.products = [
+            ProductModel.objects.create(
+                name=f'Book {n}', description='paperback', category=category, price=Decimal('5.00'),
+                image_url='https://example.com/b.png', stock=1,
+            )
+            for n in range(6)
+        ]
+        cls.ids = sorted(str(product.pk) for product in cls.products)
+
+    def test_unchanged_hashes_are_skipped(self):
+        self.assertEqual(EmbeddingPipeline(scan_size=4).run().embedded, 6)
+        self.assertEqual(EmbeddingPipeline(scan_size=4).run().embedded, 0)
+
+        ProductModel.objects.filter(pk=self.ids[2]).update(name='Renamed')
+        stats = EmbeddingPipeline(scan_size=4).run()
+        self.assertEqual((stats.scanned, stats.embedded), (6, 1))
+
+    def test_interrupted_run_resumes_from_its_checkpoint(self):
+        first = EmbeddingPipeline(scan_size=2).run(max_rows=4)
+        self.assertFalse(first.completed)
+        self.assertEqual(ProductRepositories.get_checkpoint(EmbeddingPipeline.CHECKPOINT), self.ids[3])
+
+        second = EmbeddingPipeline(scan_size=2).run()
+        self.assertEqual(second.resumed_from, self.ids[3])
+        self.assertEqual((second.scanned, second.embedded), (2, 2))
+        self.assertTrue(second.completed)
+        self.assertEqual(ProductRepositories.get_checkpoint(EmbeddingPipeline.CHECKPOINT), '')
+        self.assertFalse(ProductModel.objects.filter(embedding_hash='').exists())
+
+    def test_content_changes_queue_one_job_that_chains_until_done(self):
+        Job.objects.all().delete()
+        for product in self.products[:3]:
+            product.description = 'hardcover'
+            product.save()
+        product = self.products[3]
+        product.stock = 0
+        product.save(update_fields=['stock'])
+        self.assertEqual(Job.objects.filter(name='product.embed').count(), 1)
+
+        Job.objects.filter(name='product.embed').update(payload={'max_rows': 4})
+        self.assertEqual(JobService.run_batch('test'), 1)
+        # The first job stopped after four rows and queued the rest
+        self.assertEqual(Job.objects.filter(name='product.embed').count(), 1)
+        self.assertEqual(JobService.run_batch('test'), 1)
+        self.assertFalse(Job.objects.exists())
+        self.assertFalse(ProductModel.objects.filter(embedding_hash='').exists())
+        self.assertEqual(ProductRepositories.get_checkpoint(EmbeddingPipeline.CHECKPOINT), '')
+
+
+class FacetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.toys = ProductCategory.objects.create(name='toys')
+        cls.books = ProductCategory.objects.create(name='books')
+        for category, price, stock in ((cls.toys, '5.00', 2), (cls.toys, '30.00', 1), (cls.books, '12.00', 4)):
+            ProductModel.objects.create(
+                name='P', description='', category=category, price=Decimal(price),
+                image_url='https://example.com/p.png', stock=stock,
+            )
+
+    def counts(self, **filters):
+        facets = FacetRepositories.get_facets(**filters)
+        return (
+            {row['name']: row['count'] for row in facets['categories']},
+            [row['count'] for row in facets['price']],
+        )
+
+    def cells(self):
+        return set(ProductFacetCount.objects.exclude(count=0).values_list('category_id', 'price_bucket', 'in_stock', 'count'))
+
+    def test_each_facet_ignores_only_its_own_filter(self):
+        self.assertEqual(self.counts(), ({'books': 1, 'toys': 2}, [1, 1, 1, 0, 0, 0, 0, 0]))
+        self.assertEqual(self.counts(category='toys'), ({'books': 1, 'toys': 2}, [1, 0, 1, 0, 0, 0, 0, 0]))
+        self.assertEqual(self.counts(min_price=Decimal('10'), max_price=Decimal('20')), ({'books': 1, 'toys': 0}, [1, 1, 1, 0, 0, 0, 0, 0]))
+
+    def test_writes_keep_counts_equal_to_a_rebuild(self):
+        product = ProductModel.objects.get(price=Decimal('30.00'))
+        product.price = Decimal('300.00')
+        product.category = self.books
+        product.save()
+        ProductModel.objects.get(price=Decimal('5.00')).deduct_stock(2)
+        ProductModel.objects.get(price=Decimal('12.00')).delete()
+        incremental = self.cells()
+        FacetRepositories.rebuild()
+        self.assertEqual(self.cells(), incremental)
+        self.assertEqual(self.counts(), ({'books': 1, 'toys': 0}, [0, 0, 0, 0, 0, 1, 0, 0]))
+        self.assertEqual(self.counts(in_stock=False)[0], {'books': 0, 'toys': 1})
+
+    def test_non_finite_price_filters_are_rejected(self):
+        for value in ('NaN', 'sNaN', 'Infinity', '-inf', 'abc'):
+            with self.subTest(value=value):
+                response = self.client.get('/api/products/', {'min_price': value})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('min_price', response.json()['error'])
+        self.assertEqual(self.client.get('/api/products/', {'max_price': '20'}).status_code, 200)
+
+
+class ReservationTests(TestCase):
+
+    def setUp(self):
+        category = ProductCategory.objects.create(name='toys')
+        self.product = ProductModel.objects.create(
+            name='Kite', description='', category=category, price=Decimal('9.00'),
+            image_url='https://example.com/k.png', stock=5,
+        )
+
+    def counters(self):
+        self.product.refresh_from_db(fields=['stock', 'reserved'])
+        return self.product.stock, self.product.reserved
+
+    def test_holds_extend_and_never_exceed_stock(self):
+        ReservationService.hold(self.product.pk, 2, 'cart:a')
+        ReservationService.hold(self.product.pk, 1, 'cart:a')
+        self.assertEqual(ReservationService.get_held('cart:a'), {str(self.product.pk): 3})
+        with self.assertRaises(InsufficientStock):
+            ReservationService.hold(self.product.pk, 3, 'cart:b')
+        ReservationService.hold(self.product.pk, 2, 'cart:b')
+        self.assertEqual(self.counters(), (5, 5))
+
+    def test_release_and_expiry_give_units_back(self):
+        ReservationService.hold(self.product.pk, 2, 'cart:a')
+        ReservationService.hold(self.product.pk, 3, 'cart:b', ttl=-1)
+        self.assertEqual(ReservationService.release('cart:a'), 1)
+        self.assertEqual(self.counters(), (5, 3))
+        # The expired hold is swept to make room for a new one
+        ReservationService.hold(self.product.pk, 5, 'cart:c')
+        self.assertEqual(StockReservation.objects.get(reference='cart:b').status, StockReservation.EXPIRED)
+        self.assertEqual(self.counters(), (5, 5))
+
+    def test_hold_many_is_all_or_nothing_and_names_every_short_product(self):
+        category = self.product.category
+        other, low = [
+            ProductModel.objects.create(
+                name=name, description='', category=category, price=Decimal('1.00'),
+                image_url='https://example.com/k.png', stock=stock,
+            )
+            for name, stock in (('Ball', 4), ('Yo-yo', 1))
+        ]
+        missing = str(uuid.uuid4())
+        lines = {str(self.product.pk): 2, str(other.pk): 4, str(low.pk): 2, missing: 1}
+        with self.assertRaises(InsufficientStock) as raised:
+            ReservationService.hold_many(lines, 'order:1')
+        self.assertEqual(str(raised.exception), f"Insufficient stock for product {', '.join(sorted([str(low.pk), missing]))}.")
+        self.assertEqual(self.counters(), (5, 0))
+        self.assertFalse(StockReservation.objects.exists())
+
+        ReservationService.hold(self.product.pk, 1, 'order:1')
+        # Shard lookup, locking read, counter UPDATE, hold read, UPDATE and INSERT, plus the savepoint
+        with self.assertNumQueries(8):
+            ReservationService.hold_many({str(self.product.pk): 2, str(other.pk): 4}, 'order:1')
+        self.assertEqual(ReservationService.get_held('order:1'), {str(self.product.pk): 3, str(other.pk): 4})
+        self.assertEqual(self.counters(), (5, 3))
+
+    def test_confirm_consumes_the_hold_and_deducts_stock(self):
+        ReservationService.hold(self.product.pk, 2, 'order:1')
+        ReservationService.confirm_order(1, {str(self.product.pk): 3})
+        self.assertEqual(self.counters(), (2, 0))
+        self.assertEqual(StockReservation.objects.get(reference='order:1').status, StockReservation.CONFIRMED)
+        with self.assertRaises(InsufficientStock):
+            ReservationService.confirm_order(2, {str(self.product.pk): 3})
+        self.assertEqual(self.counters(), (2, 0))
+
+
+class ShardingTests(TestCase):
+
+    def setUp(self):
+        category = ProductCategory.objects.create(name='toys')
+        self.product = ProductModel.objects.create(
+            name='Kite', description='', category=category, price=Decimal('9.00'),
+            image_url='https://example.com/k.png', stock=10,
+        )
+        ReservationService.hold(self.product.pk, 3, 'order:1')
+        InventoryRepositories.enable_sharding(self.product.pk, 4)
+
+    def state(self):
+        InventoryRepositories.rollup([self.product.pk])
+        self.product.refresh_from_db(fields=['stock', 'reserved'])
+        return self.product.stock, self.product.reserved, InventoryRepositories.get_available_stock(self.product.pk)
+
+    def test_only_unreserved_stock_is_split(self):
+        self.assertEqual(self.state(), (10, 3, 7))
+        with self.assertRaises(InsufficientStock):
+            self.product.deduct_stock(8)
+
+    def test_released_holds_return_to_the_shards(self):
+        ReservationService.release('order:1')
+        self.assertEqual(self.state(), (10, 0, 10))
+
+    def test_confirmed_holds_are_consumed_before_the_shards(self):
+        ReservationService.confirm_order(1, {str(self.product.pk): 4})
+        self.assertEqual(self.state(), (6, 0, 6))
+
+    def test_unused_held_units_go_back_to_the_shards(self):
+        ReservationService.confirm_order(1, {str(self.product.pk): 1})
+        self.assertEqual(self.state(), (9, 0, 9))
+
+    def test_disabling_keeps_held_units(self):
+        InventoryRepositories.disable_sharding(self.product.pk)
+        self.assertEqual(self.state(), (10, 3, 7))
+
+
+class InventoryCommitTests(TestCase):
+
+    def setUp(self):
+        category = ProductCategory.objects.create(name='toys')
+        self.kite, self.ball = [
+            ProductModel.objects.create(
+                name=name, description='', category=category, price=Decimal('3.00'),
+                image_url='https://example.com/t.png', stock=stock, reserved=reserved,
+            )
+            for name, stock, reserved in (('Kite', 5, 2), ('Ball', 3, 0))
+        ]
+
+    def counters(self):
+        return [
+            tuple(ProductModel.objects.filter(pk=product.pk).values_list('stock', 'reserved').get())
+            for product in (self.kite, self.ball)
+        ]
+
+    def test_held_units_are_consumed_first_and_leftovers_returned(self):
+        kite, ball = str(self.kite.pk), str(self.ball.pk)
+        # Shard counts, the locking read and the update
+        with self.assertNumQueries(5):
+            changes = InventoryRepositories.commit({kite: 1, ball: 3}, held={kite: 2})
+        self.assertEqual(changes, {kite: -1, ball: -3})
+        self.assertEqual(self.counters(), [(4, 0), (0, 0)])
+
+    def test_other_holds_are_not_sold(self):
+        kite = str(self.kite.pk)
+        with self.assertRaises(InsufficientStock):
+            InventoryRepositories.commit({kite: 4})
+        InventoryRepositories.commit({kite: 3})
+        self.assertEqual(self.counters()[0], (2, 2))
+
+    def test_every_short_product_is_named_and_nothing_moves(self):
+        kite, ball, missing = str(self.kite.pk), str(self.ball.pk), str(uuid.uuid4())
+        with self.assertRaises(InsufficientStock) as raised:
+            InventoryRepositories.commit({kite: 6, ball: 1, missing: 1}, held={kite: 2})
+        for product_id in (kite, missing):
+            self.assertIn(product_id, str(raised.exception))
+        self.assertNotIn(ball, str(raised.exception))
+        self.assertEqual(self.counters(), [(5, 2), (3, 0)])
+
+    def test_sharded_rows_are_not_locked_and_sell_outs_are_rolled_up(self):
+        kite = str(self.kite.pk)
+        ProductModel.objects.filter(pk=kite).update(reserved=0)
+        InventoryRepositories.enable_sharding(kite, 2)
+        stock_changes, inventory_moves = [], []
+        receivers = (
+            (stock_changed, lambda changes, **kwargs: stock_changes.append(changes)),
+            (inventory_changed, lambda product_ids, **kwargs: inventory_moves.append(product_ids)),
+        )
+        for signal, receiver in receivers:
+            signal.connect(receiver, sender=ProductModel, weak=False)
+            self.addCleanup(signal.disconnect, receiver, sender=ProductModel)
+        select_for_update = QuerySet.select_for_update
+        locked = []
+
+        def spy(queryset, *args, **kwargs):
+            locked.append(queryset.model)
+            return select_for_update(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'select_for_update', spy):
+            self.assertEqual(InventoryRepositories.commit({kite: 2}), {})
+        self.assertNotIn(ProductModel, locked)
+        # Still in stock: the product row is left alone
+        self.assertEqual(self.counters()[0], (5, 0))
+        self.assertEqual((stock_changes, inventory_moves), ([], [[kite]]))
+
+        InventoryRepositories.commit({kite: 3})
+        self.assertEqual(self.counters()[0], (0, 0))
+        self.assertEqual(stock_changes, [{kite: -5}])
+        self.assertEqual(
+            sorted(ProductFacetCount.objects.filter(count__gt=0).values_list('in_stock', 'count')), [(False, 1), (True, 1)]
+        )
+
+        InventoryRepositories.restock_shards({kite: 1})
+        self.assertEqual(self.counters()[0], (1, 0))
+        self.assertEqual(stock_changes[-1], {kite: 1})
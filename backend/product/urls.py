@@ -3,7 +3,9 @@ from . import views
 
 urlpatterns = [
     path('products/', views.ProductListView.as_view(), name='product-list'),
-    path('products/<int:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
-    path('products/<int:product_id>/reviews/', views.ProductReviewView.as_view(), name='product-reviews'),
+    path('products/search/', views.ProductSearchView.as_view(), name='product-search'),
+    path('products/semantic-search/', views.ProductSemanticSearchView.as_view(), name='product-semantic-search'),
+    path('products/<uuid:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
+    path('products/<uuid:product_id>/reviews/', views.ProductReviewView.as_view(), name='product-reviews'),
     path('categories/', views.ProductCategoryView.as_view(), name='product-categories'),
 ]
\ No newline at end of file
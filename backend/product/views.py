@@ -1,24 +1,109 @@
+from decimal import Decimal, InvalidOperation
 from rest_framework.generics import GenericAPIView
 from rest_framework import status
 from rest_framework.response import Response
 from .service.user import get_user_first_name
 from backend.utils.get_user_id import get_user_info_from_request
 from .service.product import ProductService
-from .serializers import ProductSerializer, ProductReviewSerializer, ProductCategorySerializer
+from .service.search import ProductSearchService
+from .service.semantic import SemanticSearchService
+from .serializers import ProductSerializer, ProductReviewSerializer, ProductReviewCompactSerializer, ProductCategorySerializer
+from backend.utils.cursor_pagination import parse_limit
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
 
 class ProductListView(GenericAPIView):
     """
-    API view to list all products
+    API view to list products, one keyset page at a time, with facet counts.
+
+    Query params: ``sort`` (newest, price_asc, price_desc, rating),
+    ``cursor`` (the ``next_cursor`` of the previous page), ``limit`` and the
+    filters ``category``, ``min_price``, ``max_price`` and ``in_stock``
+    (defaults to true).
     """
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
+    default_page_size = 20
+    max_page_size = 100
     
     def get(self, request):
-        products = ProductService.list_all_products()
+        try:
+            limit = parse_limit(request.query_params, self.default_page_size, self.max_page_size)
+            filters = self._parse_filters(request.query_params)
+            products, next_cursor = ProductService.list_products_page(
+                sort=request.query_params.get('sort', 'newest'),
+                cursor=request.query_params.get('cursor'),
+                limit=limit,
+                **filters,
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response({
+            "results": serializer.data,
+            "next_cursor": next_cursor,
+            "facets": ProductService.get_product_facets(**filters),
+        }, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def _parse_filters(params) -> dict:
+        filters = {"in_stock": params.get('in_stock', 'true').lower() not in ('false', '0')}
+        if params.get('category'):
+            filters["category"] = params['category']
+        for name in ('min_price', 'max_price'):
+            if params.get(name):
+                try:
+                    value = Decimal(params[name])
+                except InvalidOperation:
+                    raise ValueError(f"{name} must be a number")
+                # NaN and Infinity parse but cannot be compared with prices
+                if not value.is_finite():
+                    raise ValueError(f"{name} must be a number")
+                filters[name] = value
+        return filters
+
+class ProductSearchView(GenericAPIView):
+    """
+    API view for ranked full-text search over in-stock products.
+
+    Query params: ``q`` (required), ``category`` (category name) and ``limit``.
+    """
+    serializer_class = ProductSerializer
+    permission_classes = [AllowAny]
+    default_page_size = 20
+    max_page_size = 100
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = parse_limit(request.query_params, self.default_page_size, self.max_page_size)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        products = ProductSearchService.search(query, category=request.query_params.get('category'), limit=limit)
+        serializer = self.get_serializer(products, many=True)
+        return Response({"results": serializer.data}, status=status.HTTP_200_OK)
+
+class ProductSemanticSearchView(GenericAPIView):
+    """
+    API view returning the ``k`` products semantically closest to ``q``.
+    """
+    serializer_class = ProductSerializer
+    permission_classes = [AllowAny]
+    max_k = 100
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            k = int(request.query_params.get('k', 10))
+        except ValueError:
+            return Response({"error": "k must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        products = SemanticSearchService.search(query, k=max(1, min(k, self.max_k)))
+        serializer = self.get_serializer(products, many=True)
+        return Response({"results": serializer.data}, status=status.HTTP_200_OK)
 
 class ProductDetailView(GenericAPIView):
     serializer_class = ProductSerializer
@@ -34,11 +119,22 @@ class ProductDetailView(GenericAPIView):
 class ProductReviewView(GenericAPIView):
     serializer_class = ProductReviewSerializer
     permission_classes = [IsAuthenticated]
+    default_page_size = 20
+    max_page_size = 100
 
     def get(self, request, product_id):
-        reviews = ProductService.list_product_reviews(product_id)
-        serializer = self.get_serializer(reviews, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        """
+        Newest reviews first, one keyset page at a time (``cursor``, ``limit``).
+        """
+        try:
+            limit = parse_limit(request.query_params, self.default_page_size, self.max_page_size)
+            reviews, next_cursor = ProductService.list_product_reviews_page(
+                product_id, cursor=request.query_params.get('cursor'), limit=limit
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = ProductReviewCompactSerializer(reviews, many=True)
+        return Response({"results": serializer.data, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
 
     def post(self, request, product_id):
         product = ProductService.get_product_details(product_id)
@@ -56,9 +152,12 @@ class ProductReviewView(GenericAPIView):
         rating = request.data.get('rating')
         comment = request.data.get('comment')
 
-        review = ProductService.create_product_review(
-            product, user_id, user_first_name, rating, comment
-        )
+        try:
+            review = ProductService.create_product_review(
+                product, user_id, user_first_name, rating, comment
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         serializer = self.get_serializer(review)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 